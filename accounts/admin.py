@@ -1,12 +1,190 @@
-from django.contrib import admin
-from .models import Claim, Payment
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils.functional import cached_property
+
+from . import search, transitions
+from .models import Claim, ClaimStatusChange, OutboundEmail, Payment, PaymentEvent
+from .signals import payment_statuses_changed
+
+
+def estimate_row_count(model, using):
+    """The planner's row estimate for ``model``'s table, or None if there is none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table]),
+        'mysql': (
+            'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+            [table],
+        ),
+        # Only present once ANALYZE has run; the first number is the row count.
+        'sqlite': ('SELECT stat FROM sqlite_stat1 WHERE tbl = %s AND idx IS NULL', [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    sql, params = queries[connection.vendor]
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if not row or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator that reads the table size from the planner's
+    statistics instead of running COUNT(*) over a large, unfiltered table.
+    Filtered lists, and tables smaller than ``exact_below`` rows, are
+    counted exactly.
+    """
+    exact_below = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+class LargeChangeListMixin:
+    """Changelist settings for tables with millions of rows."""
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
+    list_filter = ('status',)
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) behind "N total".
+    show_full_result_count = False
+
+class SearchRankedChangeList(ChangeList):
+    """Orders full-text search results best match first, unless a column header was clicked."""
+
+    def get_ordering(self, request, queryset):
+        if 'search_position' in queryset.query.annotations and ORDER_VAR not in request.GET:
+            return ['search_position', '-pk']
+        return super().get_ordering(request, queryset)
 
 @admin.register(Claim)
-class ClaimAdmin(admin.ModelAdmin):
+class ClaimAdmin(LargeChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'claim_type', 'status', 'created_at')
-    search_fields = ('user__email', 'claim_type', 'status')
+    actions = ('approve', 'reject')
+    # Searched through the full-text index (accounts.search), not with LIKE;
+    # a term containing "@" matches the owner's email exactly instead.
+    search_fields = ('claim_type', 'description')
+    search_help_text = 'Words from the claim type or description, or an owner email address.'
+    search_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if '@' in search_term:
+            return queryset.filter(user__email__iexact=search_term), False
+        ids = search.ranked_ids(search_term, self.search_limit, using=queryset.db)
+        position = Case(
+            *[When(pk=pk, then=Value(rank)) for rank, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=ids).annotate(search_position=position), False
+
+    def get_changelist(self, request, **kwargs):
+        return SearchRankedChangeList
+
+    @admin.action(description='Approve selected claims')
+    def approve(self, request, queryset):
+        self.transition(request, queryset, 'approved')
+
+    @admin.action(description='Reject selected claims')
+    def reject(self, request, queryset):
+        self.transition(request, queryset, 'rejected')
+
+    def transition(self, request, queryset, status):
+        # Same path as POST /api/claims/transition/: pending claims only,
+        # one UPDATE per chunk, audited.
+        ids = list(queryset.values_list('pk', flat=True).order_by())
+        results = transitions.bulk_transition(ids, status, actor=request.user)
+        moved = sum(row['result'] == transitions.TRANSITIONED for row in results)
+        self.message_user(request, f"Marked {moved} claims as {status}.", messages.SUCCESS)
+        if moved < len(results):
+            self.message_user(
+                request, f"Skipped {len(results) - moved} claims that were no longer pending.", messages.WARNING,
+            )
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'amount', 'status', 'created_at')
-    search_fields = ('user__email', 'status')
\ No newline at end of file
+    actions = ('mark_completed', 'mark_failed')
+    search_fields = ('reference',)
+    search_help_text = 'A payment reference or an owner email address.'
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact, indexed lookups instead of LIKE '%term%' joined to auth_user.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if '@' in search_term:
+            return queryset.filter(user__email__iexact=search_term), False
+        return queryset.filter(reference=search_term), False
+
+    @admin.action(description='Mark selected payments as completed')
+    def mark_completed(self, request, queryset):
+        self.set_status(request, queryset, 'completed')
+
+    @admin.action(description='Mark selected payments as failed')
+    def mark_failed(self, request, queryset):
+        self.set_status(request, queryset, 'failed')
+
+    def set_status(self, request, queryset, status):
+        # One UPDATE for the whole selection; the signal stands in for the
+        # post_save handlers it bypasses.
+        with transaction.atomic(using=queryset.db):
+            rows = list(
+                queryset.select_for_update().exclude(status=status)
+                .values_list('pk', 'user_id', 'amount', 'status').order_by()
+            )
+            if rows:
+                Payment.objects.filter(pk__in=[row[0] for row in rows]).update(status=status)
+                payment_statuses_changed.send(sender=Payment, changes=[(*row, status) for row in rows])
+        self.message_user(request, f"Marked {len(rows)} payments as {status}.", messages.SUCCESS)
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('attempts', 'last_error', 'sent_at', 'created_at')
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'reference', 'status', 'outcome', 'received_at', 'processed_at')
+    list_filter = ('outcome',)
+    search_fields = ('=event_id', '=reference')
+    readonly_fields = ('event_id', 'reference', 'status', 'payload', 'received_at', 'retry_at', 'processed_at', 'outcome')
+    show_full_result_count = False
+
+@admin.register(ClaimStatusChange)
+class ClaimStatusChangeAdmin(admin.ModelAdmin):
+    """Read-only view of the append-only audit trail."""
+    list_display = ('claim_id', 'from_status', 'to_status', 'actor', 'created_at')
+    list_filter = ('to_status',)
+    list_select_related = ('actor',)
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
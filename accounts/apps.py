@@ -5,4 +5,7 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
     verbose_name = "User Accounts and Claims"
 
+    def ready(self):
+        from . import signals  # noqa: F401
+
 # ...existing code...
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+Async read endpoints for ASGI deployments (``jelani_backend.asgi``).
+
+``GET /api/async/claims/``, ``/api/async/payments/``, their ``<pk>/`` detail
+routes and ``/api/async/dashboard/`` answer exactly like their sync
+counterparts: same authentication, permissions, filters, ``?fields=``,
+cursors, ETags and JSON. DRF views are synchronous, so ``async_endpoint()``
+drives the sync view's own machinery from a coroutine:
+
+* building querysets, serializing and rendering stay on the event loop
+  (they are CPU-only);
+* queries go through Django's async ORM;
+* the sync-only steps (authentication, which may read the user row; the
+  collection version lookup; rebuilding a missing dashboard rollup) run
+  through ``sync_to_async``.
+
+``GET /api/events/`` (``status_events``), the server-sent event stream of
+accounts.events, is built the same way.
+
+Django's async ORM still runs each query on a worker thread. What ASGI buys
+is that a slow client, reading the request or the response, holds a
+coroutine rather than a whole worker thread.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from rest_framework import permissions
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import events, versions
+from .authentication import QueryStringJWTAuthentication
+from .views import ClaimViewSet, PaymentViewSet
+
+
+def async_endpoint(view_class, handler, **initkwargs):
+    """
+    An async Django view serving GET with ``handler(view, request, **kwargs)``,
+    a coroutine, in place of the handler method of ``view_class`` (a DRF view
+    or viewset; pass ``action=`` for a viewset).
+    """
+    action = initkwargs.pop('action', None)
+
+    async def endpoint(request, *args, **kwargs):
+        view = view_class(**initkwargs)
+        if action is not None:
+            view.action_map = {'get': action, 'head': action}
+            # Bound as ViewSet.as_view() does, for the Allow header.
+            view.get = view.head = getattr(view, action)
+        view.args, view.kwargs = args, kwargs
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.headers = view.default_response_headers
+        try:
+            if request.method not in ('GET', 'HEAD'):
+                raise MethodNotAllowed(request.method)
+            await sync_to_async(view.initial)(request, *args, **kwargs)
+            response = await handler(view, request, **kwargs)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return _rendered(view.finalize_response(request, response, *args, **kwargs))
+
+    endpoint.csrf_exempt = True
+    endpoint.__name__ = endpoint.__qualname__ = f'async_{getattr(view_class, "__name__", "view")}_{action}'
+    return endpoint
+
+
+def _rendered(response):
+    # Render here: Django would render a DRF Response through sync_to_async,
+    # costing a thread hop for CPU-only work.
+    if not hasattr(response, 'render'):
+        return response
+    response.render()
+    rendered = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        rendered[header] = value
+    for cookie in response.cookies.values():
+        rendered.cookies[cookie.key] = cookie
+    return rendered
+
+
+async def list_rows(view, request):
+    """``list`` of a paginated ``FastListMixin`` viewset, with ETags if it has a ``version_collection``."""
+    etag = None
+    if request.user.is_authenticated and getattr(view, 'version_collection', None):
+        etag = await sync_to_async(versions.etag_for)(request, view.version_collection)
+        if versions.is_not_modified(request, etag):
+            return versions.add_validators(HttpResponseNotModified(), etag)
+
+    queryset = view.filter_queryset(view.get_queryset())
+    encoder = view.get_encoder()
+    if encoder is not None:
+        queryset = view.get_rows_queryset(queryset, encoder)
+    rows = await view.paginator.apaginate_queryset(queryset, request, view)
+    data = encoder.encode(rows, request) if encoder is not None else view.get_serializer(rows, many=True).data
+    response = view.get_paginated_response(data)
+    return versions.add_validators(response, etag) if etag is not None else response
+
+
+async def retrieve_row(view, request, pk):
+    """``retrieve`` of a viewset, looked up with the async ORM."""
+    queryset = view.filter_queryset(view.get_queryset())
+    try:
+        instance = await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+    except (TypeError, ValueError, ValidationError):
+        # A malformed pk, as in rest_framework.generics.get_object_or_404().
+        raise Http404
+    view.check_object_permissions(request, instance)
+    return Response(view.get_serializer(instance).data)
+
+
+claim_list = async_endpoint(ClaimViewSet, list_rows, action='list', basename='claim')
+claim_detail = async_endpoint(ClaimViewSet, retrieve_row, action='retrieve', basename='claim')
+payment_list = async_endpoint(PaymentViewSet, list_rows, action='list', basename='payment')
+payment_detail = async_endpoint(PaymentViewSet, retrieve_row, action='retrieve', basename='payment')
+
+
+class EventStreamRenderer(JSONRenderer):
+    # Lets DRF's content negotiation accept EventSource's
+    # "Accept: text/event-stream"; only error responses are rendered with it.
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+
+class StatusEventsView(APIView):
+    authentication_classes = [QueryStringJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+
+async def stream_status_events(view, request):
+    """
+    The caller's claim and payment status changes as server-sent events
+    (accounts.events). Resumes after ``Last-Event-ID`` (or ``?last_event_id=``);
+    a connection without one is first sent an ``id:`` line to resume from.
+    Under WSGI the response ends after the missed events instead of staying
+    open, and the client reconnects after the advertised retry delay.
+    """
+    last_event_id = events.parse_last_event_id(
+        request.headers.get('Last-Event-ID', request.query_params.get('last_event_id'))
+    )
+    if isinstance(request._request, ASGIRequest):
+        body = events.stream(request.user.pk, last_event_id)
+    else:
+        body = events.backlog(request.user.pk, last_event_id)
+    response = StreamingHttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+status_events = async_endpoint(StatusEventsView, stream_status_events)
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# The user fields the API views read. Anything else (the password hash, dates)
+# stays deferred and is only fetched if some code path actually touches it.
+CACHED_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+class UserCache:
+    """
+    Process-local LRU cache of user rows keyed by user id, with a TTL.
+
+    Entries are dropped by the post_save/post_delete receivers in
+    ``accounts.signals`` whenever the user is saved or deleted in this process;
+    the TTL bounds staleness for changes made elsewhere (other processes,
+    ``QuerySet.update()``).
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _config(self):
+        config = getattr(settings, 'AUTH_USER_CACHE', {})
+        return config.get('MAX_SIZE', 10000), config.get('TTL', 60)
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        max_size, ttl = self._config()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] + ttl < time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, value):
+        user_id = str(user_id)
+        max_size, ttl = self._config()
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that resolves the token's user from ``user_cache``
+    instead of running a ``User`` SELECT on every request.
+
+    A cache hit rebuilds the user with ``Model.from_db()`` from the cached
+    fields, so it is a normal (partially deferred) ``User`` instance. Only
+    active users are ever cached, and deactivating a user saves it, which
+    evicts the entry. With ``CHECK_REVOKE_TOKEN`` on the password hash is
+    needed on every request, so the cache is bypassed.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            db, values = cached
+            return User.from_db(db, _cached_attnames(), values)
+
+        user = super().get_user(validated_token)
+        if api_settings.USER_ID_FIELD == User._meta.pk.name:
+            user_cache.set(user_id, (user._state.db, [getattr(user, name) for name in _cached_attnames()]))
+        return user
+
+
+def _cached_attnames():
+    # Model.from_db() expects field names in concrete field order.
+    return [field.attname for field in User._meta.concrete_fields if field.attname in CACHED_FIELDS]
+
+
+class QueryStringJWTAuthentication(CachedJWTAuthentication):
+    """
+    ``CachedJWTAuthentication`` that also takes the access token from
+    ``?access_token=`` when there is no Authorization header. Browsers'
+    ``EventSource`` cannot send headers. Only the event stream uses this:
+    URLs end up in server and proxy logs.
+    """
+    query_param = 'access_token'
+
+    def authenticate(self, request):
+        if self.get_header(request) is not None:
+            return super().authenticate(request)
+        raw_token = request.query_params.get(self.query_param)
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token.encode())
+        return self.get_user(validated_token), validated_token
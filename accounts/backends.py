@@ -0,0 +1,58 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import BooleanField, Case, Q, Value, When
+
+from . import hashing
+
+UserModel = get_user_model()
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    """
+    Authenticates with either a username or an email address.
+
+    The user is resolved with a single query (``username = x OR email ILIKE x``,
+    both indexed) and the password hasher runs exactly once per attempt, for
+    unknown users too, so a failed login costs the same as a successful one.
+    An exact username match wins over an email match; an email shared by
+    several accounts is treated as unknown.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+
+        # Hashing goes through accounts.hashing so that it can be offloaded to
+        # the bounded worker pool (PASSWORD_HASHING_POOL).
+        user = self.get_user_by_login(username)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user (#20760).
+            hashing.make_password(password)
+        elif hashing.check_password(user, password) and self.user_can_authenticate(user):
+            return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        return await sync_to_async(self.authenticate)(request, username, password, **kwargs)
+
+    def get_user_by_login(self, login):
+        username_field = UserModel.USERNAME_FIELD
+        is_username = Case(
+            When(**{username_field: login}, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+        matches = list(
+            UserModel._default_manager
+            .filter(Q(**{username_field: login}) | Q(email__iexact=login))
+            .annotate(is_username=is_username)
+            .order_by('-is_username', 'pk')[:2]
+        )
+        if not matches:
+            return None
+        if matches[0].is_username or len(matches) == 1:
+            return matches[0]
+        return None
@@ -0,0 +1,142 @@
+"""
+Serving claim documents to their owner.
+
+``serve()`` answers conditional requests (If-None-Match / If-Modified-Since)
+with 304 before the file is opened, and single byte ranges with 206. Full and
+partial bodies are streamed by FileResponse, so under a WSGI server with
+``wsgi.file_wrapper`` (gunicorn) the bytes go out with ``sendfile()`` and
+never pass through Python.
+
+When a front proxy can read MEDIA_ROOT, set DOCUMENT_SENDFILE_BACKEND to
+``'nginx'`` (X-Accel-Redirect to DOCUMENT_SENDFILE_PREFIX + name, served from
+an ``internal`` location) or ``'apache'`` (X-Sendfile with the absolute path).
+Django then only authorizes the request and the proxy sends the file,
+including ranges.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class RangeFile:
+    """
+    A read-only view of ``length`` bytes of ``file`` starting at ``start``.
+
+    ``fileno()`` is kept so that wsgi.file_wrapper can still use sendfile();
+    gunicorn starts at the current offset and stops at the Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def get_etag(name, stat):
+    # Content-addressed names already are the SHA-256 of the content.
+    stem = os.path.splitext(os.path.basename(name))[0]
+    if DIGEST_RE.match(stem):
+        return f'"{stem}"'
+    return f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` for a single ``bytes=`` range, ``None`` to serve
+    the whole file, or ``False`` if the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if not match or match.groups() == ('', ''):
+        # Absent, malformed or multi-range: a full 200 response is allowed.
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start > end:
+            return False
+    if start >= size or size == 0:
+        return False
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def serve(request, field_file, download_name):
+    path = field_file.path
+    stat = os.stat(path)
+    etag = get_etag(field_file.name, stat)
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _add_validators(not_modified, etag, last_modified)
+
+    backend = getattr(settings, 'DOCUMENT_SENDFILE_BACKEND', '')
+    if backend:
+        response = HttpResponse(content_type=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+        if backend == 'nginx':
+            response['X-Accel-Redirect'] = quote(settings.DOCUMENT_SENDFILE_PREFIX.rstrip('/') + '/' + field_file.name)
+        else:
+            response['X-Sendfile'] = path
+        response['Content-Disposition'] = f'inline; filename="{download_name}"'
+    else:
+        byte_range = None
+        if request.method == 'GET' and if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+        file = open(path, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(RangeFile(file, start, end - start + 1), filename=download_name, status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(file, filename=download_name)
+            response['Content-Length'] = str(stat.st_size)
+        response['Accept-Ranges'] = 'bytes'
+
+    return _add_validators(response, etag, last_modified)
+
+
+def _add_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Browsers may keep the file but must revalidate each view (a cheap 304).
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,290 @@
+"""
+Per-user streams of claim and payment status changes, served as server-sent
+events by ``GET /api/events/`` (accounts.async_views).
+
+Every status change, whether made by ``save()`` or one of the bulk paths
+(``claim_statuses_changed`` / ``payment_statuses_changed``), is recorded as
+a ``StatusEvent`` row in the same transaction (see accounts.signals):
+``save()`` wraps the row and its post_save handlers in one
+(accounts.models.LoadedValuesMixin) and the bulk paths send their signal
+inside theirs. Once the transaction commits, the row is handed to the backend named by
+``STATUS_EVENTS['BACKEND']``, which gets it to the ``Broker`` of each
+process holding a stream for that user:
+
+* ``LocalBackend``: straight to this process's broker. Streams served by
+  other processes never see the event. Enough for tests and a
+  single-process server.
+* ``DatabaseBackend`` (default): the same immediate local delivery, plus
+  one task per process that reads new rows from the table every
+  ``POLL_INTERVAL`` seconds and delivers them to the streams open there.
+  That is one query per process and interval, however many clients are
+  connected.
+
+The row id is the SSE event id. A client reconnecting with ``Last-Event-ID``
+first gets the rows it missed (kept for ``RETENTION`` seconds; see
+``purge_status_events``), then the live stream.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+from .models import StatusEvent
+
+CLAIM = 'claim'
+PAYMENT = 'payment'
+
+DEFAULTS = {
+    'BACKEND': 'accounts.events.DatabaseBackend',
+    'POLL_INTERVAL': 1.0,
+    # Rows are read again for this many seconds after they were written: a
+    # transaction that took an id earlier but committed later is still seen.
+    'COMMIT_GRACE': 5.0,
+    'HEARTBEAT': 15.0,
+    'RETRY': 3000,
+    'RETENTION': 7 * 24 * 3600,
+    # Events queued for one slow stream before it is closed (the client
+    # reconnects and catches up from the table).
+    'MAX_QUEUED': 1000,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'STATUS_EVENTS', {})}
+
+
+def record(kind, changes):
+    """
+    Store ``(pk, user_id, old_status, new_status)`` changes of ``kind``
+    rows and publish them once the current transaction commits.
+    """
+    now = timezone.now()
+    events = StatusEvent.objects.bulk_create([
+        StatusEvent(
+            user_id=user_id, kind=kind, object_id=pk, status=new, previous_status=old or '', created_at=now,
+        )
+        for pk, user_id, old, new in changes
+        if user_id is not None and old != new
+    ])
+    if events:
+        transaction.on_commit(lambda: get_backend().publish(events))
+    return events
+
+
+def format_event(event):
+    data = {
+        'id': event.object_id,
+        'status': event.status,
+        'previous_status': event.previous_status or None,
+        'at': serializers.DateTimeField().to_representation(event.created_at),
+    }
+    return f'id: {event.pk}\nevent: {event.kind}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class Subscription:
+    """The queue of one open stream, fed from any thread."""
+    closed = object()
+
+    def __init__(self, user_id, max_queued):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.max_queued = max_queued
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # The loop has closed; the stream is gone.
+
+    def _put(self, event):
+        if self.queue.qsize() >= self.max_queued:
+            event = self.closed
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    """Fan-out of events to the streams open in this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, max_queued):
+        subscription = Subscription(user_id, max_queued)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def deliver(self, events):
+        with self._lock:
+            targets = [(event, list(self._subscriptions.get(event.user_id, ()))) for event in events]
+        for event, subscriptions in targets:
+            for subscription in subscriptions:
+                subscription.put(event)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+broker = Broker()
+
+
+class LocalBackend:
+    def __init__(self, config, broker):
+        self.config = config
+        self.broker = broker
+
+    def publish(self, events):
+        self.broker.deliver(events)
+
+    def listen(self):
+        """Called by each new stream, on its event loop."""
+
+
+class DatabaseBackend(LocalBackend):
+    def __init__(self, config, broker):
+        super().__init__(config, broker)
+        self._task = None
+        self._delivered = set()
+        self._lock = threading.Lock()
+
+    def publish(self, events):
+        with self._lock:
+            self._delivered.update(event.pk for event in events)
+        super().publish(events)
+
+    def listen(self):
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _poll(self):
+        floor = await self._settled_floor()
+        while len(self.broker):
+            await asyncio.sleep(self.config['POLL_INTERVAL'])
+            try:
+                rows = [event async for event in StatusEvent.objects.filter(pk__gt=floor).order_by('pk')]
+            except DatabaseError:
+                continue  # Try again next interval; the rows stay in the table.
+            with self._lock:
+                fresh = [event for event in rows if event.pk not in self._delivered]
+                self._delivered.update(event.pk for event in fresh)
+            self.broker.deliver(fresh)
+            # Rows older than the grace period are final: stop reading them.
+            horizon = timezone.now() - timedelta(seconds=self.config['COMMIT_GRACE'])
+            floor = max((event.pk for event in rows if event.created_at <= horizon), default=floor)
+            with self._lock:
+                self._delivered = {pk for pk in self._delivered if pk > floor}
+
+    async def _settled_floor(self):
+        horizon = timezone.now() - timedelta(seconds=self.config['COMMIT_GRACE'])
+        latest = await StatusEvent.objects.filter(created_at__lte=horizon).order_by('-pk').values_list(
+            'pk', flat=True).afirst()
+        return latest or 0
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    config = get_config()
+    if _backend is None or _backend.config != config:
+        _backend = import_string(config['BACKEND'])(config, broker)
+    return _backend
+
+
+def _first_connect_floor(user_id):
+    """
+    Where a client that sent no ``Last-Event-ID`` starts: after the user's
+    newest event that is older than ``COMMIT_GRACE``. The few newer ones are
+    replayed, so an event whose transaction took an id earlier but commits
+    later is not skipped.
+    """
+    horizon = timezone.now() - timedelta(seconds=get_config()['COMMIT_GRACE'])
+    return StatusEvent.objects.filter(user_id=user_id, created_at__lte=horizon).order_by('-pk').values_list('pk', flat=True)
+
+
+def parse_last_event_id(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+async def stream(user_id, last_event_id=None):
+    """The SSE body of ``user_id``'s stream, resuming after ``last_event_id``."""
+    config = get_config()
+    subscription = broker.subscribe(user_id, config['MAX_QUEUED'])
+    try:
+        get_backend().listen()
+        yield f'retry: {config["RETRY"]}\n\n'
+        if last_event_id is None:
+            # Give the client an id to reconnect with, even if no event comes.
+            last_event_id = await _first_connect_floor(user_id).afirst() or 0
+            yield f'id: {last_event_id}\n\n'
+        replayed = set()
+        # Subscribed first, so nothing committed meanwhile falls between the
+        # backlog and the live events; duplicates are skipped.
+        async for event in StatusEvent.objects.filter(user_id=user_id, pk__gt=last_event_id).order_by('pk'):
+            replayed.add(event.pk)
+            yield format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), config['HEARTBEAT'])
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event is Subscription.closed:
+                return
+            if event.pk not in replayed:
+                yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def backlog(user_id, last_event_id=None):
+    """
+    A stream body that ends after the events missed since ``last_event_id``,
+    for servers that cannot hold a connection open cheaply (WSGI): the client
+    reconnects after ``RETRY`` milliseconds.
+    """
+    yield f'retry: {get_config()["RETRY"]}\n\n'
+    if last_event_id is None:
+        # A first connection: without an id line the client would reconnect
+        # without one again, forever, and never be sent an event.
+        last_event_id = _first_connect_floor(user_id).first() or 0
+        yield f'id: {last_event_id}\n\n'
+    for event in StatusEvent.objects.filter(user_id=user_id, pk__gt=last_event_id).order_by('pk'):
+        yield format_event(event)
+
+
+def purge(batch_size=1000):
+    """Delete events older than ``RETENTION``; return how many were removed."""
+    cutoff = timezone.now() - timedelta(seconds=get_config()['RETENTION'])
+    removed = 0
+    while True:
+        pks = list(
+            StatusEvent.objects.filter(created_at__lt=cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return removed
+        removed += StatusEvent.objects.filter(pk__in=pks).delete()[0]
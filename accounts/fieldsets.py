@@ -0,0 +1,67 @@
+"""
+Sparse fieldsets: ``?fields=id,status,created_at`` on list and detail GETs.
+
+The selection trims the serializer, and it is pushed down to the query as
+``.only()``, or as the ``.values()`` columns on the fast list path
+(accounts.encoders). Unselected columns, such as a long ``description``,
+are never read from the database. The primary key and the keyset ordering
+fields are always loaded, because the paginator needs them for its cursor.
+They are still left out of the response unless selected.
+"""
+from rest_framework.exceptions import ValidationError
+
+from .pagination import get_cursor_fields
+
+FIELDS_PARAM = 'fields'
+SPARSE_ACTIONS = ('list', 'retrieve')
+
+
+def readable_fields(serializer_class):
+    return [name for name, field in serializer_class().fields.items() if not field.write_only]
+
+
+def parse_fields(raw, serializer_class):
+    """The requested field names in serializer order; raise ValidationError for unknown ones."""
+    requested = [name.strip() for name in raw.split(',') if name.strip()]
+    available = readable_fields(serializer_class)
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: [
+            f'Unknown field(s): {", ".join(unknown)}. Choose from: {", ".join(available)}.'
+        ]})
+    return [name for name in available if name in requested]
+
+
+class SparseFieldsMixin:
+    """``?fields=`` support for ``list`` and ``retrieve``; other actions ignore it."""
+
+    def get_requested_fields(self):
+        """The selected field names, or None for all of them."""
+        if getattr(self, 'action', None) not in SPARSE_ACTIONS:
+            return None
+        if not hasattr(self, '_requested_fields'):
+            raw = self.request.query_params.get(FIELDS_PARAM, '')
+            self._requested_fields = parse_fields(raw, self.get_serializer_class()) if raw.strip() else None
+        return self._requested_fields
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+        serializer = self.get_serializer_class()()
+        sources = [serializer.fields[name].source for name in fields]
+        return queryset.only(*dict.fromkeys([*sources, *get_cursor_fields(self, queryset)]))
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_requested_fields()
+        if fields is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in list(target.fields):
+                if name not in fields:
+                    target.fields.pop(name)
+        return serializer
+
+    def get_encoder_fields(self):
+        return self.get_requested_fields()
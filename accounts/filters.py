@@ -0,0 +1,64 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class RecordFilterBackend(BaseFilterBackend):
+    """
+    Server-side filters for the claims and payments lists.
+
+    Each name in ``view.filter_fields`` is an exact-match query parameter
+    (``?status=pending``), validated against the field's choices where it has
+    any. ``created_after`` (inclusive) and ``created_before`` (exclusive) take an
+    ISO date or datetime and bound ``created_at``. Every combination is backed
+    by a ``(user, <field>, created_at)`` index on the model.
+    """
+    range_params = (
+        ('created_after', 'created_at__gte'),
+        ('created_before', 'created_at__lt'),
+    )
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        filters = {}
+        errors = {}
+
+        for name in getattr(view, 'filter_fields', ()):
+            if name not in params:
+                continue
+            value = params[name]
+            choices = queryset.model._meta.get_field(name).choices
+            if choices and value not in dict(choices):
+                errors[name] = [f'"{value}" is not a valid choice.']
+            else:
+                filters[name] = value
+
+        for param, lookup in self.range_params:
+            if param not in params:
+                continue
+            value = self.parse_moment(params[param])
+            if value is None:
+                errors[param] = ['Enter a valid date or datetime (ISO 8601).']
+            else:
+                filters[lookup] = value
+
+        if errors:
+            raise ValidationError(errors)
+        return queryset.filter(**filters)
+
+    def parse_moment(self, value):
+        try:
+            moment = parse_datetime(value)
+            if moment is None:
+                day = parse_date(value)
+                if day is None:
+                    return None
+                moment = datetime.combine(day, time.min)
+        except ValueError:
+            return None
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
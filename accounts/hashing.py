@@ -0,0 +1,120 @@
+"""
+Password hashing and verification, optionally offloaded to a process pool.
+
+With ``PASSWORD_HASHING_POOL['ENABLED']`` off (the default) these helpers call
+Django's hashers inline. When it is on, the PBKDF2 work runs in a small pool
+of worker processes and the number of hashes queued or in flight is capped at
+``MAX_PENDING``. Past that cap a login or registration fails at once with a 503
+and ``Retry-After``, rather than parking yet another request thread behind the
+hasher. The rest of the API keeps free threads and CPU during login bursts.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+DEFAULTS = {
+    'ENABLED': False,
+    'WORKERS': 2,
+    'MAX_PENDING': 8,
+    'TIMEOUT': 5.0,
+}
+
+_lock = threading.Lock()
+_pool = None
+_slots = None
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy. Please try again shortly.'
+    default_code = 'hashing_pool_saturated'
+    # DRF's exception handler turns this into a Retry-After header.
+    wait = 1
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING_POOL', {})}
+
+
+def _init_worker():
+    # Workers are spawned rather than forked from a threaded server, so they
+    # need their own settings to find the configured hashers.
+    import django
+    django.setup()
+
+
+def _get_pool(config):
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=config['WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+            _slots = threading.BoundedSemaphore(config['MAX_PENDING']) if config['MAX_PENDING'] else None
+        return _pool, _slots
+
+
+def shutdown():
+    """Stop the worker processes; the next offloaded hash starts a new pool."""
+    global _pool, _slots
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = _slots = None
+
+
+@receiver(setting_changed)
+def _reset_pool(*, setting, **kwargs):
+    if setting == 'PASSWORD_HASHING_POOL':
+        shutdown()
+
+
+def _run(func, *args):
+    config = get_config()
+    if not config['ENABLED']:
+        return func(*args)
+
+    pool, slots = _get_pool(config)
+    if slots is None or not slots.acquire(blocking=False):
+        raise HashingPoolSaturated()
+    try:
+        future = pool.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the job leaves the pool, not until this request
+    # gives up on it: a timed-out hash still occupies the queue or a worker.
+    future.add_done_callback(lambda future: slots.release())
+    try:
+        return future.result(timeout=config['TIMEOUT'])
+    except FutureTimeoutError:
+        future.cancel()  # Frees the slot at once if the job has not started.
+        raise HashingPoolSaturated()
+
+
+def make_password(password):
+    """Hash ``password`` with the default hasher."""
+    return _run(hashers.make_password, password)
+
+
+def check_password(user, password):
+    """
+    Verify ``password`` against ``user``'s stored hash, like
+    ``user.check_password()``, and upgrade the hash if the hasher settings
+    have changed since it was made.
+    """
+    is_correct, must_update = _run(hashers.verify_password, password, user.password)
+    if is_correct and must_update:
+        user.password = make_password(password)
+        user.save(update_fields=['password'])
+    return is_correct
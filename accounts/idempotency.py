@@ -0,0 +1,155 @@
+"""
+``Idempotency-Key`` support for create endpoints.
+
+The first request with a given key (per user) inserts an in-progress
+``IdempotencyKey`` row. The unique constraint on ``(user, key)`` means a
+concurrent duplicate cannot also start. The view then runs, and its writes
+and the stored response commit in one transaction. Later requests with the
+same key get the stored status and body back without running serializers
+or writes again:
+
+* same key, same request body: the stored response, marked with
+  ``Idempotent-Replayed: true``;
+* same key, different body: 422;
+* same key while the first request is still running: 409 with
+  ``Retry-After``.
+
+Requests that raise (validation errors included) or return a 5xx response
+roll back and release the key, so the client can retry with it. Expired
+keys are removed by ``manage.py purge_idempotency_keys``.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+DEFAULTS = {
+    'TTL': 24 * 3600,
+    'LOCK_TIMEOUT': 60,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY_KEYS', {})}
+
+
+class RequestInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+    default_code = 'idempotency_key_in_use'
+
+
+class KeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def fingerprint(request):
+    """SHA-256 of the method, path and parsed body; uploads count by name and size."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+
+    def encode(value):
+        if isinstance(value, UploadedFile):
+            return {'file': value.name, 'size': value.size}
+        return str(value)
+
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, default=encode)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def run(request, key, handler):
+    """Run ``handler()`` (the real create) at most once for ``key``; see module docstring."""
+    if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+        raise ValidationError({HEADER: ['Use a key of at most 255 characters.']})
+    config = get_config()
+    digest = fingerprint(request)
+    record = _claim(request.user, key, digest, config)
+    if record.status_code is not None:
+        return _replay(record)
+
+    try:
+        with transaction.atomic():
+            response = handler()
+            if response.status_code >= 500:
+                raise _ServerError(response)
+            record.status_code = response.status_code
+            record.response_body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+            record.save(update_fields=['status_code', 'response_body'])
+    except _ServerError as error:
+        record.delete()
+        return error.response
+    except BaseException:
+        record.delete()
+        raise
+    return response
+
+
+class _ServerError(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def _claim(user, key, digest, config):
+    """The key's row: a fresh in-progress one for us, or the earlier request's."""
+    for _ in range(3):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=digest, created_at=now,
+                    expires_at=now + timedelta(seconds=config['TTL']),
+                )
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            continue  # released between our INSERT and SELECT
+        if record.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+            continue
+        if record.fingerprint != digest:
+            raise KeyReused()
+        if record.status_code is not None:
+            return record
+        if record.created_at > now - timedelta(seconds=config['LOCK_TIMEOUT']):
+            error = RequestInProgress()
+            error.wait = config['LOCK_TIMEOUT']
+            raise error
+        # The first request died without releasing the key; take it over.
+        if IdempotencyKey.objects.filter(pk=record.pk, status_code=None, created_at=record.created_at).update(created_at=now):
+            record.created_at = now
+            return record
+    raise RequestInProgress()
+
+
+def _replay(record):
+    return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+class IdempotentCreateMixin:
+    """
+    Makes ``create`` honour the ``Idempotency-Key`` header for authenticated
+    callers. Requests without the header behave as before.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return super().create(request, *args, **kwargs)
+        return run(request, key, lambda: super(IdempotentCreateMixin, self).create(request, *args, **kwargs))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import uploads
+from accounts.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = "Delete expired upload sessions and their part files, plus orphaned part files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        removed = 0
+        while True:
+            batch = list(UploadSession.objects.filter(expires_at__lte=now).order_by('expires_at')[:options['batch_size']])
+            if not batch:
+                break
+            for session in batch:
+                uploads.delete_part_file(session)
+            UploadSession.objects.filter(pk__in=[session.pk for session in batch]).delete()
+            removed += len(batch)
+
+        # Part files whose session row is gone (e.g. deleted with its user).
+        orphans = 0
+        partial_dir = uploads.partial_dir()
+        if partial_dir.is_dir():
+            cutoff = time.time() - uploads.get_ttl().total_seconds()
+            live = {str(pk) for pk in UploadSession.objects.values_list('pk', flat=True).iterator()}
+            for path in partial_dir.glob('*.part'):
+                if path.stem not in live and path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+                    orphans += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired session(s) and {orphans} orphaned part file(s)."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import exports
+from accounts.models import Claim, Payment
+
+MODELS = {
+    'claims': Claim,
+    'payments': Payment,
+}
+
+
+class Command(BaseCommand):
+    help = "Stream every claim or payment to a file (or stdout) as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('records', choices=sorted(MODELS))
+        parser.add_argument('--format', dest='export_format', choices=sorted(exports.FORMATS), default='ndjson')
+        parser.add_argument('--output', '-o', default='-', help='File to write to; "-" for stdout (default).')
+        parser.add_argument('--user', type=int, help='Only export rows belonging to this user id.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        queryset = MODELS[options['records']].objects.all()
+        if options['user'] is not None:
+            queryset = queryset.filter(user_id=options['user'])
+
+        chunks = exports.stream(queryset, options['export_format'], chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        try:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        except OSError as exc:
+            raise CommandError(f"Cannot write to {options['output']}: {exc}")
+        self.stderr.write(self.style.SUCCESS(f"Exported {options['records']} to {options['output']}."))
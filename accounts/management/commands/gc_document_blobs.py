@@ -0,0 +1,91 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Claim, DocumentBlob
+from accounts.storage import get_document_storage
+
+
+class Command(BaseCommand):
+    help = "Delete claim document files that no claim references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--grace-hours', type=float,
+            help='Only collect blobs unreferenced for this long (default: DOCUMENT_BLOB_GC_GRACE_HOURS).',
+        )
+        parser.add_argument(
+            '--orphans', action='store_true',
+            help='Also delete files under the document directory that have no DocumentBlob row.',
+        )
+
+    def handle(self, *args, **options):
+        storage = get_document_storage()
+        grace = options['grace_hours']
+        if grace is None:
+            grace = getattr(settings, 'DOCUMENT_BLOB_GC_GRACE_HOURS', 24)
+        cutoff = timezone.now() - timedelta(hours=grace)
+
+        removed = freed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                DocumentBlob.objects
+                .filter(refcount=0, updated_at__lte=cutoff, pk__gt=last_pk)
+                .order_by('pk')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for blob in batch:
+                with transaction.atomic():
+                    # Re-check under the delete: an upload of the same bytes
+                    # may have taken a new reference since the batch was read.
+                    deleted, _ = DocumentBlob.objects.filter(pk=blob.pk, refcount=0).delete()
+                    if deleted:
+                        storage.purge(blob.name)
+                if deleted:
+                    removed += 1
+                    freed += blob.size
+
+        orphans = self.delete_orphans(storage, cutoff) if options['orphans'] else 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} unreferenced blob(s) ({freed} bytes) and {orphans} orphaned file(s)."
+        ))
+
+    def delete_orphans(self, storage, cutoff):
+        root = storage.path('claims')
+        if not os.path.isdir(root):
+            return 0
+        known = set(DocumentBlob.objects.values_list('name', flat=True).iterator())
+        referenced = set(
+            Claim.objects
+            .exclude(document='').exclude(document__isnull=True)
+            .values_list('document', flat=True).iterator()
+        )
+        deadline = cutoff.timestamp()
+        removed = 0
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                if name in known or name in referenced:
+                    continue
+                if os.stat(path).st_mtime < deadline:
+                    os.unlink(path)
+                    removed += 1
+        # Spool files left behind by interrupted uploads.
+        incoming = os.path.join(storage.location, '.incoming')
+        if os.path.isdir(incoming):
+            for entry in os.scandir(incoming):
+                if entry.is_file() and entry.stat().st_mtime < min(deadline, time.time() - 3600):
+                    os.unlink(entry.path)
+                    removed += 1
+        return removed
@@ -0,0 +1,34 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from accounts import payments
+
+
+class Command(BaseCommand):
+    help = "Apply payment-provider webhook events from the inbox to payments, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=payments.BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new events.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when idle with --loop.')
+
+    def handle(self, *args, **options):
+        total = Counter()
+        while True:
+            outcomes = payments.process_pending(options['batch_size'])
+            if outcomes:
+                total.update(outcomes)
+                self.stdout.write(f"Processed {sum(outcomes.values())} event(s): {self.describe(outcomes)}.")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {sum(total.values())} event(s) processed ({self.describe(total) or 'none'})."
+        ))
+
+    def describe(self, outcomes):
+        return ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items()))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from accounts import tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding JWT refresh tokens and their blacklist entries in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        outstanding, blacklisted = tokens.purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {outstanding} expired outstanding token(s), {blacklisted} of them blacklisted."
+        ))
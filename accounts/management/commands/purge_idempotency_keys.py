@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key records in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        removed = 0
+        while True:
+            # Short deletes by primary key keep each transaction (and lock) small.
+            pks = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now)
+                .order_by('expires_at').values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            removed += IdempotencyKey.objects.filter(pk__in=pks, expires_at__lte=now).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired idempotency key(s)."))
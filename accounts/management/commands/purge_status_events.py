@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts import events
+
+
+class Command(BaseCommand):
+    help = "Delete status events older than STATUS_EVENTS['RETENTION'] in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = events.purge(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired status event(s)."))
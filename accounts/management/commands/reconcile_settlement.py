@@ -0,0 +1,116 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import settlement
+
+REPORT_COLUMNS = ['line', 'reference', 'amount', 'status', 'problem', 'expected_amount']
+
+
+class Command(BaseCommand):
+    help = (
+        "Settle payments from a provider settlement file (CSV or JSON lines), streamed in chunks. "
+        "Unmatched and mismatched rows go to a CSV report. An interrupted run resumes from its state file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=settlement.FORMATS,
+                            help='Default: from the file extension (.jsonl/.ndjson, otherwise CSV).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per transaction.')
+        parser.add_argument('--report', help='Report of problem rows (default: <path>.report.csv).')
+        parser.add_argument('--state', help='Progress file used to resume (default: <path>.state.json).')
+        parser.add_argument('--restart', action='store_true', help='Ignore any saved progress and start over.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"No such file: {path}")
+        file_format = options['file_format'] or settlement.guess_format(path)
+        report_path = options['report'] or f'{path}.report.csv'
+        state_path = options['state'] or f'{path}.state.json'
+        size = os.path.getsize(path)
+
+        state = self.load_state(state_path, path, size, options['restart'])
+        if state['offset'] and state['offset'] >= size:
+            self.stdout.write(f"{path} was already reconciled; see {report_path} (use --restart to run it again).")
+            return
+        if state['offset']:
+            self.stdout.write(f"Resuming {path} at line {state['line']:,} ({state['offset'] / size:.0%}).")
+
+        # Drop report rows written after the last saved chunk; that chunk is
+        # replayed, and re-applying it is harmless (settled payments are
+        # "unchanged" the second time).
+        report = open(report_path, 'r+' if state['report_offset'] else 'w', newline='', encoding='utf-8')
+        with report:
+            report.seek(state['report_offset'])
+            report.truncate()
+            writer = csv.writer(report)
+            if not state['report_offset']:
+                writer.writerow(REPORT_COLUMNS)
+
+            counts = Counter(state['counts'])
+            started = time.perf_counter()
+            processed = 0
+            chunk = []
+            for line, offset, row in settlement.read_rows(path, file_format, state['offset'], state['line']):
+                chunk.append((line, row))
+                if len(chunk) >= options['chunk_size']:
+                    processed += self.flush(chunk, counts, writer, report, state, state_path, line, offset)
+                    chunk = []
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{state['line']:,} lines ({offset / size:.0%}), {processed / elapsed:,.0f} rows/s"
+                    )
+            if chunk:
+                processed += self.flush(chunk, counts, writer, report, state, state_path, line, offset)
+            if state['offset'] < size:
+                # Only blank lines (or just the header) after the last chunk.
+                state.update(offset=size)
+                self.save_state(state_path, state)
+
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f"{counts[key]:,} {key}" for key in (
+            settlement.APPLIED, settlement.UNCHANGED, *settlement.PROBLEMS))
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {sum(counts.values()):,} rows ({summary}) at {processed / max(elapsed, 1e-9):,.0f} rows/s. "
+            f"Report: {report_path}"
+        ))
+
+    def flush(self, chunk, counts, writer, report, state, state_path, line, offset):
+        chunk_counts, problems = settlement.reconcile(chunk)
+        for problem_line, row, problem, expected in problems:
+            writer.writerow([
+                problem_line, row.get('reference', ''), row.get('amount', ''), row.get('status', ''),
+                problem, expected,
+            ])
+        report.flush()
+        os.fsync(report.fileno())
+        counts.update(chunk_counts)
+        # Saved after the chunk committed: a crash in between replays it.
+        state.update(offset=offset, line=line, report_offset=report.tell(), counts=dict(counts))
+        self.save_state(state_path, state)
+        return len(chunk)
+
+    def load_state(self, state_path, path, size, restart):
+        fresh = {'path': os.path.abspath(path), 'size': size, 'offset': 0, 'line': 0, 'report_offset': 0, 'counts': {}}
+        if restart or not os.path.exists(state_path):
+            return fresh
+        try:
+            with open(state_path, encoding='utf-8') as handle:
+                state = json.load(handle)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {state_path}: {exc}. Use --restart to start over.")
+        if state.get('path') != fresh['path'] or state.get('size') != size:
+            raise CommandError(f"{state_path} belongs to a different file. Use --restart to start over.")
+        return {**fresh, **state}
+
+    def save_state(self, state_path, state):
+        temporary = f'{state_path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump(state, handle)
+        os.replace(temporary, state_path)
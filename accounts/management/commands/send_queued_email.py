@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox over a single reused mail connection per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Messages per batch (default: EMAIL_OUTBOX BATCH_SIZE).')
+        parser.add_argument('--max-attempts', type=int, help='Give up on a message after this many failures.')
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new messages.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when idle with --loop.')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = outbox.send_due(options['batch_size'], options['max_attempts'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}.")
+                # Keep draining while the last batch made progress; a batch
+                # that only failed means the server is down, so back off.
+                if sent:
+                    continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total_sent} sent, {total_failed} failed."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_claim_payment_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['user', 'status', 'created_at', 'id'], name='claim_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['user', 'claim_type', 'created_at', 'id'], name='claim_user_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'status', 'created_at', 'id'], name='payment_user_status_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import migrations
+
+INDEX_NAME = 'user_email_login_idx'
+
+
+def _user_table(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    quote = schema_editor.quote_name
+    return quote(User._meta.db_table), quote(User._meta.get_field('email').column)
+
+
+def create_email_index(apps, schema_editor):
+    """
+    Index the user email for case-insensitive login lookups.
+
+    ``email__iexact`` compiles to ``UPPER(email) = UPPER(%s)`` on PostgreSQL,
+    a NOCASE ``LIKE`` on SQLite and a ``LIKE`` under a case-insensitive
+    collation on MySQL, so each backend needs its own flavour of index.
+    """
+    table, column = _user_table(apps, schema_editor)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        expression = f'UPPER({column}::text)'
+    elif vendor == 'sqlite':
+        expression = f'{column} COLLATE NOCASE'
+    else:
+        expression = column
+    schema_editor.execute(f'CREATE INDEX {INDEX_NAME} ON {table} ({expression})')
+
+
+def drop_email_index(apps, schema_editor):
+    table, _ = _user_table(apps, schema_editor)
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(f'DROP INDEX {INDEX_NAME} ON {table}')
+    else:
+        schema_editor.execute(f'DROP INDEX {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_claim_payment_filter_indexes'),
+        # Run after the last auth migration: SQLite rebuilds the table on
+        # ALTER, which would drop an index created before it.
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
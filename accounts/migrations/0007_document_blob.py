@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:19
+
+import accounts.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_upload_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='claim',
+            name='document',
+            field=models.FileField(blank=True, null=True, storage=accounts.storage.get_document_storage, upload_to='claims/'),
+        ),
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('digest', models.CharField(max_length=64)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refcount', 'updated_at'], name='document_blob_gc_idx')],
+            },
+        ),
+    ]
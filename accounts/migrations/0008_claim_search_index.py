@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# Frozen copies of the DDL: later changes to accounts.search must not change
+# what this migration does.
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS accounts_claim_fts USING fts5("
+    "claim_type, description, content='accounts_claim', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS accounts_claim_fts_ai AFTER INSERT ON accounts_claim BEGIN "
+    "INSERT INTO accounts_claim_fts(rowid, claim_type, description) "
+    "VALUES (new.id, new.claim_type, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS accounts_claim_fts_ad AFTER DELETE ON accounts_claim BEGIN "
+    "INSERT INTO accounts_claim_fts(accounts_claim_fts, rowid, claim_type, description) "
+    "VALUES ('delete', old.id, old.claim_type, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS accounts_claim_fts_au AFTER UPDATE OF claim_type, description ON accounts_claim "
+    "BEGIN "
+    "INSERT INTO accounts_claim_fts(accounts_claim_fts, rowid, claim_type, description) "
+    "VALUES ('delete', old.id, old.claim_type, old.description); "
+    "INSERT INTO accounts_claim_fts(rowid, claim_type, description) "
+    "VALUES (new.id, new.claim_type, new.description); END",
+    # Index the claims that already exist.
+    "INSERT INTO accounts_claim_fts(accounts_claim_fts) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS accounts_claim_fts_ai',
+    'DROP TRIGGER IF EXISTS accounts_claim_fts_ad',
+    'DROP TRIGGER IF EXISTS accounts_claim_fts_au',
+    'DROP TABLE IF EXISTS accounts_claim_fts',
+]
+POSTGRESQL_INSTALL = [
+    # A stored generated column is filled for the existing rows as it is added.
+    "ALTER TABLE accounts_claim ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(claim_type, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    'CREATE INDEX claim_search_vector_idx ON accounts_claim USING GIN (search_vector)',
+]
+POSTGRESQL_UNINSTALL = [
+    'DROP INDEX IF EXISTS claim_search_vector_idx',
+    'ALTER TABLE accounts_claim DROP COLUMN IF EXISTS search_vector',
+]
+MYSQL_INSTALL = ['CREATE FULLTEXT INDEX claim_fulltext_idx ON accounts_claim (claim_type, description)']
+MYSQL_UNINSTALL = ['DROP INDEX claim_fulltext_idx ON accounts_claim']
+
+INSTALL = {'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRESQL_INSTALL, 'mysql': MYSQL_INSTALL}
+UNINSTALL = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRESQL_UNINSTALL, 'mysql': MYSQL_UNINSTALL}
+
+
+def install(apps, schema_editor):
+    for sql in INSTALL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def uninstall(apps, schema_editor):
+    for sql in UNINSTALL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    """
+    Full-text index over claim_type and description; see accounts.search.
+    The index lives outside the model state (FTS5 table, generated column or
+    FULLTEXT index depending on the database).
+    """
+
+    dependencies = [
+        ('accounts', '0007_document_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
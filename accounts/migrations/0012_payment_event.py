@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('reference', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=20)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('outcome', models.CharField(blank=True, choices=[('applied', 'Applied'), ('unchanged', 'Unchanged'), ('unknown_payment', 'Unknown payment'), ('ignored', 'Ignored')], max_length=20)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='payment_event_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_collection_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('claim', 'Claim'), ('payment', 'Payment')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('previous_status', models.CharField(blank=True, max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='status_event_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_outbound_email_sending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentevent',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,51 @@
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
+from django.db.models.fields.files import FieldFile
 from django.conf import settings
+from django.utils import timezone
+
+from .storage import get_document_storage
+
+class LoadedValuesMixin:
+    """
+    Remember the values an instance was loaded with, so that signal handlers
+    can tell what a save() changed (a replaced document, a status moving
+    from pending to approved, ...) without re-querying the row.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The row and whatever the post_save handlers write with it (rollups,
+        # status events, ...) commit or roll back together. delete() needs no
+        # such wrapper: the deletion collector already sends post_delete
+        # inside its own transaction.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+        # post_save handlers have seen the old values; the saved ones are
+        # what the next save() will be compared against.
+        update_fields = kwargs.get('update_fields')
+        self._loaded_values = {
+            **getattr(self, '_loaded_values', {}),
+            **{
+                field.attname: self._stored_value(field)
+                for field in self._meta.concrete_fields
+                if field.attname in self.__dict__
+                and (update_fields is None or field.name in update_fields or field.attname in update_fields)
+            },
+        }
 
-class Claim(models.Model):
+    def _stored_value(self, field):
+        value = getattr(self, field.attname)
+        return value.name if isinstance(value, FieldFile) else value
+
+class Claim(LoadedValuesMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -10,14 +54,29 @@ class Claim(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     claim_type = models.CharField(max_length=100)
     description = models.TextField()
-    document = models.FileField(upload_to='claims/', blank=True, null=True)
+    document = models.FileField(upload_to='claims/', storage=get_document_storage, blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Backs keyset pagination of a user's claims, newest first.
+            models.Index(fields=['user', 'created_at', 'id'], name='claim_user_created_idx'),
+            # Back the ?status= and ?claim_type= list filters.
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='claim_user_status_idx'),
+            models.Index(fields=['user', 'claim_type', 'created_at', 'id'], name='claim_user_type_idx'),
+            # Back the admin changelist: newest first / date drill-down, and
+            # the status filter, across all users.
+            models.Index(fields=['created_at'], name='claim_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='claim_status_created_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.user.email} - {self.claim_type}"
+        # user_id avoids a query for anonymous claims, which have no user.
+        owner = self.user.email if self.user_id else 'anonymous'
+        return f"{owner} - {self.claim_type}"
 
-class Payment(models.Model):
+class Payment(LoadedValuesMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('completed', 'Completed'),
@@ -29,5 +88,242 @@ class Payment(models.Model):
     reference = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='payment_user_created_idx'),
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='payment_user_status_idx'),
+            models.Index(fields=['created_at'], name='payment_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.amount} - {self.status}"
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be delivered by the ``send_queued_email`` worker.
+
+    Request handlers enqueue rows here (see ``accounts.outbox``) instead of
+    talking to the SMTP server themselves.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker polls for pending rows that are due.
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable, chunked upload of a claim document (see accounts.uploads).
+
+    Bytes are appended to a part file under MEDIA_ROOT as the client PUTs
+    ranges; ``offset`` is the number of bytes acknowledged so far.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='upload_session_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def part_path(self):
+        from .uploads import partial_dir
+        return partial_dir() / f'{self.pk}.part'
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+
+class DocumentBlob(models.Model):
+    """
+    A deduplicated claim document file (see accounts.storage).
+
+    ``refcount`` is the number of claims whose ``document`` points at
+    ``name``. Blobs at zero are removed by ``gc_document_blobs``.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # The garbage collector looks for unreferenced blobs.
+            models.Index(fields=['refcount', 'updated_at'], name='document_blob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class ClaimStatusChange(models.Model):
+    """
+    Append-only audit trail of claim status changes (see accounts.transitions).
+
+    Rows are written in bulk and never updated or deleted; ``claim`` keeps its
+    id without a database constraint so the history outlives the claim.
+    """
+    claim = models.ForeignKey(Claim, on_delete=models.DO_NOTHING, db_constraint=False, related_name='status_changes')
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['claim', 'created_at'], name='claim_status_change_idx'),
+        ]
+
+    def __str__(self):
+        return f"Claim {self.claim_id}: {self.from_status} -> {self.to_status}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Claim status changes are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Claim status changes are append-only.")
+
+
+class IdempotencyKey(models.Model):
+    """
+    The outcome of a create request sent with an ``Idempotency-Key`` header
+    (see accounts.idempotency). ``status_code`` is null while the first
+    request is still running.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in progress'})"
+
+
+class PaymentEvent(models.Model):
+    """
+    A payment-provider callback, stored as received by the webhook and
+    applied to ``Payment`` later by ``process_payment_events`` (see
+    accounts.payments). ``event_id`` is the provider's id; redeliveries
+    of an event are dropped by its unique constraint.
+    """
+    OUTCOME_CHOICES = [
+        ('applied', 'Applied'),
+        ('unchanged', 'Unchanged'),
+        ('unknown_payment', 'Unknown payment'),
+        ('ignored', 'Ignored'),
+    ]
+    event_id = models.CharField(max_length=255, unique=True)
+    reference = models.CharField(max_length=100)
+    status = models.CharField(max_length=20)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # Set while the event waits for its payment to appear; not picked up before.
+    retry_at = models.DateTimeField(null=True, blank=True)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's queue: unprocessed events in arrival order. Partial,
+            # so it stays small however large the history grows.
+            models.Index(
+                fields=['id'], condition=models.Q(processed_at__isnull=True), name='payment_event_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id}: {self.reference} -> {self.status}"
+
+
+class CollectionVersion(models.Model):
+    """
+    A counter per user and collection ("claims", "payments"), bumped on every
+    write to that user's rows. List responses derive their ETag from it (see
+    accounts.versions).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    collection = models.CharField(max_length=20)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'collection'], name='collection_version_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.collection} of {self.user_id}: v{self.version}"
+
+
+class StatusEvent(models.Model):
+    """
+    A change of a claim's or payment's status, as delivered on its owner's
+    event stream (see accounts.events). The id is the SSE event id that
+    clients resume from with ``Last-Event-ID``.
+    """
+    KIND_CHOICES = [
+        ('claim', 'Claim'),
+        ('payment', 'Payment'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=20)
+    previous_status = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Resuming a stream: the user's events after Last-Event-ID.
+            models.Index(fields=['user', 'id'], name='status_event_user_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.user.email} - {self.amount} - {self.status}"
\ No newline at end of file
+        return f"{self.kind} {self.object_id}: {self.previous_status or '?'} -> {self.status}"
@@ -0,0 +1,140 @@
+"""
+Database-backed email outbox.
+
+``enqueue()`` stores a message as an ``OutboundEmail`` row, which costs one
+INSERT inside the request. ``send_due()`` is run by the ``send_queued_email``
+management command. It drains due messages in batches over a single reused
+connection to the mail server. Failed deliveries are retried with exponential
+backoff until ``EMAIL_OUTBOX['MAX_ATTEMPTS']`` is reached.
+
+No transaction is held while talking to the mail server. A batch is claimed
+in a short transaction (status ``sending``, leased for ``LEASE`` seconds),
+sent, and each result is recorded on its own. A worker that dies mid-batch
+leaves its messages to be claimed again once the lease runs out, so a
+message can be delivered twice but is never lost.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+DEFAULTS = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 30,
+    'MAX_BACKOFF': 3600,
+    # Seconds a claimed batch is reserved for its worker; keep it well above
+    # the time one batch takes to send.
+    'LEASE': 600,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EMAIL_OUTBOX', {})}
+
+
+def enqueue(subject, body, to, from_email=None, html_body=''):
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        to=list(to),
+    )
+
+
+def retry_delay(attempts, config):
+    return timedelta(seconds=min(config['RETRY_BACKOFF'] * 2 ** (attempts - 1), config['MAX_BACKOFF']))
+
+
+def send_due(batch_size=None, max_attempts=None):
+    """
+    Send one batch of due messages; return ``(sent, failed)`` counts.
+
+    The batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+    database supports it, so several workers can drain the outbox side by side.
+    """
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    max_attempts = max_attempts or config['MAX_ATTEMPTS']
+    messages = _claim(batch_size, config)
+    if not messages:
+        return 0, 0
+
+    now = timezone.now()
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        # The mail server is unreachable: every message in the batch
+        # counts one failed attempt.
+        for message in messages:
+            _record_failure(message, exc, now, max_attempts, config)
+        return 0, len(messages)
+    try:
+        for message in messages:
+            try:
+                _build(message, connection).send()
+            except Exception as exc:
+                _record_failure(message, exc, now, max_attempts, config)
+                failed += 1
+            else:
+                _record_sent(message)
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def _claim(batch_size, config):
+    """Lease a batch of due messages (pending, or sending with a lapsed lease) to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for message in messages:
+            message.status = 'sending'
+            message.next_attempt_at = now + timedelta(seconds=config['LEASE'])
+        OutboundEmail.objects.bulk_update(messages, ['status', 'next_attempt_at'])
+    return messages
+
+
+def _record_sent(message):
+    message.status = 'sent'
+    message.sent_at = timezone.now()
+    message.attempts += 1
+    message.last_error = ''
+    message.save(update_fields=['status', 'sent_at', 'attempts', 'last_error'])
+
+
+def _build(message, connection):
+    email = EmailMultiAlternatives(
+        message.subject,
+        message.body,
+        message.from_email or None,
+        message.to,
+        connection=connection,
+    )
+    if message.html_body:
+        email.attach_alternative(message.html_body, 'text/html')
+    return email
+
+
+def _record_failure(message, exc, now, max_attempts, config):
+    message.attempts += 1
+    message.last_error = f'{type(exc).__name__}: {exc}'
+    if message.attempts >= max_attempts:
+        message.status = 'failed'
+    else:
+        message.status = 'pending'
+        message.next_attempt_at = now + retry_delay(message.attempts, config)
+    message.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error'])
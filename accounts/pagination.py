@@ -0,0 +1,166 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination over a composite key such as ``(created_at, id)``.
+
+    Unlike DRF's ``CursorPagination`` (which seeks on the first ordering field
+    and falls back to an OFFSET for ties), every ordering field is part of the
+    cursor, so each page is a single index range scan no matter how deep the
+    client has paged.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-created_at', '-id')
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset()`` for async views, fetching the page with the async ORM."""
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request, view)])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.limit = self.get_page_size(request)
+        self.fields = self.get_ordering(request, queryset, view)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.build_seek_filter(position))
+
+        # Fetch one extra row to find out whether there is a next page.
+        return queryset.order_by(*self.fields)[:self.limit + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return min(self.page_size, self.max_page_size)
+        if requested <= 0:
+            return min(self.page_size, self.max_page_size)
+        return min(requested, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        # Honour ?ordering= when the view has an OrderingFilter, as DRF's own
+        # CursorPagination does.
+        ordering_filters = [
+            backend for backend in getattr(view, 'filter_backends', [])
+            if hasattr(backend, 'get_ordering')
+        ]
+        if ordering_filters:
+            ordering = ordering_filters[0]().get_ordering(request, queryset, view)
+        else:
+            ordering = getattr(view, 'ordering', None)
+        ordering = list(ordering or self.ordering)
+        # The primary key always closes the key so that every position is unique.
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            descending = ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return ordering
+
+    def build_seek_filter(self, position):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), spelled out with Q
+        # objects. The leading "a >= x" is redundant but gives the planner a
+        # plain range on the composite index to seek to, rather than an OR it
+        # has to evaluate row by row.
+        names = [field.lstrip('-') for field in self.fields]
+        seek = Q()
+        for index, field in enumerate(self.fields):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{names[index]}__{lookup}': position[index]})
+            for earlier in range(index):
+                step &= Q(**{names[earlier]: position[earlier]})
+            seek |= step
+        bound = 'lte' if self.fields[0].startswith('-') else 'gte'
+        return Q(**{f'{names[0]}__{bound}': position[0]}) & seek
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [self._get_value(last, field.lstrip('-')) for field in self.fields]
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(values))
+
+    def encode_cursor(self, values):
+        payload = json.dumps([str(value) for value in values], separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            raw = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if not isinstance(raw, list) or len(raw) != len(self.fields):
+                raise ValueError
+            return [
+                self._get_model_field(model, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.fields, raw)
+            ]
+        except (TypeError, ValueError, UnicodeError, BinasciiError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_html(self):
+        return ''
+
+    def _get_model_field(self, model, name):
+        if name == 'pk':
+            return model._meta.pk
+        return model._meta.get_field(name)
+
+    def _get_value(self, obj, name):
+        if isinstance(obj, dict):
+            return obj[name]
+        return getattr(obj, name)
+
+
+def get_cursor_fields(view, queryset):
+    """
+    Model fields the view's paginator reads from each row to build its
+    cursor: the primary key and, for keyset pagination, the ordering.
+    """
+    paginator = getattr(view, 'paginator', None)
+    fields = [queryset.model._meta.pk.name]
+    if isinstance(paginator, KeysetPagination):
+        ordering = paginator.get_ordering(view.request, queryset, view)
+        fields += [field.lstrip('-') for field in ordering]
+    return [queryset.model._meta.pk.name if field == 'pk' else field for field in dict.fromkeys(fields)]
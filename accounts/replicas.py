@@ -0,0 +1,157 @@
+"""
+Read replicas for the claim, payment and dashboard GET endpoints.
+
+Each ``DATABASE_URL_REPLICA_<NAME>`` environment variable adds a database
+alias ``replica_<name>`` and lists it in ``READ_REPLICAS['ALIASES']`` (see
+settings). ``ReplicaRouter`` sends a read to a healthy replica only while
+replica reads are switched on for the current request. Everything else goes
+to ``default``, the primary, as before: writes, reads in management commands
+and workers, authentication, and other views. The switch is on while a
+view with ``ReplicaReadMixin`` handles a GET or HEAD request.
+
+Read-your-writes: a successful write through such a view pins its user to
+the primary for ``PIN_SECONDS``, so a claim they just created shows up in
+their next list. Pins are kept in the Django cache ``CACHE``. With the
+default per-process local-memory cache, only the process that handled the
+write knows about the pin. Point ``CACHE`` at a shared cache when running
+several processes.
+
+Each process checks a replica (connect and ``SELECT 1``) at most once per
+``HEALTH_CHECK_INTERVAL`` seconds. While no replica is healthy, reads go to
+the primary.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+DEFAULTS = {
+    'ALIASES': [],
+    'PIN_SECONDS': 10,
+    'HEALTH_CHECK_INTERVAL': 5,
+    'CACHE': 'default',
+}
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'READ_REPLICAS', {})}
+
+
+class ReplicaHealth:
+    """Per-process health of the replicas, rechecked every ``HEALTH_CHECK_INTERVAL`` seconds."""
+
+    def __init__(self):
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias, interval):
+        with self._lock:
+            healthy, checked_at = self._checked.get(alias, (None, 0))
+        if healthy is None or checked_at + interval <= time.monotonic():
+            healthy = self.check(alias)
+            with self._lock:
+                self._checked[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except DatabaseError:
+            connection.close()
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._checked.clear()
+
+
+health = ReplicaHealth()
+
+
+def healthy_replicas():
+    config = get_config()
+    return [alias for alias in config['ALIASES'] if health.is_healthy(alias, config['HEALTH_CHECK_INTERVAL'])]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Also for instances read from a replica, which Django would
+        # otherwise save back to the database they came from.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *get_config()['ALIASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, e.g. before writing what was read."""
+    previous = _replica_reads.get()
+    _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.set(previous)
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin(user_id):
+    config = get_config()
+    if config['ALIASES'] and user_id is not None:
+        caches[config['CACHE']].set(_pin_key(user_id), True, config['PIN_SECONDS'])
+
+
+def is_pinned(user_id):
+    config = get_config()
+    return user_id is not None and caches[config['CACHE']].get(_pin_key(user_id)) is not None
+
+
+class ReplicaReadMixin:
+    """
+    Route the view's reads to a replica for GET and HEAD, unless the user is
+    pinned to the primary or ``replica_reads`` is off. Pin the user after a
+    successful write.
+    """
+    replica_reads = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Set, not reset with a token: async endpoints call initial() and
+        # finalize_response() in different contexts.
+        self._previous_replica_reads = _replica_reads.get()
+        user_id = request.user.pk if request.user.is_authenticated else None
+        if (self.replica_reads and request.method in SAFE_METHODS and get_config()['ALIASES']
+                and not is_pinned(user_id)):
+            _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if hasattr(self, '_previous_replica_reads'):
+            _replica_reads.set(self._previous_replica_reads)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            pin(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
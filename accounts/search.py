@@ -0,0 +1,150 @@
+"""
+Full-text search over ``Claim.claim_type`` and ``Claim.description``.
+
+Each database keeps its own index, created by migration 0008:
+
+* SQLite: an external-content FTS5 table ``accounts_claim_fts``, kept in
+  sync with ``accounts_claim`` by triggers and ranked with ``bm25()``.
+* PostgreSQL: a stored, generated ``search_vector`` tsvector column with a
+  GIN index, ranked with ``ts_rank_cd()``.
+* MySQL: a FULLTEXT index queried with ``MATCH ... AGAINST``.
+
+Queries are reduced to plain words and every word must match. Words are
+compared by English stem, so "stolen vehicles" finds a claim describing a
+"vehicle" that was "stolen". Other databases fall back to ``icontains``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+FTS_TABLE = 'accounts_claim_fts'
+TRIGGERS = ('accounts_claim_fts_ai', 'accounts_claim_fts_ad', 'accounts_claim_fts_au')
+PG_COLUMN = 'search_vector'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def terms(query):
+    return WORD_RE.findall(query or '')[:16]
+
+
+def get_candidate_limit():
+    return getattr(settings, 'CLAIM_SEARCH_CANDIDATES', 500)
+
+
+def _match_sql(vendor, words):
+    """
+    ``(sql, params)`` selecting ``(id, rank)`` of matching claims, best first.
+
+    Scoring every match of a common word costs time proportional to the
+    number of matches, so on every database only the newest
+    ``CLAIM_SEARCH_CANDIDATES`` matches are ranked; older ones are never
+    returned. Queries with fewer matches than that are ranked exactly. The
+    search API reports the cap as ``candidate_limit``.
+    """
+    candidates = get_candidate_limit()
+    if vendor == 'sqlite':
+        expression = ' '.join(f'"{word}"' for word in words)
+        match = f'{FTS_TABLE} MATCH %s'
+        # bm25() is "lower is better"; weight claim_type above description.
+        # The rowid bound is pushed into the FTS5 scan.
+        return (
+            f'SELECT rowid, bm25({FTS_TABLE}, 2.0, 1.0) AS score FROM {FTS_TABLE} WHERE {match} '
+            f'AND rowid >= (SELECT coalesce(min(rowid), 0) FROM ('
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {match} ORDER BY rowid DESC LIMIT %s)) '
+            'ORDER BY score',
+            [expression, expression, candidates],
+        )
+    if vendor == 'postgresql':
+        expression = ' & '.join(words)
+        query = "to_tsquery('english', %s)"
+        return (
+            f'SELECT id, -ts_rank_cd({PG_COLUMN}, {query}) AS score FROM accounts_claim '
+            f'WHERE id IN (SELECT id FROM accounts_claim WHERE {PG_COLUMN} @@ {query} ORDER BY id DESC LIMIT %s) '
+            'ORDER BY score',
+            [expression, expression, candidates],
+        )
+    if vendor == 'mysql':
+        expression = ' '.join(f'+{word}' for word in words)
+        match = 'MATCH (claim_type, description) AGAINST (%s IN BOOLEAN MODE)'
+        # MySQL allows no LIMIT in an IN subquery; bound the ids instead.
+        return (
+            f'SELECT id, -{match} AS score FROM accounts_claim WHERE {match} '
+            f'AND id >= (SELECT coalesce(min(id), 0) FROM ('
+            f'SELECT id FROM accounts_claim WHERE {match} ORDER BY id DESC LIMIT %s) AS newest) '
+            'ORDER BY score',
+            [expression, expression, expression, candidates],
+        )
+    return None
+
+
+def ranked_ids(query, limit, using='default'):
+    """Ids of the best ``limit`` claims matching ``query``, best first."""
+    limit = min(limit, get_candidate_limit())
+    words = terms(query)
+    if not words:
+        return []
+    vendor = connections[using].vendor
+    match = _match_sql(vendor, words)
+    if match is None:
+        # Unranked: the newest matches, which lie within the candidate window.
+        from .models import Claim
+        condition = Q()
+        for word in words:
+            condition &= Q(claim_type__icontains=word) | Q(description__icontains=word)
+        return list(Claim.objects.using(using).filter(condition).order_by('-created_at').values_list('pk', flat=True)[:limit])
+    sql, params = match
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'{sql} LIMIT %s', [*params, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(queryset, query, limit):
+    """
+    The best ``limit`` rows of ``queryset`` matching ``query`` as a ranked
+    list. Each row has a ``search_rank`` (1 = best) attribute.
+    """
+    ids = ranked_ids(query, limit, using=queryset.db)
+    rows = queryset.in_bulk(ids)
+    results = []
+    for position, pk in enumerate(ids, start=1):
+        if pk in rows:
+            rows[pk].search_rank = position
+            results.append(rows[pk])
+    return results
+
+
+# Schema upkeep after migrate; the index itself is created by migration 0008.
+
+def install_sqlite_triggers(connection):
+    """
+    (Re)create the FTS5 sync triggers and, if any were missing, rebuild the
+    index. SQLite drops triggers whenever Django remakes accounts_claim to
+    alter it, so this runs after every migrate.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)", list(TRIGGERS)
+        )
+        if len(cursor.fetchall()) == len(TRIGGERS):
+            return
+        insert = (
+            f"INSERT INTO {FTS_TABLE}(rowid, claim_type, description) "
+            "VALUES (new.id, new.claim_type, new.description);"
+        )
+        delete = (
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, claim_type, description) "
+            "VALUES ('delete', old.id, old.claim_type, old.description);"
+        )
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {TRIGGERS[0]} AFTER INSERT ON accounts_claim BEGIN {insert} END')
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {TRIGGERS[1]} AFTER DELETE ON accounts_claim BEGIN {delete} END')
+        cursor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {TRIGGERS[2]} AFTER UPDATE OF claim_type, description ON accounts_claim '
+            f'BEGIN {delete} {insert} END'
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate, get_user_model
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 
-from .models import Claim, Payment
+from . import tokens, transitions, uploads
+from .models import Claim, Payment, UploadSession
 User = get_user_model()
 
 class CustomLoginSerializer(serializers.Serializer):
@@ -12,16 +14,9 @@ class CustomLoginSerializer(serializers.Serializer):
         login_value = data.get("login")
         password = data.get("password")
 
-        # Try to authenticate by username first
-        user = authenticate(username=login_value, password=password)
-
-        if not user:
-            # Try authenticating by email
-            try:
-                user_obj = User.objects.get(email=login_value)
-                user = authenticate(username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                user = None
+        # The login value may be a username or an email address; the
+        # UsernameOrEmailBackend resolves either in a single lookup.
+        user = authenticate(self.context.get("request"), username=login_value, password=password)
 
         if not user:
             raise serializers.ValidationError("Invalid username/email or password.")
@@ -29,6 +24,10 @@ class CustomLoginSerializer(serializers.Serializer):
         data["user"] = user
         return data
 
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    # Skips the blacklist query for tokens accounts.tokens.blacklist_filter rules out.
+    token_class = tokens.RefreshToken
+
 class ClaimSerializer(serializers.ModelSerializer):
     class Meta:
         model = Claim
@@ -39,4 +38,42 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = "__all__"
-        read_only_fields = ('user', 'status', 'reference') # These are set by the server
\ No newline at end of file
+        read_only_fields = ('user', 'status', 'reference') # These are set by the server
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'filename', 'size', 'offset', 'created_at', 'expires_at')
+        read_only_fields = ('offset', 'created_at', 'expires_at')
+
+    def validate_filename(self, value):
+        # Keep only the final path component of whatever the client sent.
+        name = value.replace('\\', '/').rsplit('/', 1)[-1].strip()
+        if not name or name in ('.', '..'):
+            raise serializers.ValidationError("Enter a valid file name.")
+        return name
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be a positive number of bytes.")
+        if value > uploads.get_max_size():
+            raise serializers.ValidationError(f"Files may be at most {uploads.get_max_size()} bytes.")
+        return value
+
+class FinalizeUploadSerializer(serializers.Serializer):
+    claim = serializers.PrimaryKeyRelatedField(queryset=Claim.objects.all())
+
+    def validate_claim(self, claim):
+        # Only the claim's owner may attach documents to it.
+        if claim.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError("Claim not found.")
+        return claim
+
+class ClaimTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    status = serializers.ChoiceField(choices=sorted(transitions.ALLOWED_TRANSITIONS))
+
+    def validate_ids(self, value):
+        if len(value) > transitions.get_max_ids():
+            raise serializers.ValidationError(f"Send at most {transitions.get_max_ids()} ids per request.")
+        return value
@@ -0,0 +1,183 @@
+"""
+Reconciliation of the payment provider's settlement files.
+
+A settlement file lists one settled payment per line: its ``reference``,
+``amount`` and ``status`` (``completed`` when the column is absent), as CSV
+with a header row or as JSON lines. ``read_rows()`` streams it row by row
+(a quoted CSV field may span lines) and records the byte offset after each
+row, so a run can resume where it stopped. ``reconcile()`` settles one chunk of rows against ``Payment``.
+
+Rows the payments do not agree with are reported, not applied:
+
+* ``unmatched``: no payment has the reference;
+* ``amount_mismatch``: the settled amount differs from the payment's;
+* ``status_conflict``: the payment was already settled the other way;
+* ``invalid``: the line could not be read.
+"""
+import csv
+import json
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import Payment
+from .signals import payment_statuses_changed
+
+FORMATS = ('csv', 'jsonl')
+FINAL_STATUSES = {'completed', 'failed'}
+
+APPLIED = 'applied'
+UNCHANGED = 'unchanged'
+UNMATCHED = 'unmatched'
+AMOUNT_MISMATCH = 'amount_mismatch'
+STATUS_CONFLICT = 'status_conflict'
+INVALID = 'invalid'
+PROBLEMS = (UNMATCHED, AMOUNT_MISMATCH, STATUS_CONFLICT, INVALID)
+
+
+def guess_format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+class _Lines:
+    """The decoded lines of a binary file from byte ``offset`` on, for csv.reader; ``offset`` follows the reads."""
+
+    def __init__(self, handle, offset, encoding='utf-8'):
+        handle.seek(offset)
+        self.handle = handle
+        self.offset = offset
+        self.encoding = encoding
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        raw = self.handle.readline()
+        if not raw:
+            raise StopIteration
+        self.offset += len(raw)
+        return raw.decode(self.encoding, errors='replace')
+
+
+def read_rows(path, file_format, offset=0, line=0):
+    """
+    Yield ``(line, end_offset, row)`` for each row from byte ``offset`` on;
+    ``line`` is the line the row ends on. ``row`` is a dict, or None if the
+    row cannot be parsed. For CSV, an ``offset`` of 0 means the header row has
+    not been read yet.
+    """
+    with open(path, 'rb') as handle:
+        if file_format != 'csv':
+            handle.seek(offset)
+            for raw in handle:
+                offset += len(raw)
+                line += 1
+                text = raw.decode('utf-8', errors='replace').strip()
+                if text:
+                    yield line, offset, _parse_json(text)
+            return
+
+        lines = _Lines(handle, 0, 'utf-8-sig')
+        reader = csv.reader(lines)
+        header = [column.strip().lower() for column in next(reader, [])]
+        if offset == 0:
+            offset, line = lines.offset, line + reader.line_num
+
+        # csv.reader reads no further than the end of the row it returns, so
+        # lines.offset is where the next row starts.
+        lines = _Lines(handle, offset)
+        reader = csv.reader(lines)
+        while True:
+            try:
+                cells = next(reader)
+            except StopIteration:
+                return
+            except csv.Error:
+                yield line + reader.line_num, lines.offset, None
+                continue
+            if any(cell.strip() for cell in cells):
+                yield line + reader.line_num, lines.offset, dict(zip(header, cells))
+
+
+def _parse_json(text):
+    try:
+        row = json.loads(text)
+    except ValueError:
+        return None
+    return row if isinstance(row, dict) else None
+
+
+def reconcile(rows):
+    """
+    Settle one chunk of ``(line, row)`` pairs; return ``(counts, problems)``.
+
+    The chunk is one transaction: one SELECT for its references, one UPDATE
+    per new status, and one ``payment_statuses_changed`` signal. ``problems`` lists
+    ``(line, row, problem, expected_amount)`` for the report.
+    """
+    counts = Counter()
+    problems = []
+    wanted = []
+    for line, row in rows:
+        settled = _clean(row)
+        if settled is None:
+            counts[INVALID] += 1
+            problems.append((line, row or {}, INVALID, ''))
+        else:
+            wanted.append((line, row, *settled))
+
+    with transaction.atomic():
+        payments = {
+            reference: (pk, user_id, amount, status)
+            for pk, reference, user_id, amount, status in Payment.objects.select_for_update()
+            .filter(reference__in={reference for _, _, reference, _, _ in wanted})
+            .values_list('pk', 'reference', 'user_id', 'amount', 'status').order_by()
+        }
+        moves = {}
+        for line, row, reference, amount, status in wanted:
+            payment = payments.get(reference)
+            if payment is None:
+                outcome = UNMATCHED
+            elif payment[2] != amount:
+                outcome = AMOUNT_MISMATCH
+            elif payment[0] in moves:
+                # A repeated line: the first one decides.
+                outcome = UNCHANGED if moves[payment[0]][4] == status else STATUS_CONFLICT
+            elif payment[3] == status:
+                outcome = UNCHANGED
+            elif payment[3] != 'pending':
+                outcome = STATUS_CONFLICT
+            else:
+                moves[payment[0]] = (*payment, status)
+                outcome = APPLIED
+            counts[outcome] += 1
+            if outcome in PROBLEMS:
+                problems.append((line, row, outcome, payment[2] if payment else ''))
+
+        by_status = defaultdict(list)
+        for pk, *_, status in moves.values():
+            by_status[status].append(pk)
+        for status, pks in by_status.items():
+            # The rows are locked by the SELECT above, so no status guard:
+            # "status = 'pending'" would tempt the planner into walking the
+            # status index (every pending payment) instead of the primary key.
+            Payment.objects.filter(pk__in=pks).update(status=status)
+        if moves:
+            payment_statuses_changed.send(sender=Payment, changes=list(moves.values()))
+    return counts, problems
+
+
+def _clean(row):
+    """``(reference, amount, status)`` from a parsed row, or None if it is unusable."""
+    if not row:
+        return None
+    reference = str(row.get('reference') or '').strip()
+    status = str(row.get('status') or 'completed').strip().lower()
+    try:
+        amount = Decimal(str(row.get('amount', '')).strip())
+    except InvalidOperation:
+        return None
+    if not reference or status not in FINAL_STATUSES or not amount.is_finite():
+        return None
+    return reference, amount, status
@@ -1,9 +1,26 @@
-from django.core.mail import EmailMultiAlternatives
-from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import Signal, receiver
 from django.conf import settings
 from django.template.loader import render_to_string
 
 from django_rest_passwordreset.signals import reset_password_token_created
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import events, outbox, search, tokens, versions
+from .authentication import user_cache
+from .models import Claim, Payment
+
+User = get_user_model()
+
+# Sent after a bulk status UPDATE that bypassed Model.save(), so listeners
+# that normally react to post_save (e.g. the dashboard rollups) stay correct.
+# ``changes`` is a list of ``(pk, user_id, old_status, new_status)`` for
+# claims and ``(pk, user_id, amount, old_status, new_status)`` for payments.
+claim_statuses_changed = Signal()
+payment_statuses_changed = Signal()
 
 
 @receiver(reset_password_token_created)
@@ -18,7 +35,7 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
     :param kwargs:
     :return:
     """
-    # send an e-mail to the user
+    # queue an e-mail to the user
     context = {
         'current_user': reset_password_token.user,
         'username': reset_password_token.user.username,
@@ -29,14 +46,132 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
     email_html_message = None # You can create an HTML version if you want
     email_plaintext_message = render_to_string('accounts/email/password_reset_email.txt', context)
 
-    msg = EmailMultiAlternatives(
+    # Queue the message rather than sending it here: delivery happens in the
+    # send_queued_email worker, so this request never waits on the mail server.
+    outbox.enqueue(
         # title:
         "Password Reset for {title}".format(title="Jelani Insurance"),
         # message:
         email_plaintext_message,
-        # from:
-        settings.DEFAULT_FROM_EMAIL,
         # to:
-        [reset_password_token.user.email]
+        [reset_password_token.user.email],
+        # from:
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        html_body=email_html_message,
     )
-    msg.send()
\ No newline at end of file
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_cached_user(sender, instance, **kwargs):
+    """
+    Drop the user from the JWT authentication cache whenever it changes, so
+    that deactivation, permission changes and deletion take effect on the
+    next request.
+    """
+    user_cache.invalidate(instance.pk)
+
+
+def _release_document(field_file, name):
+    release = getattr(field_file.storage, 'release', None)
+    if name and release is not None:
+        release(name)
+
+
+@receiver(pre_save, sender=Claim)
+def note_document_upload(sender, instance, **kwargs):
+    # FileField.pre_save() stores a newly assigned file after this signal;
+    # remember that it is about to happen so post_save can release the old
+    # reference even when the new upload has identical content (same name).
+    instance._document_uploaded = bool(instance.document) and not instance.document._committed
+
+
+@receiver(post_save, sender=Claim)
+def release_replaced_document(sender, instance, created, **kwargs):
+    """Drop the reference held on a claim's previous document once it is replaced."""
+    previous = getattr(instance, '_loaded_values', {}).get('document')
+    replaced = previous != instance.document.name or getattr(instance, '_document_uploaded', False)
+    if not created and previous and replaced:
+        _release_document(instance.document, previous)
+
+
+@receiver(post_delete, sender=Claim)
+def release_deleted_document(sender, instance, **kwargs):
+    _release_document(instance.document, instance.document.name)
+
+
+COLLECTIONS = {Claim: versions.CLAIMS, Payment: versions.PAYMENTS}
+
+
+@receiver(post_save, sender=Claim)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Claim)
+@receiver(post_delete, sender=Payment)
+def bump_collection_version(sender, instance, origin=None, **kwargs):
+    """Invalidate the list ETags of the row's owner (and previous owner, if it moved)."""
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is User:
+        # Cascade from deleting the user: the versions go with it.
+        return
+    previous = getattr(instance, '_loaded_values', {}).get('user_id')
+    versions.bump({instance.user_id, previous}, COLLECTIONS[sender])
+
+
+@receiver(claim_statuses_changed)
+@receiver(payment_statuses_changed)
+def bump_collection_versions(sender, changes, **kwargs):
+    versions.bump({change[1] for change in changes}, COLLECTIONS[sender])
+
+
+EVENT_KINDS = {Claim: events.CLAIM, Payment: events.PAYMENT}
+
+
+@receiver(pre_save, sender=Claim)
+@receiver(pre_save, sender=Payment)
+def note_previous_status(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if 'status' in loaded:
+        instance._previous_status = loaded['status']
+    elif raw or instance.pk is None or (update_fields is not None and 'status' not in update_fields):
+        instance._previous_status = None
+    else:
+        # Saved without status having been loaded: read the stored one, so
+        # record_status_change reports the real transition (or none at all).
+        instance._previous_status = (
+            sender._base_manager.using(using).filter(pk=instance.pk).values_list('status', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Claim)
+@receiver(post_save, sender=Payment)
+def record_status_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Put a status change on the owner's event stream (accounts.events)."""
+    if created or raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    previous = getattr(instance, '_previous_status', None)
+    events.record(EVENT_KINDS[sender], [(instance.pk, instance.user_id, previous, instance.status)])
+
+
+@receiver(claim_statuses_changed)
+def record_claim_status_changes(sender, changes, **kwargs):
+    events.record(events.CLAIM, changes)
+
+
+@receiver(payment_statuses_changed)
+def record_payment_status_changes(sender, changes, **kwargs):
+    events.record(events.PAYMENT, [(pk, user_id, old, new) for pk, user_id, _, old, new in changes])
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, raw=False, **kwargs):
+    # Other processes pick the token up on their next sync (accounts.tokens).
+    if not raw:
+        tokens.blacklist_filter.add(instance.token.jti)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # SQLite drops the FTS sync triggers whenever a migration remakes
+    # accounts_claim; put them back (and reindex) once migrate finishes.
+    if sender.label == 'accounts' and connections[using].vendor == 'sqlite':
+        search.install_sqlite_triggers(connections[using])
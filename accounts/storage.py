@@ -0,0 +1,152 @@
+"""
+Content-addressed, deduplicated storage for claim documents.
+
+Each upload is hashed (SHA-256) as it is read and stored once under its
+digest, e.g. ``claims/3f/3f9a…c2.pdf``. A second upload of the same bytes
+resolves to the existing file without writing it again. ``DocumentBlob``
+rows count how many claims point at each file: saving adds a reference and
+``delete()`` only drops one. Files whose count reaches zero are removed by
+``python manage.py gc_document_blobs``.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def get_document_storage():
+    """Storage for ``Claim.document``, configurable via STORAGES['claim_documents']."""
+    return storages['claim_documents']
+
+
+def _blob_model():
+    return apps.get_model('accounts', 'DocumentBlob')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save(); equal
+        # names mean equal bytes, so there is never a clash to avoid.
+        return name
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = os.path.splitext(filename)[1].lower()
+
+        spooled = False
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large upload, finished upload session): hash
+            # it in place and move it if the blob is new.
+            source = content.temporary_file_path()
+            digest, size = self._hash_file(source)
+        elif content.size is not None and content.size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            # Small and in memory: hash first, write only if the blob is new.
+            source = None
+            digest, size = self._hash_chunks(content.chunks())
+        else:
+            # Large stream that can only be read once: spool while hashing.
+            source, digest, size = self._spool(content)
+            spooled = True
+
+        blob_name = posixpath.join(directory, digest[:2], digest + extension)
+        # Take the reference before looking at the file: the garbage
+        # collector deletes the row before the file, so once the reference
+        # is held a file that is still missing must be (re)written here.
+        self.add_reference(blob_name, digest, size)
+
+        full_path = self.path(blob_name)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if source is not None:
+                file_move_safe(source, full_path, allow_overwrite=True)
+            else:
+                self._write_chunks(content, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        elif spooled:
+            os.unlink(source)
+        return blob_name
+
+    def delete(self, name):
+        # A blob may be shared by several claims: deleting one reference
+        # must not remove the file. Names not created by this storage
+        # (documents saved before it existed) are deleted normally.
+        if not self.release(name):
+            super().delete(name)
+
+    def add_reference(self, name, digest, size):
+        DocumentBlob = _blob_model()
+        now = timezone.now()
+        if DocumentBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, updated_at=now):
+            return
+        try:
+            with transaction.atomic():
+                DocumentBlob.objects.create(name=name, digest=digest, size=size, refcount=1, updated_at=now)
+        except IntegrityError:
+            # Another upload of the same bytes created the row first.
+            DocumentBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, updated_at=now)
+
+    def release(self, name):
+        """Drop one reference to ``name``; return False if it is not a tracked blob."""
+        DocumentBlob = _blob_model()
+        if not DocumentBlob.objects.filter(name=name).exists():
+            return False
+        DocumentBlob.objects.filter(name=name, refcount__gt=0).update(
+            refcount=F('refcount') - 1, updated_at=timezone.now()
+        )
+        return True
+
+    def purge(self, name):
+        """Remove the file behind ``name`` regardless of references (used by the GC)."""
+        super().delete(name)
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as source:
+            for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+                size += len(block)
+        return digest.hexdigest(), size
+
+    def _hash_chunks(self, chunks):
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            digest.update(chunk)
+            size += len(chunk)
+        return digest.hexdigest(), size
+
+    def _spool(self, content):
+        """Stream ``content`` to a temporary file next to the blobs, hashing as it goes."""
+        incoming = os.path.join(self.location, '.incoming')
+        os.makedirs(incoming, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=incoming)
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, 'wb') as spool:
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                spool.write(chunk)
+                size += len(chunk)
+        return path, digest.hexdigest(), size
+
+    def _write_chunks(self, content, full_path):
+        with open(full_path, 'wb') as target:
+            for chunk in content.chunks():
+                target.write(chunk.encode() if isinstance(chunk, str) else chunk)
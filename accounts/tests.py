@@ -1,8 +1,41 @@
+import asyncio
+import csv
+import json
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, router
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
-from .models import Claim, Payment
+from dashboard.models import UserRollup
+from . import events, outbox, payments, replicas, settlement, tokens, transitions, uploads
+from .authentication import user_cache
+from .backends import UsernameOrEmailBackend
+from .models import (
+    Claim, ClaimStatusChange, DocumentBlob, IdempotencyKey, OutboundEmail, Payment, PaymentEvent, StatusEvent,
+    UploadSession,
+)
 
 User = get_user_model()
 
@@ -30,6 +63,45 @@ class AuthTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('access', response.data)
 
+    def test_login_with_email_is_case_insensitive(self):
+        response = self.client.post(self.login_url, {'login': 'Test@Example.COM', 'password': self.password})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class UsernameOrEmailBackendTests(APITestCase):
+    def setUp(self):
+        self.backend = UsernameOrEmailBackend()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='secret-pass')
+
+    def count_hashes(self, login, password):
+        with mock.patch.object(
+            PBKDF2PasswordHasher, 'encode', autospec=True, side_effect=PBKDF2PasswordHasher.encode
+        ) as encode:
+            user = self.backend.authenticate(None, username=login, password=password)
+        return user, encode.call_count
+
+    def test_email_login_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            user = self.backend.authenticate(None, username='ALICE@example.com', password='secret-pass')
+        self.assertEqual(user, self.user)
+
+    def test_failed_logins_hash_exactly_once(self):
+        for login in ('alice', 'alice@example.com', 'nobody@example.com'):
+            with self.subTest(login=login):
+                user, hashes = self.count_hashes(login, 'wrong-pass')
+                self.assertIsNone(user)
+                self.assertEqual(hashes, 1)
+
+    def test_username_match_wins_over_email_match(self):
+        impostor = User.objects.create_user(username='alice@example.com', email='x@example.com', password='other-pass')
+        self.assertEqual(self.backend.authenticate(None, username='alice@example.com', password='other-pass'), impostor)
+
+    def test_shared_email_is_not_resolved(self):
+        User.objects.create_user(username='alice2', email='Alice@example.com', password='secret-pass')
+        user, hashes = self.count_hashes('alice@example.com', 'secret-pass')
+        self.assertIsNone(user)
+        self.assertEqual(hashes, 1)
+
 
 class ClaimTests(APITestCase):
     def setUp(self):
@@ -71,4 +143,1399 @@ class PaymentTests(APITestCase):
         payment = Payment.objects.get()
         self.assertEqual(payment.user, self.user)
         self.assertEqual(payment.amount, 100.00)
-        self.assertTrue(payment.reference.startswith('PAY-'))
\ No newline at end of file
+        self.assertTrue(payment.reference.startswith('PAY-'))
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pageuser', email='page@example.com', password='testpass')
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass')
+        Claim.objects.bulk_create(
+            [Claim(user=self.user, claim_type='Accident', description=f'Claim {i}') for i in range(7)]
+            + [Claim(user=other, claim_type='Theft', description='Not mine')]
+        )
+        # Give several claims the same timestamp so the id tie-break is exercised.
+        Claim.objects.filter(user=self.user, id__lte=Claim.objects.order_by('id')[3].id).update(
+            created_at=Claim.objects.order_by('id')[0].created_at
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_all_rows_once_in_order(self):
+        url = reverse('claim-list') + '?page_size=3'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        expected = list(
+            Claim.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=2):
+            response = self.client.get(reverse('claim-list'), {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('payment-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ClaimFilterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='filteruser', email='filter@example.com', password='testpass')
+        self.pending = Claim.objects.create(user=self.user, claim_type='Accident', description='a')
+        self.approved = Claim.objects.create(user=self.user, claim_type='Theft', description='b', status='approved')
+        self.old = Claim.objects.create(user=self.user, claim_type='Theft', description='c')
+        Claim.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        self.client.force_authenticate(self.user)
+
+    def ids(self, params):
+        response = self.client.get(reverse('claim-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.ids({'status': 'approved'}), [self.approved.id])
+        self.assertEqual(self.ids({'claim_type': 'Theft'}), [self.approved.id, self.old.id])
+        cutoff = (timezone.now() - timedelta(days=1)).date().isoformat()
+        self.assertEqual(self.ids({'created_before': cutoff}), [self.old.id])
+        self.assertEqual(self.ids({'created_after': cutoff, 'status': 'pending'}), [self.pending.id])
+
+    def test_ordering(self):
+        self.assertEqual(self.ids({'ordering': 'created_at'}), [self.old.id, self.pending.id, self.approved.id])
+
+    def test_invalid_filter_values_are_rejected(self):
+        response = self.client.get(reverse('claim-list'), {'status': 'lost', 'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'status', 'created_after'})
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+    def test_filtered_list_uses_index_range_scan(self):
+        cases = [
+            ('claim-list', {'status': 'pending'}, 'claim_user_status_idx'),
+            ('claim-list', {'claim_type': 'Theft', 'created_after': '2020-01-01'}, 'claim_user_type_idx'),
+            ('payment-list', {'status': 'completed'}, 'payment_user_status_idx'),
+        ]
+        for url_name, params, index in cases:
+            with self.subTest(url_name=url_name, params=params):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(reverse(url_name), params)
+                table = 'accounts_claim' if url_name == 'claim-list' else 'accounts_payment'
+                sql = next(q['sql'] for q in queries.captured_queries if f'FROM "{table}"' in q['sql'])
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plan = ' | '.join(row[-1] for row in cursor.fetchall())
+                self.assertIn(f'USING INDEX {index}', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='cacheuser', email='cache@example.com', password='testpass')
+        response = self.client.post(reverse('custom_login'), {'login': 'cacheuser', 'password': 'testpass'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        user_cache.clear()
+
+    def test_cached_user_skips_user_query(self):
+        url = reverse('claim-list')
+        caches['default'].clear()
+        with self.assertNumQueries(3):  # user + list version + claims
+            self.client.get(url)
+        with self.assertNumQueries(1):  # claims only
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_cache.stats(), {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_deactivation_evicts_cached_user(self):
+        url = reverse('claim-list')
+        self.client.get(url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stats_endpoint_is_staff_only(self):
+        url = reverse('auth_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        user_cache.clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['misses'], 1)
+
+
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='resetuser', email='reset@example.com', password='testpass')
+
+    def test_password_reset_is_queued_not_sent_inline(self):
+        response = self.client.post(reverse('password_reset:reset-password-request'), {'email': 'reset@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.to, ['reset@example.com'])
+
+        call_command('send_queued_email', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(self.user.password_reset_tokens.get().key, mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'sent')
+
+    def test_failed_sends_back_off_then_give_up(self):
+        queued = outbox.enqueue('Hello', 'Body', ['someone@example.com'])
+        with mock.patch.object(LocmemEmailBackend, 'send_messages', side_effect=OSError('connection reset')):
+            self.assertEqual(outbox.send_due(max_attempts=2), (0, 1))
+            queued.refresh_from_db()
+            self.assertEqual((queued.status, queued.attempts), ('pending', 1))
+            self.assertGreater(queued.next_attempt_at, timezone.now())
+            self.assertEqual(outbox.send_due(max_attempts=2), (0, 0))  # not due yet
+
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            outbox.send_due(max_attempts=2)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertIn('connection reset', queued.last_error)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_batch_is_leased_while_sending_and_reclaimed_after_a_crash(self):
+        queued = outbox.enqueue('Hello', 'Body', ['someone@example.com'])
+        atomic_depth = len(connection.atomic_blocks)
+        seen = []
+
+        def send_messages(backend, messages):
+            seen.append((OutboundEmail.objects.get().status, len(connection.atomic_blocks) - atomic_depth))
+            raise OSError('worker killed')
+
+        with mock.patch.object(LocmemEmailBackend, 'send_messages', send_messages):
+            outbox.send_due()
+        # Claimed in its own transaction, sent outside any.
+        self.assertEqual(seen, [('sending', 0)])
+
+        # A worker that died after claiming leaves the message leased until
+        # the lease lapses; then the next worker sends it.
+        OutboundEmail.objects.update(status='sending', next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(outbox.send_due(), (0, 0))
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.send_due(), (1, 0))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'sent')
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', email='export@example.com', password='testpass')
+        self.other = User.objects.create_user(username='someone', email='someone@example.com', password='testpass')
+        Claim.objects.create(user=self.user, claim_type='Accident', description='Line one,\n"quoted"')
+        Claim.objects.create(user=self.other, claim_type='Theft', description='Not mine')
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_users_export_only_their_rows(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('claim-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['user'] for row in rows], [self.user.id])
+        self.assertEqual(rows[0]['description'], 'Line one,\n"quoted"')
+
+    def test_staff_export_all_rows_as_csv(self):
+        self.other.is_staff = True
+        self.other.save()
+        self.client.force_authenticate(self.other)
+        response = self.client.get(reverse('claim-export'), {'export_format': 'csv'})
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['description'], 'Line one,\n"quoted"')
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+    def test_csv_escapes_formulas(self):
+        Claim.objects.create(user=self.user, claim_type='@SUM(A1)', description='=HYPERLINK("http://x")')
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('claim-export'), {'export_format': 'csv'})
+        row = list(csv.DictReader(StringIO(self.read(response))))[-1]
+        self.assertEqual((row['claim_type'], row['description']), ("'@SUM(A1)", '\'=HYPERLINK("http://x")'))
+
+    def test_export_requires_authentication_and_known_format(self):
+        self.assertEqual(self.client.get(reverse('claim-export')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('payment-export'), {'export_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('export_records', 'claims', '--format', 'csv', '--user', str(self.user.id), stdout=out)
+        self.assertEqual(len(list(csv.DictReader(StringIO(out.getvalue())))), 1)
+
+    @skipUnless(os.path.exists('/proc/self/statm'), 'reads resident memory from /proc')
+    def test_memory_stays_flat_for_500k_rows(self):
+        def resident_bytes():
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+        rows = 500_000
+        Payment.objects.bulk_create(
+            (Payment(user=self.user, amount='10.00', reference=f'PAY-{i:010d}') for i in range(rows)),
+            batch_size=10_000,
+        )
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('payment-export'))
+
+        baseline = peak = resident_bytes()
+        lines = size = 0
+        for chunk in response.streaming_content:
+            lines += chunk.count(b'\n')
+            size += len(chunk)
+            peak = max(peak, resident_bytes())
+        self.assertEqual(lines, rows)
+        # The export is ~70 MB of NDJSON; streaming it must not hold more
+        # than a few chunks of rows at a time.
+        self.assertGreater(size, 50 * 1024 * 1024)
+        self.assertLess(peak - baseline, 16 * 1024 * 1024)
+
+
+class UploadSessionTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='uploader', email='upload@example.com', password='testpass')
+        self.claim = Claim.objects.create(user=self.user, claim_type='Accident', description='Scan attached')
+        self.client.force_authenticate(self.user)
+        self.content = os.urandom(200_000)
+        response = self.client.post(reverse('upload-list'), {'filename': '../scan.pdf', 'size': len(self.content)})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['filename'], 'scan.pdf')
+        self.url = reverse('upload-detail', args=[response.data['id']])
+
+    def put_range(self, start, end):
+        return self.client.generic(
+            'PUT', self.url, self.content[start:end + 1], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}',
+        )
+
+    def test_chunked_upload_resume_and_finalize(self):
+        self.assertEqual(self.put_range(0, 99_999).data['offset'], 100_000)
+
+        # A retried or out-of-order chunk is refused with the offset to resume from.
+        response = self.put_range(50_000, 149_999)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 100_000)
+        self.assertEqual(self.client.get(self.url).data['offset'], 100_000)
+
+        self.assertEqual(self.put_range(100_000, len(self.content) - 1).data['offset'], len(self.content))
+        response = self.client.post(self.url + 'finalize/', {'claim': self.claim.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.claim.refresh_from_db()
+        with self.claim.document.open('rb') as document:
+            self.assertEqual(document.read(), self.content)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads', 'partial')), [])
+
+    def test_concurrent_put_is_refused_without_touching_the_file(self):
+        session = UploadSession.objects.get()
+        with uploads.open_part_file(session):
+            response = self.put_range(0, 99_999)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 0)
+        self.assertEqual(session.part_path.read_bytes(), b'')
+        self.assertEqual(self.put_range(0, 99_999).data['offset'], 100_000)
+
+    def test_part_file_removed_by_a_concurrent_request(self):
+        session = UploadSession.objects.get()
+        self.put_range(0, len(self.content) - 1)
+        with uploads.open_part_file(session):
+            response = self.client.post(self.url + 'finalize/', {'claim': self.claim.id})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        # Finalized or deleted between get_object() and opening the file.
+        session.part_path.unlink()
+        self.assertEqual(self.put_range(0, 9).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(self.url + 'finalize/', {'claim': self.claim.id})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_finalize_requires_complete_upload_and_own_claim(self):
+        self.put_range(0, 9)
+        response = self.client.post(self.url + 'finalize/', {'claim': self.claim.id})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        self.put_range(10, len(self.content) - 1)
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass')
+        foreign = Claim.objects.create(user=other, claim_type='Theft', description='Not mine')
+        response = self.client.post(self.url + 'finalize/', {'claim': foreign.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cleanup_removes_expired_sessions(self):
+        session = UploadSession.objects.get()
+        UploadSession.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        call_command('cleanup_upload_sessions', stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(session.part_path.exists())
+
+
+class DocumentStorageTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='docs', email='docs@example.com', password='testpass')
+        self.client.force_authenticate(self.user)
+
+    def stored_files(self):
+        claims_dir = os.path.join(self.media_root, 'claims')
+        return [os.path.join(root, name) for root, _, names in os.walk(claims_dir) for name in names]
+
+    def test_identical_uploads_share_one_file(self):
+        content = os.urandom(5000)
+        for filename in ('scan.pdf', 'copy-of-scan.PDF'):
+            response = self.client.post(reverse('claim-list'), {
+                'claim_type': 'Accident', 'description': 'Scan',
+                'document': SimpleUploadedFile(filename, content),
+            }, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        first, second = Claim.objects.order_by('id')
+        self.assertEqual(first.document.name, second.document.name)
+        self.assertEqual(len(self.stored_files()), 1)
+        blob = DocumentBlob.objects.get()
+        self.assertEqual((blob.refcount, blob.size), (2, 5000))
+        with second.document.open('rb') as document:
+            self.assertEqual(document.read(), content)
+
+    def test_delete_and_replace_release_references_and_gc_collects(self):
+        first = Claim.objects.create(user=self.user, claim_type='Theft', description='A')
+        second = Claim.objects.create(user=self.user, claim_type='Theft', description='B')
+        first.document.save('a.txt', ContentFile(b'shared'))
+        second.document.save('b.txt', ContentFile(b'shared'))
+        shared = first.document.name
+
+        first.delete()
+        self.assertEqual(DocumentBlob.objects.get(name=shared).refcount, 1)
+        self.assertTrue(first.document.storage.exists(shared))
+
+        second = Claim.objects.get(pk=second.pk)
+        second.document = ContentFile(b'replacement', name='c.txt')
+        second.save()
+        self.assertEqual(DocumentBlob.objects.get(name=shared).refcount, 0)
+
+        call_command('gc_document_blobs', stdout=StringIO())
+        self.assertTrue(second.document.storage.exists(shared), 'grace period not yet over')
+        call_command('gc_document_blobs', grace_hours=0, stdout=StringIO())
+        self.assertFalse(second.document.storage.exists(shared))
+        self.assertFalse(DocumentBlob.objects.filter(name=shared).exists())
+        self.assertTrue(second.document.storage.exists(second.document.name))
+
+
+class ClaimDocumentDownloadTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='testpass')
+        self.claim = Claim.objects.create(user=self.user, claim_type='Accident', description='Scan')
+        self.content = os.urandom(100_000)
+        self.claim.document.save('scan.pdf', ContentFile(self.content))
+        self.url = reverse('claim-document', args=[self.claim.pk])
+        self.client.force_authenticate(self.user)
+
+    def test_full_download_and_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.content[1000:2000])
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '1000')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-500')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-500:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        # A stale If-Range validator gets the whole, current file.
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_only_owner_can_download(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_proxy_sendfile_mode(self):
+        with self.settings(DOCUMENT_SENDFILE_BACKEND='nginx', DOCUMENT_SENDFILE_PREFIX='/protected-media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.claim.document.name)
+        self.assertEqual(response.content, b'')
+
+
+class ClaimSearchTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='adjuster', email='adjuster@example.com', password='testpass', is_staff=True, is_superuser=True,
+        )
+        owner = User.objects.create_user(username='owner', email='owner@example.com', password='testpass')
+        self.vehicle = Claim.objects.create(user=owner, claim_type='Accident', description='Rear-ended at a junction, vehicle bumper damaged')
+        self.theft = Claim.objects.create(user=owner, claim_type='Theft', description='Laptop stolen from parked vehicle')
+        Claim.objects.create(claim_type='Medical', description='Hospital stay after a fall')
+        self.url = reverse('claim-search')
+        self.client.force_authenticate(self.staff)
+
+    def search(self, query):
+        response = self.client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+    def test_ranked_stemmed_search(self):
+        self.assertCountEqual(self.search('Vehicles'), [self.vehicle.id, self.theft.id])
+        # A claim_type hit outranks a description-only hit.
+        self.assertEqual(self.search('accident vehicle'), [self.vehicle.id])
+        self.assertEqual(self.search('theft vehicle')[0], self.theft.id)
+        # FTS syntax in the query is treated as plain words.
+        self.assertEqual(self.search('stolen" laptop*'), [self.theft.id])
+
+    @override_settings(CLAIM_SEARCH_CANDIDATES=1)
+    def test_only_the_newest_candidates_are_ranked(self):
+        response = self.client.get(self.url, {'q': 'vehicle'})
+        self.assertEqual(response.data['candidate_limit'], 1)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.theft.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.theft.description = 'Bicycle taken from the garage'
+        self.theft.save()
+        self.assertEqual(self.search('vehicle'), [self.vehicle.id])
+        self.assertEqual(self.search('bicycle'), [self.theft.id])
+        self.vehicle.delete()
+        self.assertEqual(self.search('bumper'), [])
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.get(username='owner'))
+        self.assertEqual(self.client.get(self.url, {'q': 'vehicle'}).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin:accounts_claim_changelist'), {'q': 'stolen'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.theft])
+        response = self.client.get(reverse('admin:accounts_claim_changelist'), {'q': 'owner@example.com'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class ClaimAdminTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_superuser(username='admin', email='admin@example.com', password='testpass')
+        self.client.force_login(self.staff)
+        self.holders = [
+            User.objects.create_user(username=f'holder{i}', email=f'holder{i}@example.com', password='x')
+            for i in range(3)
+        ]
+
+    def create_claims(self, count):
+        # Every fourth claim is anonymous (no user).
+        Claim.objects.bulk_create([
+            Claim(user=self.holders[i % 3] if i % 4 else None, claim_type='Accident', description=f'Claim {i}')
+            for i in range(count)
+        ])
+
+    def create_payments(self, count):
+        start = Payment.objects.count()
+        Payment.objects.bulk_create([
+            Payment(user=self.holders[i % 3], amount=i, reference=f'PAY-{i}') for i in range(start, start + count)
+        ])
+
+    def changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name), {'status__exact': 'pending'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_claim_changelist_query_count_is_constant(self):
+        self.create_claims(1)
+        one_row = self.changelist_queries('admin:accounts_claim_changelist')
+        self.create_claims(99)
+        self.assertEqual(self.changelist_queries('admin:accounts_claim_changelist'), one_row)
+
+    def test_payment_changelist_query_count_is_constant(self):
+        self.create_payments(1)
+        one_row = self.changelist_queries('admin:accounts_payment_changelist')
+        self.create_payments(99)
+        self.assertEqual(self.changelist_queries('admin:accounts_payment_changelist'), one_row)
+
+    def test_str_of_anonymous_claim(self):
+        self.assertEqual(str(Claim(claim_type='Theft', description='x')), 'anonymous - Theft')
+
+    def test_bulk_approve_is_a_single_update(self):
+        self.create_claims(10)
+        Claim.objects.filter(pk=Claim.objects.order_by('pk').first().pk).update(status='approved')
+        ids = list(Claim.objects.values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('admin:accounts_claim_changelist'), {
+                'action': 'approve', '_selected_action': ids,
+            })
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "accounts_claim"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Claim.objects.filter(status='approved').count(), 10)
+        # The dashboard rollups heard about it.
+        call_command('check_rollups', stdout=StringIO())
+
+    def test_estimated_count_for_large_unfiltered_tables(self):
+        from .admin import EstimatedCountPaginator
+
+        self.create_claims(5)
+        with mock.patch('accounts.admin.estimate_row_count', return_value=2_000_000):
+            self.assertEqual(EstimatedCountPaginator(Claim.objects.order_by('pk'), 100).count, 2_000_000)
+            self.assertEqual(EstimatedCountPaginator(Claim.objects.filter(status='pending').order_by('pk'), 100).count, 5)
+        with mock.patch('accounts.admin.estimate_row_count', return_value=None):
+            self.assertEqual(EstimatedCountPaginator(Claim.objects.order_by('pk'), 100).count, 5)
+
+
+class ClaimTransitionTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', password='x', is_staff=True)
+        self.holder = User.objects.create_user(username='holder', email='holder@example.com', password='x')
+        Claim.objects.bulk_create([
+            Claim(user=self.holder, claim_type='Accident', description=f'Claim {i}') for i in range(1200)
+        ])
+        self.ids = list(Claim.objects.order_by('pk').values_list('pk', flat=True))
+        self.url = reverse('claim-transition')
+        self.client.force_authenticate(self.staff)
+
+    def test_bulk_transition_reports_per_id(self):
+        Claim.objects.filter(pk=self.ids[0]).update(status='rejected')
+        missing = self.ids[-1] + 1000
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'ids': self.ids + [missing], 'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['transitioned'], response.data['skipped']), (1199, 2))
+        results = {row['id']: row for row in response.data['results']}
+        self.assertEqual(results[self.ids[0]], {'id': self.ids[0], 'result': 'invalid_transition', 'status': 'rejected'})
+        self.assertEqual(results[missing]['result'], 'not_found')
+        self.assertEqual(results[self.ids[1]]['result'], 'transitioned')
+
+        # One UPDATE and one audit INSERT per 500-id chunk.
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "accounts_claim"')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(Claim.objects.filter(status='approved').count(), 1199)
+        self.assertEqual(ClaimStatusChange.objects.filter(to_status='approved', actor=self.staff).count(), 1199)
+        call_command('check_rollups', stdout=StringIO())
+
+        # Already approved: nothing moves, nothing is audited twice.
+        response = self.client.post(self.url, {'ids': self.ids[1:3], 'status': 'rejected'}, format='json')
+        self.assertEqual(response.data['transitioned'], 0)
+        self.assertEqual(ClaimStatusChange.objects.count(), 1199)
+
+    def test_chunk_that_keeps_conflicting_is_reported_per_id(self):
+        apply_chunk = transitions._apply_chunk
+
+        def contested(ids, *args):
+            if self.ids[500] in ids:
+                raise transitions._Conflict
+            return apply_chunk(ids, *args)
+
+        with mock.patch.object(transitions, '_apply_chunk', side_effect=contested):
+            response = self.client.post(self.url, {'ids': self.ids[:1000], 'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['transitioned'], response.data['skipped']), (500, 500))
+        results = {row['id']: row for row in response.data['results']}
+        self.assertEqual(results[self.ids[0]]['result'], 'transitioned')
+        self.assertEqual(results[self.ids[500]], {'id': self.ids[500], 'result': 'conflict', 'status': 'pending'})
+        self.assertEqual(Claim.objects.filter(status='approved').count(), 500)
+
+    def test_validation_and_permissions(self):
+        response = self.client.post(self.url, {'ids': self.ids[:2], 'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(CLAIM_TRANSITION_MAX_IDS=10):
+            response = self.client.post(self.url, {'ids': self.ids[:11], 'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(self.holder)
+        response = self.client.post(self.url, {'ids': self.ids[:2], 'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_audit_rows_are_append_only(self):
+        transitions.bulk_transition(self.ids[:1], 'approved', actor=self.staff)
+        change = ClaimStatusChange.objects.get()
+        self.assertEqual((change.from_status, change.to_status), ('pending', 'approved'))
+        with self.assertRaises(ValueError):
+            change.save()
+        with self.assertRaises(ValueError):
+            change.delete()
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='retry', email='retry@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('payment-list')
+
+    def test_retry_replays_first_response(self):
+        first = self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertFalse([q for q in queries if q['sql'].startswith('INSERT INTO "accounts_payment"')])
+
+        # Keys are per user and per key; no header means no deduplication.
+        self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='def')
+        self.client.post(self.url, {'amount': '50.00'})
+        self.assertEqual(Payment.objects.count(), 3)
+
+    def test_reused_key_with_different_body_is_rejected(self):
+        self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(self.url, {'amount': '75.00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_in_progress_and_failed_requests(self):
+        now = timezone.now()
+        # Another worker still holds the key.
+        self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='busy')
+        IdempotencyKey.objects.filter(key='busy').update(status_code=None, response_body=None)
+        response = self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='busy')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('Retry-After', response)
+        # ...until its lock times out, when a retry takes over.
+        IdempotencyKey.objects.filter(key='busy').update(created_at=now - timedelta(minutes=5))
+        response = self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='busy')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # A request that raises (here: fails validation) wrote nothing and
+        # releases its key, so the corrected request can reuse it.
+        response = self.client.post(reverse('claim-list'), {'description': 'no type'}, HTTP_IDEMPOTENCY_KEY='bad')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.filter(key='bad').exists())
+        response = self.client.post(
+            reverse('claim-list'), {'claim_type': 'Theft', 'description': 'fixed'}, HTTP_IDEMPOTENCY_KEY='bad',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_purge_removes_expired_keys(self):
+        self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='old')
+        self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='new')
+        IdempotencyKey.objects.filter(key='old').update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('purge_idempotency_keys', '--batch-size', '1', stdout=out)
+        self.assertIn('Removed 1 expired', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+        # An expired key no longer replays.
+        self.client.post(self.url, {'amount': '50.00'}, HTTP_IDEMPOTENCY_KEY='old')
+        self.assertEqual(Payment.objects.count(), 3)
+
+@override_settings(PAYMENT_WEBHOOK_SECRET='whsec-test')
+class PaymentWebhookTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='payer', email='payer@example.com', password='x')
+        self.pending = Payment.objects.create(user=self.user, amount='40.00', reference='PAY-A')
+        self.other = Payment.objects.create(user=self.user, amount='60.00', reference='PAY-B')
+        self.url = reverse('payment_webhook')
+
+    def deliver(self, data, signature=None):
+        body = json.dumps(data).encode()
+        signature = signature or payments.sign(body)
+        return self.client.generic('POST', self.url, body, content_type='application/json',
+                                   HTTP_X_WEBHOOK_SIGNATURE=signature)
+
+    def test_events_are_queued_then_applied_in_batches(self):
+        events = [
+            {'id': 'evt_1', 'reference': 'PAY-A', 'status': 'completed'},
+            {'id': 'evt_2', 'reference': 'PAY-B', 'status': 'failed'},
+            {'id': 'evt_3', 'reference': 'PAY-A', 'status': 'failed'},
+            {'id': 'evt_4', 'reference': 'PAY-MISSING', 'status': 'completed'},
+        ]
+        response = self.deliver({'events': events})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        # Acknowledged without touching the payments.
+        self.assertEqual(Payment.objects.filter(status='pending').count(), 2)
+        # A redelivery is dropped by event id.
+        self.deliver(events[0])
+        self.assertEqual(PaymentEvent.objects.count(), 4)
+
+        with CaptureQueriesContext(connection) as queries:
+            outcomes = payments.process_pending()
+        self.assertEqual(outcomes, {'applied': 2, 'ignored': 1, 'deferred': 1})
+        payment_selects = [q for q in queries if q['sql'].startswith('SELECT') and '"accounts_payment"' in q['sql']]
+        self.assertEqual(len(payment_selects), 1)
+        self.assertEqual(
+            dict(Payment.objects.values_list('reference', 'status')), {'PAY-A': 'completed', 'PAY-B': 'failed'},
+        )
+        self.assertEqual(PaymentEvent.objects.get(event_id='evt_3').outcome, 'ignored')
+        self.assertEqual(
+            list(PaymentEvent.objects.filter(processed_at__isnull=True).values_list('event_id', flat=True)), ['evt_4'],
+        )
+        call_command('check_rollups', stdout=StringIO())
+
+        out = StringIO()
+        call_command('process_payment_events', stdout=out)
+        self.assertIn('Done: 0 event(s)', out.getvalue())
+
+    def test_event_for_a_payment_not_yet_committed_is_retried(self):
+        self.deliver({'events': [
+            {'id': 'evt_early', 'reference': 'PAY-LATE', 'status': 'completed'},
+            {'id': 'evt_stale', 'reference': 'PAY-NEVER', 'status': 'completed'},
+        ]})
+        PaymentEvent.objects.filter(event_id='evt_stale').update(
+            received_at=timezone.now() - payments.UNKNOWN_PAYMENT_MAX_AGE,
+        )
+        self.assertEqual(payments.process_pending(), {'deferred': 1, 'unknown_payment': 1})
+        self.assertEqual(payments.process_pending(), {})  # Not due again yet.
+
+        late = Payment.objects.create(user=self.user, amount='15.00', reference='PAY-LATE')
+        PaymentEvent.objects.filter(event_id='evt_early').update(retry_at=timezone.now())
+        self.assertEqual(payments.process_pending(), {'applied': 1})
+        late.refresh_from_db()
+        self.assertEqual(late.status, 'completed')
+
+    def test_rejects_bad_signatures_and_payloads(self):
+        response = self.deliver({'id': 'evt_1', 'reference': 'PAY-A', 'status': 'completed'}, signature='sha256=00')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(PAYMENT_WEBHOOK_SECRET=''):
+            response = self.deliver({'id': 'evt_1', 'reference': 'PAY-A', 'status': 'completed'}, signature='x')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.deliver({'events': [{'id': 'evt_1'}]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+class SettlementReconciliationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='settled', email='settled@example.com', password='x')
+        Payment.objects.bulk_create([
+            Payment(user=self.user, amount='10.00', reference=f'PAY-{i}') for i in range(6)
+        ])
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as handle:
+            handle.write(text)
+        return path
+
+    def report(self, path):
+        with open(f'{path}.report.csv', newline='') as handle:
+            return [(row['line'], row['reference'], row['problem']) for row in csv.DictReader(handle)]
+
+    def test_csv_settles_matches_and_reports_problems(self):
+        path = self.write('settlement.csv', (
+            'Reference,Amount,Status\n'
+            'PAY-0,10.00,completed\n'
+            'PAY-1,10.0,failed\n'
+            'PAY-2,12.50,completed\n'
+            'PAY-404,10.00,completed\n'
+            'PAY-3,not-a-number,completed\n'
+        ))
+        out = StringIO()
+        call_command('reconcile_settlement', path, '--chunk-size', '2', stdout=out)
+        self.assertIn('2 applied', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(
+            dict(Payment.objects.exclude(status='pending').values_list('reference', 'status')),
+            {'PAY-0': 'completed', 'PAY-1': 'failed'},
+        )
+        self.assertEqual(self.report(path), [
+            ('4', 'PAY-2', 'amount_mismatch'), ('5', 'PAY-404', 'unmatched'), ('6', 'PAY-3', 'invalid'),
+        ])
+        call_command('check_rollups', stdout=StringIO())
+
+        # A finished file is not processed twice.
+        out = StringIO()
+        call_command('reconcile_settlement', path, stdout=out)
+        self.assertIn('already reconciled', out.getvalue())
+
+    def test_csv_fields_may_span_lines_and_resume(self):
+        path = self.write('settlement.csv', (
+            'Reference,Amount,Status,Memo\n'
+            'PAY-0,10.00,completed,"Batch 7\nsecond memo line"\n'
+            'PAY-404,10.00,completed,"a, b"\n'
+            'PAY-1,10.00,failed,plain\n'
+        ))
+        real_reconcile = settlement.reconcile
+
+        def crash_on_second_chunk(rows):
+            if rows[0][1]['reference'] == 'PAY-404':
+                raise RuntimeError('worker killed')
+            return real_reconcile(rows)
+
+        with mock.patch.object(settlement, 'reconcile', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                call_command('reconcile_settlement', path, '--chunk-size', '1', stdout=StringIO())
+        call_command('reconcile_settlement', path, '--chunk-size', '1', stdout=StringIO())
+        self.assertEqual(
+            dict(Payment.objects.exclude(status='pending').values_list('reference', 'status')),
+            {'PAY-0': 'completed', 'PAY-1': 'failed'},
+        )
+        self.assertEqual(self.report(path), [('4', 'PAY-404', 'unmatched')])
+
+    def test_resumes_after_a_crash(self):
+        path = self.write('settlement.jsonl', ''.join(
+            json.dumps({'reference': reference, 'amount': '10.00', 'status': 'completed'}) + '\n'
+            for reference in ('PAY-0', 'PAY-1', 'PAY-404', 'PAY-3', 'PAY-4', 'PAY-5')
+        ))
+        real_reconcile = settlement.reconcile
+        calls = []
+
+        def crash_on_second_chunk(rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError('worker killed')
+            return real_reconcile(rows)
+
+        with mock.patch.object(settlement, 'reconcile', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                call_command('reconcile_settlement', path, '--chunk-size', '2', stdout=StringIO())
+        self.assertEqual(Payment.objects.filter(status='completed').count(), 2)
+
+        out = StringIO()
+        call_command('reconcile_settlement', path, '--chunk-size', '2', stdout=out)
+        self.assertIn('Resuming', out.getvalue())
+        self.assertEqual(Payment.objects.filter(status='completed').count(), 5)
+        self.assertEqual(self.report(path), [('3', 'PAY-404', 'unmatched')])
+
+class ConditionalListTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='poller', email='poller@example.com', password='x')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.claim = Claim.objects.create(user=self.user, claim_type='Accident', description='First')
+        # User ids repeat between tests; start from an empty version cache.
+        caches['default'].clear()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('claim-list')
+
+    def poll(self, etag, url=None):
+        return self.client.get(url or self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.poll(etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        # The version is cached: no query at all, let alone on accounts_claim.
+        self.assertEqual(len(queries), 0)
+
+        # The ETag covers the query string, and other users' writes do not touch it.
+        self.assertEqual(self.poll(etag, f'{self.url}?status=pending').status_code, status.HTTP_200_OK)
+        Claim.objects.create(user=self.other, claim_type='Theft', description='Not mine')
+        self.assertEqual(self.poll(etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Claim.objects.create(user=self.user, claim_type='Theft', description='Second')
+        response = self.poll(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+        etag = response['ETag']
+        transitions.bulk_transition([self.claim.pk], 'approved')
+        response = self.poll(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.claim.delete()
+        self.assertEqual(self.poll(etag).status_code, status.HTTP_200_OK)
+
+    def test_payments_and_database_store(self):
+        url = reverse('payment-list')
+        with self.settings(COLLECTION_VERSIONS={'BACKEND': 'accounts.versions.DatabaseVersionStore'}):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.poll(etag, url).status_code, status.HTTP_304_NOT_MODIFIED)
+            payment = Payment.objects.create(user=self.user, amount='10.00', reference='PAY-ETAG')
+            self.assertEqual(self.poll(etag, url).status_code, status.HTTP_200_OK)
+            etag = self.client.get(url)['ETag']
+            settlement.reconcile([(1, {'reference': payment.reference, 'amount': '10.00'})])
+            self.assertEqual(self.poll(etag, url).status_code, status.HTTP_200_OK)
+
+class FastListSerializationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lister', email='lister@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = self.settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def random_text(self, rng):
+        alphabet = 'abcXYZ 019_-"\\/\n\t<>&\'éß漢字🙂 '
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+
+    def seed(self, rng, count):
+        base = timezone.now()
+        for i in range(count):
+            claim = Claim.objects.create(
+                user=self.user if rng.random() < 0.9 else None,
+                claim_type=self.random_text(rng)[:100] or 'x',
+                description=self.random_text(rng),
+                status=rng.choice(['pending', 'approved', 'rejected']),
+            )
+            if rng.random() < 0.3:
+                claim.document.save(f'{self.random_text(rng)[:10].strip() or "doc"}.pdf', ContentFile(b'%d' % i))
+            # Microseconds, exact UTC midnights, DST boundaries, the far past.
+            created = rng.choice([
+                base - timedelta(seconds=rng.randint(0, 10 ** 9), microseconds=rng.randint(0, 999999)),
+                base.replace(hour=0, minute=0, second=0, microsecond=0),
+                timezone.make_aware(datetime(2025, 3, 9, 7, 59, 59, 999999), dt_timezone.utc),
+                timezone.make_aware(datetime(1901, 12, 13, 20, 45, 52), dt_timezone.utc),
+            ])
+            Claim.objects.filter(pk=claim.pk).update(created_at=created)
+            Payment.objects.create(
+                user=self.user, reference=f'PAY-{i}-{rng.random()}',
+                amount=Decimal(rng.randint(0, 10 ** 10 - 1)) / 100,
+                status=rng.choice(['pending', 'completed', 'failed']),
+            )
+
+    def fetch(self, url, fast):
+        with self.settings(API_FAST_LIST_SERIALIZATION=fast):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content
+
+    def test_encoder_output_is_byte_identical(self):
+        rng = random.Random(19)
+        self.seed(rng, 60)
+        urls = [
+            reverse('claim-list') + '?page_size=200',
+            reverse('claim-list') + '?ordering=claim_type&page_size=7',
+            reverse('claim-list') + '?status=approved',
+            reverse('payment-list') + '?page_size=200',
+            reverse('payment-list') + '?ordering=status&page_size=9',
+        ]
+        for time_zone in ('UTC', 'America/Chicago', 'Asia/Kathmandu'):
+            with self.settings(TIME_ZONE=time_zone):
+                for url in urls:
+                    with self.subTest(url=url, time_zone=time_zone):
+                        fast = self.fetch(url, True)
+                        self.assertEqual(fast, self.fetch(url, False))
+                        # Follow the cursor: later pages match too.
+                        next_url = json.loads(fast)['next']
+                        if next_url:
+                            self.assertEqual(self.fetch(next_url, True), self.fetch(next_url, False))
+
+    def test_unsupported_serializers_keep_the_normal_path(self):
+        from rest_framework import serializers
+        from .encoders import RowEncoder
+        from .serializers import ClaimSerializer
+
+        class WithMethodField(ClaimSerializer):
+            label = serializers.SerializerMethodField()
+
+            def get_label(self, claim):
+                return str(claim)
+
+        self.assertIsNone(RowEncoder.compile(WithMethodField))
+        self.assertIn('user_id', RowEncoder.compile(ClaimSerializer).columns)
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='mobile', email='mobile@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        Claim.objects.bulk_create([
+            Claim(user=self.user, claim_type='Accident', description='long ' * 1000) for _ in range(5)
+        ])
+        self.url = reverse('claim-list')
+
+    def test_fields_trim_response_and_query(self):
+        for fast in (True, False):
+            with self.subTest(fast=fast), self.settings(API_FAST_LIST_SERIALIZATION=fast):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(self.url, {'fields': 'id,status,created_at', 'page_size': 2})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual([list(row) for row in response.data['results']], [['id', 'status', 'created_at']] * 2)
+                claim_sql = [q['sql'] for q in queries if 'FROM "accounts_claim"' in q['sql']]
+                self.assertEqual(len(claim_sql), 1)
+                self.assertNotIn('"description"', claim_sql[0])
+                self.assertNotIn('"document"', claim_sql[0])
+
+                # The cursor still works when the ordering field is not selected.
+                response = self.client.get(response.data['next'].replace('fields=id%2Cstatus%2Ccreated_at', 'fields=id'))
+                self.assertEqual([list(row) for row in response.data['results']], [['id'], ['id']])
+
+    def test_detail_payments_and_unknown_fields(self):
+        claim = Claim.objects.filter(user=self.user).first()
+        response = self.client.get(reverse('claim-detail', args=[claim.pk]), {'fields': 'claim_type'})
+        self.assertEqual(response.data, {'claim_type': 'Accident'})
+
+        Payment.objects.create(user=self.user, amount='5.00', reference='PAY-SPARSE')
+        response = self.client.get(reverse('payment-list'), {'fields': 'reference,amount'})
+        self.assertEqual(response.data['results'], [{'amount': '5.00', 'reference': 'PAY-SPARSE'}])
+
+        response = self.client.get(self.url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', str(response.data['fields']))
+
+class AsyncReadEndpointTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='async', email='async@example.com', password='x')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        Claim.objects.bulk_create([Claim(user=self.user, claim_type='Accident', description=f'Claim {i}') for i in range(5)])
+        Claim.objects.create(user=self.other, claim_type='Theft', description='Not yours')
+        Payment.objects.create(user=self.user, amount='12.50', reference='PAY-ASYNC')
+
+    def assertSameResponse(self, sync_url, async_url, params=None):
+        expected = self.client.get(sync_url, params)
+        response = self.client.get(async_url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        self.assertEqual(
+            response.content.replace(async_url.encode(), b''), expected.content.replace(sync_url.encode(), b'')
+        )
+        return response
+
+    def test_same_responses_as_sync_views(self):
+        for fast in (True, False):
+            with self.subTest(fast=fast), self.settings(API_FAST_LIST_SERIALIZATION=fast):
+                response = self.assertSameResponse('/api/claims/', '/api/async/claims/', {'page_size': 2})
+                self.assertSameResponse('/api/claims/', '/api/async/claims/', {
+                    'cursor': response.json()['next'].split('cursor=')[1].split('&')[0],
+                    'page_size': 2, 'fields': 'id,status',
+                })
+                self.assertSameResponse('/api/claims/', '/api/async/claims/', {'status': 'bogus'})
+                self.assertSameResponse('/api/payments/', '/api/async/payments/', {'ordering': 'status'})
+
+        claim = Claim.objects.filter(user=self.user).first()
+        self.assertSameResponse(f'/api/claims/{claim.pk}/', f'/api/async/claims/{claim.pk}/')
+        hidden = Claim.objects.get(user=self.other)
+        self.assertSameResponse(f'/api/claims/{hidden.pk}/', f'/api/async/claims/{hidden.pk}/')
+        self.assertSameResponse('/api/claims/abc/', '/api/async/claims/abc/')
+        self.assertSameResponse('/api/dashboard/', '/api/async/dashboard/')
+
+        self.client.credentials()
+        self.assertSameResponse('/api/payments/', '/api/async/payments/')
+        response = self.client.post('/api/async/claims/', {})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertIn('GET', response['Allow'])
+
+    def test_conditional_get(self):
+        response = self.client.get('/api/async/claims/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/async/claims/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Claim.objects.create(user=self.user, claim_type='Accident', description='New')
+        self.assertEqual(self.client.get('/api/async/claims/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    async def test_served_on_the_event_loop(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.get('/api/async/claims/', {'fields': 'claim_type'}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], [{'claim_type': 'Accident'}] * 5)
+        response = await self.async_client.get('/api/async/dashboard/', headers=headers)
+        self.assertEqual(response.json()['claims']['total'], 5)
+
+
+@override_settings(STATUS_EVENTS={'BACKEND': 'accounts.events.LocalBackend', 'HEARTBEAT': 0.5})
+class StatusEventStreamTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sse', email='sse@example.com', password='x')
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.claim = Claim.objects.create(user=self.user, claim_type='Accident', description='x')
+        self.payment = Payment.objects.create(user=self.user, amount='10.00', reference='PAY-SSE')
+        self.other_claim = Claim.objects.create(user=other, claim_type='Theft', description='x')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def change_statuses(self):
+        self.claim.description = 'Edited'
+        self.claim.save()
+        self.claim.status = 'approved'
+        self.claim.save()
+        self.other_claim.status = 'approved'
+        self.other_claim.save()
+        second = Claim.objects.create(user=self.user, claim_type='Fire', description='x')
+        transitions.bulk_transition([second.pk], 'rejected')
+        self.payment.status = 'completed'
+        self.payment.save()
+        return second
+
+    def test_status_changes_are_recorded(self):
+        second = self.change_statuses()
+        self.assertEqual(
+            list(StatusEvent.objects.filter(user=self.user).order_by('pk').values_list(
+                'kind', 'object_id', 'previous_status', 'status')),
+            [
+                ('claim', self.claim.pk, 'pending', 'approved'),
+                ('claim', second.pk, 'pending', 'rejected'),
+                ('payment', self.payment.pk, 'pending', 'completed'),
+            ],
+        )
+
+    def test_save_without_loaded_status_records_only_real_changes(self):
+        unchanged = Claim.objects.only('id', 'user_id', 'description').get(pk=self.claim.pk)
+        unchanged.description = 'Edited'
+        unchanged.save()
+        moved = Claim.objects.only('id', 'user_id').get(pk=self.claim.pk)
+        moved.status = 'approved'
+        moved.save()
+        self.assertEqual(
+            list(StatusEvent.objects.values_list('object_id', 'previous_status', 'status')),
+            [(self.claim.pk, 'pending', 'approved')],
+        )
+
+    def test_backlog_under_wsgi_and_authentication(self):
+        self.change_statuses()
+        first = StatusEvent.objects.filter(user=self.user).order_by('pk').first()
+        response = self.client.get('/api/events/', {'access_token': self.token}, HTTP_LAST_EVENT_ID=str(first.pk))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: 3000\n\n'))
+        self.assertEqual(body.count('event: '), 2)
+        self.assertNotIn(f'id: {first.pk}\n', body)
+        self.assertIn('"previous_status":"pending"', body)
+
+        self.assertEqual(self.client.get('/api/events/').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/api/events/', {'access_token': 'nope'}, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_first_wsgi_connection_gets_an_id_to_resume_from(self):
+        def poll(last_event_id=None):
+            headers = {} if last_event_id is None else {'HTTP_LAST_EVENT_ID': last_event_id}
+            response = self.client.get('/api/events/', {'access_token': self.token}, **headers)
+            return b''.join(response.streaming_content).decode()
+
+        body = poll()
+        self.assertEqual(body, 'retry: 3000\n\nid: 0\n\n')
+        self.claim.status = 'approved'
+        self.claim.save()
+        body = poll('0')
+        self.assertIn('event: claim\n', body)
+        self.assertIn('"status":"approved"', body)
+
+    async def test_live_stream_resumes_after_last_event_id(self):
+        def change(instance, new_status):
+            instance.status = new_status
+            with self.captureOnCommitCallbacks(execute=True):
+                instance.save()
+
+        await sync_to_async(change)(self.claim, 'approved')
+        missed = await StatusEvent.objects.aget(object_id=self.claim.pk)
+        response = await self.async_client.get('/api/events/', headers={
+            'Authorization': f'Bearer {self.token}', 'Accept': 'text/event-stream', 'Last-Event-ID': '0',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertTrue((await anext(chunks)).startswith(f'id: {missed.pk}\nevent: claim\n'.encode()))
+
+        await sync_to_async(change)(self.other_claim, 'rejected')  # Someone else's: not on this stream.
+        await sync_to_async(change)(self.payment, 'failed')
+        live = await anext(chunks)
+        self.assertIn(b'event: payment\n', live)
+        self.assertIn(b'"status":"failed"', live)
+        self.assertEqual(await anext(chunks), b': keep-alive\n\n')
+        # A client disconnecting cancels the task sending the response.
+        pending = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0.05)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(len(events.broker), 0)
+
+
+@override_settings(READ_REPLICAS={'ALIASES': ['replica_test'], 'PIN_SECONDS': 10, 'HEALTH_CHECK_INTERVAL': 60,
+                                  'CACHE': 'default'})
+class ReadReplicaTests(APITestCase):
+    # A second SQLite file standing in for a replica; its rows deliberately
+    # differ from the primary's, so each response shows where it was read.
+    # '__all__' takes it in once setUpClass has added it.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings['replica_test'] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            'replica_test': {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+            },
+        })['replica_test']
+        call_command('migrate', database='replica_test', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_test'].close()
+        del connections['replica_test']
+        del connections.settings['replica_test']
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        replicas.health.clear()
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='replica', email='replica@example.com', password='x')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        Claim.objects.create(user=self.user, claim_type='Accident', description='On the primary')
+        replica_user = User.objects.using('replica_test').create(pk=self.user.pk, username='replica')
+        Claim.objects.using('replica_test').create(user=replica_user, claim_type='Accident', description='On the replica')
+        UserRollup.objects.using('replica_test').create(user=replica_user, claims_pending=7)
+
+    def descriptions(self, url='/api/claims/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [claim['description'] for claim in response.json()['results']]
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.descriptions(), ['On the replica'])
+        self.assertEqual(self.descriptions('/api/async/claims/'), ['On the replica'])
+        self.assertEqual(self.client.get('/api/dashboard/').json()['claims']['pending'], 7)
+        self.assertEqual(self.client.get('/api/async/dashboard/').json()['claims']['pending'], 7)
+        export = b''.join(self.client.get(reverse('claim-export')).streaming_content).decode()
+        self.assertIn('On the replica', export)
+        # Outside the views, and for writes, everything stays on the primary.
+        self.assertEqual(Claim.objects.get(user=self.user).description, 'On the primary')
+        self.assertEqual(router.db_for_write(Claim), DEFAULT_DB_ALIAS)
+
+    def test_writer_is_pinned_to_the_primary(self):
+        self.assertEqual(self.descriptions(), ['On the replica'])
+        response = self.client.post('/api/claims/', {'claim_type': 'Theft', 'description': 'Just filed'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.descriptions(), ['Just filed', 'On the primary'])
+
+        caches['default'].delete(f'replica-pin:{self.user.pk}')  # The pin expires.
+        self.assertEqual(self.descriptions(), ['On the replica'])
+
+    def test_unhealthy_replica_falls_back_to_the_primary(self):
+        replica = connections['replica_test']
+        with mock.patch.object(replica, 'ensure_connection', side_effect=OperationalError('down')), \
+                mock.patch.object(replica, 'close'):
+            self.assertEqual(self.descriptions(), ['On the primary'])
+        # Remembered for HEALTH_CHECK_INTERVAL, then checked again.
+        self.assertEqual(self.descriptions(), ['On the primary'])
+        replicas.health.clear()
+        self.assertEqual(self.descriptions(), ['On the replica'])
+
+
+class TokenBlacklistTests(APITestCase):
+    def setUp(self):
+        tokens.blacklist_filter.clear()
+        self.user = User.objects.create_user(username='refresher', email='refresher@example.com', password='x')
+
+    def login(self):
+        response = self.client.post(reverse('custom_login'), {'login': 'refresher', 'password': 'x'})
+        return response.data['refresh']
+
+    def refresh(self, refresh):
+        return self.client.post(reverse('token_refresh'), {'refresh': refresh})
+
+    def test_refresh_skips_the_blacklist_query(self):
+        refresh = self.login()
+        self.assertEqual(OutstandingToken.objects.filter(user=self.user).count(), 1)
+        tokens.blacklist_filter.might_contain('warm-up')
+        with self.assertNumQueries(1):  # The user, to check they are still active.
+            response = self.refresh(refresh)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+
+        tokens.RefreshToken(refresh).blacklist()  # Added to this process's filter at once.
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data['code'], 'token_not_valid')
+
+    def test_tokens_blacklisted_elsewhere_are_synced(self):
+        refresh = self.login()
+        self.assertEqual(self.refresh(refresh).status_code, status.HTTP_200_OK)
+        # Blacklisted by another process: no signal reaches this one.
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=OutstandingToken.objects.get(user=self.user))])
+        with self.settings(TOKEN_BLACKLIST={'REFRESH_INTERVAL': 0}):
+            self.assertEqual(self.refresh(refresh).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rebuild_runs_outside_the_lock_and_keeps_serving_the_old_filter(self):
+        blacklist = tokens.blacklist_filter
+        blacklist.might_contain('warm-up')
+        old = blacklist._bloom
+        build = blacklist._build
+        served = []
+
+        def slow_build(config):
+            self.assertFalse(blacklist._lock.locked())
+            # Other threads are served the old filter meanwhile, and what they
+            # blacklist reaches the new one.
+            served.append(blacklist._current())
+            blacklist.add('blacklisted-during-rebuild')
+            return build(config)
+
+        with self.settings(TOKEN_BLACKLIST={'REBUILD_INTERVAL': 0}), \
+                mock.patch.object(blacklist, '_build', side_effect=slow_build):
+            blacklist._current()
+        self.assertEqual(served, [old])
+        self.assertIsNot(blacklist._bloom, old)
+        self.assertIn('blacklisted-during-rebuild', blacklist._bloom)
+
+    def test_sync_queries_outside_the_lock(self):
+        blacklist = tokens.blacklist_filter
+        blacklist.might_contain('warm-up')
+        load = blacklist._load
+
+        def locked_load(*args):
+            self.assertFalse(blacklist._lock.locked())
+            self.assertEqual(blacklist._current(), blacklist._bloom)  # Served, not queued behind the sync.
+            return load(*args)
+
+        refresh = self.login()
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=OutstandingToken.objects.get(user=self.user))])
+        jti = OutstandingToken.objects.get(user=self.user).jti
+        with self.settings(TOKEN_BLACKLIST={'REFRESH_INTERVAL': 0}), \
+                mock.patch.object(blacklist, '_load', side_effect=locked_load) as patched:
+            self.assertTrue(blacklist.might_contain(jti))
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(self.refresh(refresh).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_expired_tokens_in_batches(self):
+        now = timezone.now()
+        issued = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=self.user, jti=f'jti-{i}', token='t', created_at=now,
+                             expires_at=now + timedelta(days=-1 if i < 7 else 1))
+            for i in range(10)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=issued[i]) for i in (1, 3, 8)])
+
+        out = StringIO()
+        call_command('purge_expired_tokens', batch_size=3, stdout=out)
+        self.assertIn('Removed 7 expired outstanding token(s), 2 of them blacklisted.', out.getvalue())
+        self.assertEqual(
+            list(OutstandingToken.objects.order_by('pk').values_list('jti', flat=True)), ['jti-7', 'jti-8', 'jti-9']
+        )
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, 'jti-8')
+
+        # The newest blacklist entry is kept even once expired.
+        OutstandingToken.objects.update(expires_at=now - timedelta(days=1))
+        self.assertEqual(tokens.purge_expired(batch_size=2), (2, 0))
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['jti-8'])
+
+    def test_bloom_filter(self):
+        bloom = tokens.BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'in-{i}')
+        self.assertTrue(all(f'in-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'out-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
@@ -0,0 +1,226 @@
+"""
+Refresh tokens on top of ``rest_framework_simplejwt.token_blacklist``.
+
+Every login stores an ``OutstandingToken`` and every refresh asks whether
+its JTI is blacklisted. Two things keep that cheap as the tables grow:
+
+* ``blacklist_filter``: a per-process Bloom filter of the blacklisted JTIs.
+  ``RefreshToken.check_blacklist`` only queries the database when the
+  filter says "maybe", so refreshing a valid token, the common case, costs
+  no query. The filter is rebuilt from the table every ``REBUILD_INTERVAL``
+  seconds. In between, every ``REFRESH_INTERVAL`` seconds, it adds the rows
+  blacklisted since. Both read the table without holding the filter's lock:
+  one thread does the work while the others keep using the current filter. Tokens blacklisted in this process are added at once
+  (accounts.signals); a token blacklisted by another process can still be
+  refreshed here for up to ``REFRESH_INTERVAL`` seconds.
+* ``purge_expired``: deletes expired outstanding tokens and their blacklist
+  entries in short batches (``purge_expired_tokens``). simplejwt's
+  ``flushexpiredtokens`` deletes them all in one transaction, after loading
+  every expired row into memory.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Max, Min
+from django.utils import timezone
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+DEFAULTS = {
+    'REFRESH_INTERVAL': 5,
+    'REBUILD_INTERVAL': 3600,
+    # Rows are read again for this many seconds after they were written: a
+    # transaction that took an id earlier but committed later is still seen.
+    'COMMIT_GRACE': 5,
+    'FALSE_POSITIVE_RATE': 0.01,
+    'MIN_CAPACITY': 10000,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_BLACKLIST', {})}
+
+
+class BloomFilter:
+    """A set of strings that may report false positives, at ``error_rate`` while ``capacity`` are stored."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        if key in self:
+            return
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BlacklistFilter:
+    """The JTIs that may be blacklisted, kept in step with ``BlacklistedToken``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._bloom = None
+            self._floor = 0
+            self._built_at = self._synced_at = 0
+            self._rebuilding = self._syncing = False
+            self._added = []  # JTIs added while a rebuild is in progress
+            self._generation += 1  # A rebuild or sync started before clear() is dropped.
+
+    def might_contain(self, jti):
+        try:
+            bloom = self._current()
+        except DatabaseError:
+            return True  # Let the database lookup decide (or fail).
+        # None while another thread builds the first filter: ask the database.
+        return bloom is None or jti in bloom
+
+    def add(self, jti):
+        with self._lock:
+            self._add([jti])
+
+    def _add(self, jtis):
+        if self._bloom is not None:
+            for jti in jtis:
+                self._bloom.add(jti)
+        if self._rebuilding:
+            self._added.extend(jtis)
+
+    def _current(self):
+        config = get_config()
+        now = time.monotonic()
+        with self._lock:
+            bloom, floor, generation = self._bloom, self._floor, self._generation
+            stale = bloom is None or bloom.count > bloom.capacity or now - self._built_at >= config['REBUILD_INTERVAL']
+            if stale and not self._rebuilding:
+                self._rebuilding, self._added, rebuild = True, [], True
+            elif bloom is not None and not self._syncing and now - self._synced_at >= config['REFRESH_INTERVAL']:
+                self._syncing, rebuild = True, False
+            else:
+                return bloom
+
+        # The database is read without the lock, by one thread for each kind
+        # of work; the others keep serving the current filter meanwhile.
+        if rebuild:
+            return self._rebuild(config, generation)
+        return self._sync(config, generation, bloom, floor)
+
+    def _rebuild(self, config, generation):
+        try:
+            bloom, floor = self._build(config)
+        except BaseException:
+            with self._lock:
+                if generation == self._generation:
+                    self._rebuilding = False
+            raise
+        with self._lock:
+            if generation == self._generation:
+                for jti in self._added:
+                    bloom.add(jti)
+                self._bloom, self._floor, self._rebuilding, self._added = bloom, floor, False, []
+                self._built_at = self._synced_at = time.monotonic()
+        return bloom
+
+    def _build(self, config):
+        capacity = max(2 * BlacklistedToken.objects.count(), config['MIN_CAPACITY'])
+        bloom = BloomFilter(capacity, config['FALSE_POSITIVE_RATE'])
+        return bloom, self._load(bloom.add, BlacklistedToken.objects.all(), 0, config)
+
+    def _sync(self, config, generation, bloom, floor):
+        jtis = []
+        try:
+            floor = self._load(jtis.append, BlacklistedToken.objects.filter(pk__gt=floor), floor, config)
+        except BaseException:
+            with self._lock:
+                if generation == self._generation:
+                    self._syncing = False
+            raise
+        with self._lock:
+            if generation != self._generation:
+                return bloom
+            self._add(jtis)
+            if self._bloom is bloom:
+                # A filter swapped in meanwhile keeps the floor of its own scan.
+                self._floor = floor
+            self._synced_at = time.monotonic()
+            self._syncing = False
+            return self._bloom
+
+    def _load(self, add, queryset, floor, config):
+        """Pass the JTIs of ``queryset`` to ``add``; return the pk up to which later syncs need not look."""
+        horizon = timezone.now() - timedelta(seconds=config['COMMIT_GRACE'])
+        rows = queryset.order_by('pk').values_list('pk', 'token__jti', 'blacklisted_at')
+        for pk, jti, blacklisted_at in rows.iterator(chunk_size=10000):
+            add(jti)
+            if blacklisted_at <= horizon:
+                floor = max(floor, pk)
+        return floor
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(tokens.RefreshToken):
+    """A refresh token whose blacklist check skips the query for JTIs ``blacklist_filter`` rules out."""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+
+def purge_expired(batch_size=1000):
+    """
+    Delete expired outstanding tokens, and their blacklist entries, at most
+    ``batch_size`` ids per transaction. Return ``(outstanding, blacklisted)``
+    counts.
+
+    Tokens are issued in id order with one lifetime, so the expired ones are
+    the lowest ids. Walking id ranges upwards from the first token reads only
+    those, without an index on ``expires_at``. The walk stops at the first
+    range that holds tokens but none expired.
+
+    The newest blacklist entry is kept: databases that restart numbering at
+    max(id) + 1 (MySQL before 8.0, after a restart) would otherwise hand out
+    purged ids again, below where ``blacklist_filter`` looks for new entries.
+    """
+    now = timezone.now()
+    outstanding = blacklisted = 0
+    newest = BlacklistedToken.objects.order_by('-pk').values_list('token_id', flat=True).first()
+    bounds = OutstandingToken.objects.aggregate(start=Min('pk'), end=Max('pk'))
+    start, end = bounds['start'], bounds['end']
+    while start is not None and start <= end:
+        window = OutstandingToken.objects.filter(pk__gte=start, pk__lt=start + batch_size).exclude(pk=newest)
+        expired = window.filter(expires_at__lte=now)
+        if expired.exists():
+            # The blacklist entries go with them (on_delete=CASCADE).
+            deleted = expired.delete()[1]
+            outstanding += deleted.get(OutstandingToken._meta.label, 0)
+            blacklisted += deleted.get(BlacklistedToken._meta.label, 0)
+        elif window.exists():
+            break
+        start = OutstandingToken.objects.filter(pk__gte=start + batch_size).aggregate(start=Min('pk'))['start']
+    return outstanding, blacklisted
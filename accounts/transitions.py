@@ -0,0 +1,106 @@
+"""
+Bulk claim status transitions.
+
+``bulk_transition()`` moves many claims to a new status. Ids are handled in
+chunks, and each chunk is one transaction that:
+
+1. reads (and, where supported, locks) the chunk's current statuses,
+2. runs a single ``UPDATE ... WHERE id IN (...) AND status IN (<allowed
+   sources>)``,
+3. writes one ``ClaimStatusChange`` audit row per changed claim with a
+   single ``bulk_create``, and
+4. sends ``claim_statuses_changed`` so the dashboard rollups follow.
+
+Every requested id gets an entry in the returned report.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .models import Claim, ClaimStatusChange
+from .signals import claim_statuses_changed
+
+# target status -> statuses a claim may move to it from
+ALLOWED_TRANSITIONS = {
+    'approved': {'pending'},
+    'rejected': {'pending'},
+}
+
+# Comfortably below SQLite's default limit on query parameters.
+CHUNK_SIZE = 500
+
+TRANSITIONED = 'transitioned'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid_transition'
+CONFLICT = 'conflict'
+
+
+def get_max_ids():
+    return getattr(settings, 'CLAIM_TRANSITION_MAX_IDS', 10000)
+
+
+def bulk_transition(ids, target, actor=None, chunk_size=CHUNK_SIZE):
+    """
+    Move the claims ``ids`` to ``target``; return ``[{id, result, status}]``
+    in request order. ``result`` is ``transitioned``, ``not_found``,
+    ``invalid_transition`` (the claim's current status does not allow it) or
+    ``conflict`` (other writers kept moving claims of its chunk; nothing in
+    the chunk changed, so retrying those ids is safe).
+    """
+    sources = ALLOWED_TRANSITIONS[target]
+    ids = list(dict.fromkeys(ids))
+    report = {}
+    for start in range(0, len(ids), chunk_size):
+        report.update(_transition_chunk(ids[start:start + chunk_size], target, sources, actor))
+    return [{'id': pk, **report[pk]} for pk in ids]
+
+
+class _Conflict(Exception):
+    pass
+
+
+def _transition_chunk(ids, target, sources, actor, attempts=3):
+    for attempt in range(attempts):
+        try:
+            current, eligible = _apply_chunk(ids, target, sources, actor)
+        except _Conflict:
+            # Without row locks (SQLite) another writer moved some of these
+            # claims between our read and our UPDATE; the chunk was rolled
+            # back, so read it again.
+            continue
+        break
+    else:
+        current = dict(Claim.objects.filter(pk__in=ids).values_list('pk', 'status').order_by())
+        return {pk: {'result': CONFLICT, 'status': current.get(pk)} for pk in ids}
+
+    report = {}
+    moved = set(eligible)
+    for pk in ids:
+        if pk in moved:
+            report[pk] = {'result': TRANSITIONED, 'status': target}
+        elif pk in current:
+            report[pk] = {'result': INVALID, 'status': current[pk][1]}
+        else:
+            report[pk] = {'result': NOT_FOUND, 'status': None}
+    return report
+
+
+def _apply_chunk(ids, target, sources, actor):
+    with transaction.atomic():
+        current = {
+            pk: (user_id, status)
+            for pk, user_id, status in Claim.objects.select_for_update()
+            .filter(pk__in=ids).values_list('pk', 'user_id', 'status').order_by()
+        }
+        eligible = [pk for pk in ids if pk in current and current[pk][1] in sources]
+        if Claim.objects.filter(pk__in=eligible, status__in=sources).update(status=target) != len(eligible):
+            raise _Conflict
+        ClaimStatusChange.objects.bulk_create([
+            ClaimStatusChange(claim_id=pk, from_status=current[pk][1], to_status=target, actor=actor)
+            for pk in eligible
+        ])
+        if eligible:
+            claim_statuses_changed.send(
+                sender=Claim,
+                changes=[(pk, current[pk][0], current[pk][1], target) for pk in eligible],
+            )
+    return current, eligible
@@ -0,0 +1,129 @@
+"""
+Resumable chunked uploads of claim documents.
+
+1. ``POST /api/uploads/`` with ``{"filename", "size"}`` opens a session.
+2. ``PUT /api/uploads/<id>/`` sends raw bytes with a
+   ``Content-Range: bytes <start>-<end>/<size>`` header. ``start`` must equal
+   the session's current offset. The body is copied to a part file on disk in
+   small blocks and is never held in memory whole. One PUT per session writes
+   at a time; a concurrent one gets 409 with the current offset.
+3. ``GET /api/uploads/<id>/`` reports the acknowledged offset. After a dropped
+   connection the client resumes from there.
+4. ``POST /api/uploads/<id>/finalize/`` with ``{"claim": <id>}`` moves the
+   finished file into the claim's document storage.
+
+Expired sessions are removed by ``python manage.py cleanup_upload_sessions``.
+"""
+import fcntl
+import os
+import re
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+BLOCK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class PartialUpload(File):
+    """
+    A finished part file handed to the storage backend. Exposing
+    ``temporary_file_path()`` lets FileSystemStorage move it into place
+    instead of copying it.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def partial_dir():
+    return Path(settings.MEDIA_ROOT) / 'uploads' / 'partial'
+
+
+def get_ttl():
+    return timedelta(hours=getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', 24))
+
+
+def get_max_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 100 * 1024 * 1024)
+
+
+def parse_content_range(header):
+    """Return ``(start, end, total)`` from a Content-Range header, or None."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        return None
+    start, end, total = map(int, match.groups())
+    if end < start:
+        return None
+    return start, end, total
+
+
+def create_part_file(session):
+    session.part_path.parent.mkdir(parents=True, exist_ok=True)
+    session.part_path.touch()
+
+
+class UploadInProgress(Exception):
+    """Another request is writing to the session's part file."""
+
+
+@contextmanager
+def open_part_file(session):
+    """
+    Open the part file for writing under an exclusive lock, held until the
+    block exits, or raise ``UploadInProgress`` if another request holds it.
+    Re-read the session's offset inside the block before writing.
+    """
+    with open(session.part_path, 'r+b') as part:
+        try:
+            fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadInProgress()
+        try:
+            yield part
+        finally:
+            fcntl.flock(part.fileno(), fcntl.LOCK_UN)
+
+
+def write_range(part, stream, start, length):
+    """
+    Copy up to ``length`` bytes from ``stream`` into the open part file at
+    ``start`` and return how many were written. A client that disconnects
+    mid-chunk leaves a short write, which is still durable and acknowledged.
+    """
+    written = 0
+    part.seek(start)
+    while written < length:
+        block = stream.read(min(BLOCK_SIZE, length - written))
+        if not block:
+            break
+        part.write(block)
+        written += len(block)
+    part.flush()
+    os.fsync(part.fileno())
+    return written
+
+
+def attach_to_claim(session, claim):
+    """Move the completed part file into ``claim.document``."""
+    with open(session.part_path, 'rb') as part:
+        claim.document = PartialUpload(part, name=session.filename)
+        claim.save()
+    delete_part_file(session)
+
+
+def delete_part_file(session):
+    try:
+        session.part_path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def extend_expiry(session):
+    session.expires_at = timezone.now() + get_ttl()
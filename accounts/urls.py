@@ -1,14 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 from user_accounts.views import LoginView, RegisterView
 
 router = DefaultRouter()
 router.register(r'claims', views.ClaimViewSet, basename='claim')
 router.register(r'payments', views.PaymentViewSet, basename='payment')
+router.register(r'uploads', views.UploadSessionViewSet, basename='upload')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('login/', LoginView.as_view(), name='custom_login'),
     path('register/', RegisterView.as_view(), name='custom_register'),
+    path('auth/cache-stats/', views.auth_cache_stats, name='auth_cache_stats'),
+    path('webhooks/payments/', views.payment_webhook, name='payment_webhook'),
+    path('events/', async_views.status_events, name='status_events'),
 ]
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Per-user collection versions and conditional GETs for the list endpoints.
+
+Every write to a user's claims or payments bumps that user's version of
+the collection. A list response carries a strong ETag derived from the
+version, the user and the full request path (filters, ordering, cursor).
+A poll sending ``If-None-Match`` with that ETag gets ``304 Not Modified``
+after one version lookup. The claim and payment tables and the serializers
+are not touched.
+
+Versions are read through the store named by ``COLLECTION_VERSIONS['BACKEND']``:
+
+* ``CachedVersionStore`` (default): a Django cache in front of the
+  ``CollectionVersion`` table. Bumps write the table and evict the cache
+  entry. With the default per-process local-memory cache, ``TTL`` bounds
+  how long another process can serve a version older than the table.
+  Point ``CACHE`` at a shared cache to remove that window.
+* ``DatabaseVersionStore``: the table only.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import F
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.module_loading import import_string
+
+from .models import CollectionVersion
+
+CLAIMS = 'claims'
+PAYMENTS = 'payments'
+
+DEFAULTS = {
+    'BACKEND': 'accounts.versions.CachedVersionStore',
+    'CACHE': 'default',
+    'TTL': 5,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'COLLECTION_VERSIONS', {})}
+
+
+class DatabaseVersionStore:
+    def __init__(self, config):
+        self.config = config
+
+    def get(self, user_id, collection):
+        version = (
+            CollectionVersion.objects.filter(user_id=user_id, collection=collection)
+            .values_list('version', flat=True).first()
+        )
+        return version or 0
+
+    def bump(self, user_ids, collection):
+        user_ids = set(user_ids) - {None}
+        if not user_ids:
+            return
+        rows = CollectionVersion.objects.filter(collection=collection)
+        if rows.filter(user_id__in=user_ids).update(version=F('version') + 1) == len(user_ids):
+            return
+        # First write for some users: create their rows, then bump those too
+        # (a concurrent bump may have created one in the meantime).
+        existing = set(rows.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        missing = user_ids - existing
+        CollectionVersion.objects.bulk_create(
+            [CollectionVersion(user_id=user_id, collection=collection) for user_id in missing],
+            ignore_conflicts=True,
+        )
+        rows.filter(user_id__in=missing).update(version=F('version') + 1)
+
+
+class CachedVersionStore(DatabaseVersionStore):
+    @property
+    def cache(self):
+        return caches[self.config['CACHE']]
+
+    def key(self, user_id, collection, using=DEFAULT_DB_ALIAS):
+        if using != DEFAULT_DB_ALIAS:
+            # Versions read from a replica are cached apart: a lagging replica
+            # must not put an old version back in front of the primary's.
+            return f'collection-version:{collection}:{user_id}:{using}'
+        return f'collection-version:{collection}:{user_id}'
+
+    def get(self, user_id, collection):
+        key = self.key(user_id, collection, router.db_for_read(CollectionVersion))
+        version = self.cache.get(key)
+        if version is None:
+            version = super().get(user_id, collection)
+            self.cache.set(key, version, self.config['TTL'])
+        return version
+
+    def bump(self, user_ids, collection):
+        super().bump(user_ids, collection)
+        keys = [self.key(user_id, collection) for user_id in set(user_ids) - {None}]
+        self.cache.delete_many(keys)
+        # Also after commit: a reader may have cached the old version between
+        # our UPDATE and the commit.
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    config = get_config()
+    if _store is None or _store.config != config:
+        _store = import_string(config['BACKEND'])(config)
+    return _store
+
+
+def bump(user_ids, collection):
+    get_store().bump(user_ids, collection)
+
+
+def etag_for(request, collection):
+    version = get_store().get(request.user.pk, collection)
+    renderer = getattr(request, 'accepted_media_type', '')
+    key = f'{collection}:{request.user.pk}:{version}:{request.get_full_path()}:{renderer}'
+    return '"%s"' % hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _matches(if_none_match, etag):
+    tags = parse_etags(if_none_match)
+    return '*' in tags or etag in {tag.removeprefix('W/') for tag in tags}
+
+
+def is_not_modified(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    return bool(if_none_match) and _matches(if_none_match, etag)
+
+
+def add_validators(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+class ConditionalListMixin:
+    """
+    ETag and ``If-None-Match`` support for ``list`` on a per-user collection
+    (``version_collection``). Answering 304 costs one version lookup.
+    """
+    version_collection = None
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        # Read before the query: a write landing in between leaves the
+        # response with the older ETag, so the next poll refetches.
+        etag = etag_for(request, self.version_collection)
+        if is_not_modified(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return add_validators(response, etag)
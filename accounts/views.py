@@ -1,24 +1,81 @@
 # accounts/views.py
-from rest_framework import viewsets, status, generics, permissions
+from django.db import router
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import mixins, viewsets, status, generics, permissions
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import NotFound, ParseError, PermissionDenied, ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
+import os
 import uuid
 
-from .models import Claim, Payment
+from . import downloads, exports, payments, search, transitions, uploads, versions
+from .encoders import FastListMixin
+from .fieldsets import SparseFieldsMixin
+from .idempotency import IdempotentCreateMixin
+from .replicas import ReplicaReadMixin
+from .versions import ConditionalListMixin
+from .authentication import user_cache
+from .filters import RecordFilterBackend
+from .models import Claim, Payment, UploadSession
+from .pagination import KeysetPagination
 from .serializers import (
     ClaimSerializer,
+    ClaimTransitionSerializer,
+    FinalizeUploadSerializer,
     PaymentSerializer,
+    UploadSessionSerializer,
 )
 
 # This is a standard Django view, not a DRF one. It might be deprecated.
 # Consider if you still need it.
 
-class ClaimViewSet(viewsets.ModelViewSet):   # should allow POST
+class ExportMixin:
+    """
+    Adds GET <list>/export/?export_format=ndjson|csv, a streamed download of
+    every row the caller may see: all users' rows for staff, otherwise their
+    own. The list filters (?status=, ?created_after=, ...) apply.
+    """
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in exports.FORMATS:
+            raise ValidationError({'export_format': [f'Choose one of: {", ".join(exports.FORMATS)}.']})
+
+        queryset = self.queryset.model.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(user=request.user)
+        # The rows are read once the response streams, after finalize_response()
+        # has ended ReplicaReadMixin's routing: pick the database now.
+        queryset = self.filter_queryset(queryset).using(router.db_for_read(queryset.model))
+
+        response = StreamingHttpResponse(
+            exports.stream(queryset, export_format),
+            content_type=exports.FORMATS[export_format],
+        )
+        filename = f"{self.basename}s-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+class ClaimViewSet(ReplicaReadMixin, ConditionalListMixin, SparseFieldsMixin, FastListMixin, IdempotentCreateMixin,
+                   ExportMixin, viewsets.ModelViewSet):   # should allow POST
     queryset = Claim.objects.all()
+    version_collection = versions.CLAIMS
     serializer_class = ClaimSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [RecordFilterBackend, OrderingFilter]
+    filter_fields = ('status', 'claim_type')
+    ordering_fields = ('created_at', 'status', 'claim_type')
+    ordering = ('-created_at', '-id')
 
     def get_permissions(self):
         """Customize permissions depending on request method"""
-        if self.action in ['list', 'retrieve', 'update', 'partial_update', 'destroy']:
+        if self.action in ['search', 'transition']:
+            # Searching or moving every user's claims → staff only
+            permission_classes = [permissions.IsAdminUser]
+        elif self.action in ['list', 'retrieve', 'update', 'partial_update', 'destroy', 'export', 'document']:
             # Viewing or managing claims → must be logged in
             permission_classes = [permissions.IsAuthenticated]
         else:
@@ -40,10 +97,61 @@ class ClaimViewSet(viewsets.ModelViewSet):   # should allow POST
         else:
             serializer.save()
 
-class PaymentViewSet(viewsets.ModelViewSet): # should allow POST
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Staff full-text search over all claims: ?q=<words>&page_size=<n>, best
+        match first. Only the newest ``candidate_limit`` matches are ranked.
+        """
+        query = request.query_params.get('q', '')
+        if not search.terms(query):
+            raise ValidationError({'q': ['Enter one or more words to search for.']})
+        limit = KeysetPagination().get_page_size(request)
+        results = search.search(Claim.objects.all(), query, limit)
+        data = self.get_serializer(results, many=True).data
+        for row, claim in zip(data, results):
+            row['rank'] = claim.search_rank
+        return Response({'results': data, 'candidate_limit': search.get_candidate_limit()})
+
+    @action(detail=False, methods=['post'], serializer_class=ClaimTransitionSerializer)
+    def transition(self, request):
+        """
+        Staff bulk status change: {"ids": [...], "status": "approved"|"rejected"}.
+        Only pending claims move; the response reports the outcome per id,
+        including ``conflict`` for ids that could not be moved for contention.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = transitions.bulk_transition(
+            serializer.validated_data['ids'], serializer.validated_data['status'], actor=request.user,
+        )
+        transitioned = sum(row['result'] == transitions.TRANSITIONED for row in results)
+        return Response({
+            'transitioned': transitioned,
+            'skipped': len(results) - transitioned,
+            'results': results,
+        })
+
+    @action(detail=True, methods=['get'])
+    def document(self, request, pk=None):
+        """The claim's document, for its owner; supports Range and conditional GETs."""
+        claim = self.get_object()
+        if not claim.document:
+            raise NotFound('This claim has no document.')
+        extension = os.path.splitext(claim.document.name)[1]
+        return downloads.serve(request, claim.document, f'claim-{claim.pk}{extension}')
+
+class PaymentViewSet(ReplicaReadMixin, ConditionalListMixin, SparseFieldsMixin, FastListMixin,
+                     IdempotentCreateMixin, ExportMixin, viewsets.ModelViewSet): # should allow POST
     permission_classes = [permissions.IsAuthenticated]
     queryset = Payment.objects.all()
+    version_collection = versions.PAYMENTS
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [RecordFilterBackend, OrderingFilter]
+    filter_fields = ('status',)
+    ordering_fields = ('created_at', 'status')
+    ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
@@ -51,4 +159,102 @@ class PaymentViewSet(viewsets.ModelViewSet): # should allow POST
     def perform_create(self, serializer):
         # Generate a unique reference for the payment
         reference = f"PAY-{uuid.uuid4().hex[:10].upper()}"
-        serializer.save(user=self.request.user, reference=reference)
\ No newline at end of file
+        serializer.save(user=self.request.user, reference=reference)
+
+class UploadSessionViewSet(ReplicaReadMixin,
+                           mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """Resumable chunked uploads of claim documents; see accounts.uploads."""
+    permission_classes = [permissions.IsAuthenticated]
+    # Clients resume from the offset they read: never a replica's stale one.
+    # Writes still pin the user, for the claim a finalize updates.
+    replica_reads = False
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user, expires_at__gt=timezone.now())
+
+    def perform_create(self, serializer):
+        session = serializer.save(user=self.request.user, expires_at=timezone.now() + uploads.get_ttl())
+        uploads.create_part_file(session)
+
+    def perform_destroy(self, instance):
+        uploads.delete_part_file(instance)
+        instance.delete()
+
+    def update(self, request, *args, **kwargs):
+        session = self.get_object()
+        content_range = uploads.parse_content_range(request.headers.get('Content-Range'))
+        if content_range is None:
+            raise ValidationError({'Content-Range': ['Send "Content-Range: bytes <start>-<end>/<size>".']})
+        start, end, total = content_range
+        if total != session.size or end >= session.size:
+            raise ValidationError({'Content-Range': [f'Range must lie within the {session.size}-byte file.']})
+        try:
+            with uploads.open_part_file(session) as part:
+                # Re-read under the lock: a PUT that held it before us may have
+                # moved the offset.
+                session.refresh_from_db(fields=['offset'])
+                if start != session.offset:
+                    # Out of order or a retry of bytes already stored: tell the
+                    # client where to resume from.
+                    return Response(self.get_serializer(session).data, status=status.HTTP_409_CONFLICT)
+                written = uploads.write_range(part, request.stream, start, end - start + 1) if request.stream else 0
+                uploads.extend_expiry(session)
+                UploadSession.objects.filter(pk=session.pk).update(
+                    offset=start + written, expires_at=session.expires_at
+                )
+            session.refresh_from_db()
+        except uploads.UploadInProgress:
+            # Another PUT to this session is still writing; resume once it is done.
+            return Response(self.get_serializer(session).data, status=status.HTTP_409_CONFLICT)
+        except (FileNotFoundError, UploadSession.DoesNotExist):
+            raise NotFound('The upload session was finalized or deleted.')
+        return Response(self.get_serializer(session).data)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        session = self.get_object()
+        if not session.is_complete:
+            return Response(self.get_serializer(session).data, status=status.HTTP_409_CONFLICT)
+        serializer = FinalizeUploadSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+
+        claim = serializer.validated_data['claim']
+        try:
+            # Locked, so neither a PUT nor a second finalize can run alongside.
+            with uploads.open_part_file(session):
+                session.refresh_from_db()
+                uploads.attach_to_claim(session, claim)
+                session.delete()
+        except uploads.UploadInProgress:
+            return Response(self.get_serializer(session).data, status=status.HTTP_409_CONFLICT)
+        except (FileNotFoundError, UploadSession.DoesNotExist):
+            raise NotFound('The upload session was finalized or deleted.')
+        return Response(ClaimSerializer(claim, context=self.get_serializer_context()).data)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def auth_cache_stats(request):
+    """Hit/miss counters of this process's JWT user cache."""
+    return Response(user_cache.stats())
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def payment_webhook(request):
+    """
+    Payment-provider callbacks. Verified events are appended to the inbox and
+    acknowledged with 202; ``process_payment_events`` applies them.
+    """
+    # The signature covers the raw bytes, so request.data is never parsed.
+    if not payments.verify_signature(request.body, request.headers.get(payments.SIGNATURE_HEADER)):
+        raise PermissionDenied('Invalid webhook signature.')
+    try:
+        received = payments.ingest(request.body)
+    except payments.InvalidPayload as exc:
+        raise ParseError(str(exc))
+    return Response({'received': received}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,49 @@
+"""
+Shared bootstrap for the benchmark scripts in this directory.
+
+The benchmarks never touch the database configured in .env: each run points
+DATABASE_URL at a scratch SQLite file (reused between runs so that seeding a
+million rows only happens once) and migrates it before use.
+"""
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DATABASE = Path(os.environ.get('BENCH_DATABASE', '/tmp/jelani-bench.sqlite3'))
+
+
+def setup_django(database=DEFAULT_DATABASE):
+    sys.path.insert(0, str(PROJECT_ROOT))
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    os.environ.setdefault('DEBUG', 'False')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jelani_backend.settings')
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def get_bench_user(username='bench'):
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    user, created = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.com'})
+    if created:
+        user.set_password('bench-password')
+        user.save(update_fields=['password'])
+    return user
+
+
+def timed(func, repeat=5):
+    """Return the best wall-clock time of ``repeat`` calls, in milliseconds."""
+    import time
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
@@ -0,0 +1,237 @@
+"""
+WSGI threads vs ASGI under slow clients: GET /api/async/claims/ latency
+while more and more connections trickle their requests in.
+
+    python benchmarks/asgi_load.py --threads 8 --slow 0 16 64 256 --duration 10
+
+Each server is one process on the benchmark database:
+
+* WSGI: gunicorn with the gthread worker and --threads threads, the
+  production setup. A thread reads the whole request, so a slow client pins
+  one for as long as it takes to send it.
+* ASGI: jelani_backend.asgi under uvicorn if it is installed, otherwise under
+  the minimal asyncio HTTP/1.1 server at the bottom of this file (one
+  connection per request, no keep-alive; enough to drive the ASGI app).
+
+At each level, --slow clients send their requests a few bytes at a time over
+--slow-seconds, over and over, while --probes clients issue normal requests
+back to back. The table shows the probes' latency and how many requests
+failed or took longer than --timeout. "Capacity" is the highest level whose
+probe p99 stays under --slo milliseconds.
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import unquote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import DEFAULT_DATABASE, PROJECT_ROOT, get_bench_user, setup_django  # noqa: E402
+
+PORT = 8766
+PATH = '/api/async/claims/?page_size=20'
+
+
+def start_server(kind, threads):
+    env = {**os.environ, 'DATABASE_URL': f'sqlite:///{DEFAULT_DATABASE}', 'DEBUG': 'False'}
+    if kind == 'wsgi':
+        command = ['gunicorn', 'jelani_backend.wsgi', '-k', 'gthread', '-w', '1', '--threads', str(threads),
+                   '-b', f'127.0.0.1:{PORT}', '--log-level', 'warning']
+    elif importlib.util.find_spec('uvicorn'):
+        command = [sys.executable, '-m', 'uvicorn', 'jelani_backend.asgi:application', '--port', str(PORT),
+                   '--log-level', 'warning', '--no-access-log']
+    else:
+        command = [sys.executable, os.path.abspath(__file__), '--serve-asgi']
+    server = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{PORT}/', timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+async def fetch(request, pieces=1, pause=0.0):
+    """Send ``request`` in ``pieces`` separated by ``pause`` seconds; return the status code."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    try:
+        size = -(-len(request) // pieces)
+        for start in range(0, len(request), size):
+            if start:
+                await asyncio.sleep(pause)
+            writer.write(request[start:start + size])
+            await writer.drain()
+        response = await reader.read()
+        return int(response.split(b' ', 2)[1])
+    finally:
+        writer.close()
+
+
+async def run_level(args, request, slow):
+    stop = asyncio.Event()
+    latencies, failures = [], 0
+    pieces = 10
+
+    async def slow_client():
+        nonlocal failures
+        while not stop.is_set():
+            try:
+                status = await asyncio.wait_for(
+                    fetch(request, pieces, args.slow_seconds / (pieces - 1)), args.slow_seconds + args.timeout)
+                failures += status != 200
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                failures += 1
+
+    async def probe():
+        nonlocal failures
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(fetch(request), args.timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = None
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                failures += 1
+
+    slow_tasks = [asyncio.create_task(slow_client()) for _ in range(slow)]
+    # Let the slow connections build up before measuring.
+    await asyncio.sleep(min(1.0, args.slow_seconds / 2) if slow else 0)
+    probes = [asyncio.create_task(probe()) for _ in range(args.probes)]
+    await asyncio.sleep(args.duration)
+    stop.set()
+    for task in slow_tasks + probes:
+        task.cancel()
+    await asyncio.gather(*slow_tasks, *probes, return_exceptions=True)
+    return latencies, failures
+
+
+def run(kind, args, request):
+    server = start_server(kind, args.threads)
+    rows = []
+    try:
+        for slow in args.slow:
+            latencies, failures = asyncio.run(run_level(args, request, slow))
+            latencies.sort()
+            p50 = statistics.median(latencies) if latencies else float('inf')
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else float('inf')
+            rows.append((slow, p99))
+            print(f'{kind:<5} {slow:>6} {len(latencies) / args.duration:>9.1f} {p50:>9.1f} {p99:>9.1f} {failures:>9}',
+                  flush=True)
+    finally:
+        server.terminate()
+        server.wait()
+    capacity = max((slow for slow, p99 in rows if p99 < args.slo), default=None)
+    return capacity
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads for the WSGI run')
+    parser.add_argument('--slow', type=int, nargs='+', default=[0, 16, 64, 256], help='slow clients per level')
+    parser.add_argument('--slow-seconds', type=float, default=5.0, help='time a slow client takes to send')
+    parser.add_argument('--probes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per level')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--slo', type=float, default=500.0, help='p99 bound for "capacity", in ms')
+    parser.add_argument('--serve-asgi', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    # Cancelled clients make asyncio warn about writes to closed sockets.
+    logging.getLogger('asyncio').setLevel(logging.ERROR)
+    if args.serve_asgi:
+        return serve_asgi()
+
+    setup_django()
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from accounts.models import Claim
+
+    user = get_bench_user()
+    if Claim.objects.filter(user=user).count() < 20:
+        Claim.objects.bulk_create([Claim(user=user, claim_type='Accident', description='x') for _ in range(20)])
+    request = (
+        f'GET {PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {AccessToken.for_user(user)}\r\n'
+        'Connection: close\r\n\r\n'
+    ).encode()
+
+    print(f'{"":<5} {"slow":>6} {"probes/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"failures":>9}')
+    capacities = {kind: run(kind, args, request) for kind in ('wsgi', 'asgi')}
+    for kind, capacity in capacities.items():
+        print(f'{kind} capacity (p99 < {args.slo:.0f} ms): '
+              f'{"none" if capacity is None else f"{capacity} slow clients"}')
+
+
+def serve_asgi():
+    """A minimal HTTP/1.1 front end for the ASGI application (no keep-alive, no streaming uploads)."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jelani_backend.settings')
+    from jelani_backend.asgi import application
+
+    async def handle(reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            request_line, *lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+            headers = [
+                (name.strip().lower().encode('latin-1'), value.strip().encode('latin-1'))
+                for name, _, value in (line.partition(':') for line in lines)
+            ]
+            length = int(dict(headers).get(b'content-length', b'0'))
+            body = await reader.readexactly(length) if length else b''
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            writer.close()
+            return
+
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': unquote(path), 'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'), 'root_path': '', 'headers': headers,
+            'client': writer.get_extra_info('peername')[:2], 'server': ('127.0.0.1', PORT),
+        }
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # No disconnect detection: wait until the app is done and cancels us.
+            await asyncio.Future()
+
+        async def send(message):
+            if writer.is_closing():
+                raise ConnectionResetError
+            if message['type'] == 'http.response.start':
+                writer.write(f'HTTP/1.1 {message["status"]} \r\n'.encode())
+                for name, value in message.get('headers', []):
+                    writer.write(name + b': ' + value + b'\r\n')
+                writer.write(b'Connection: close\r\n\r\n')
+            elif message['type'] == 'http.response.body':
+                writer.write(message.get('body', b''))
+                await writer.drain()
+
+        try:
+            await application(scope, receive, send)
+        except ConnectionError:
+            pass  # The client went away (the load generator cancels its clients at the end of a level).
+        finally:
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', PORT, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+if __name__ == '__main__':
+    main()
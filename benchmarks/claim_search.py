@@ -0,0 +1,91 @@
+"""
+Claim search latency: the full-text index (accounts.search) vs the LIKE
+search the admin used before (``search_fields = ('user__email',
+'claim_type', 'status')`` plus ``description``, which LIKE had to scan too).
+
+    python benchmarks/claim_search.py --rows 1000000
+
+Claims get descriptions of random words from a fixed vocabulary, so a query
+can target a rare word (a handful of matches) or a common one (many).
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django, timed  # noqa: E402
+
+DATABASE = os.environ.get('BENCH_SEARCH_DATABASE', '/tmp/jelani-bench-search.sqlite3')
+CLAIM_TYPES = ['Accident', 'Theft', 'Medical', 'Fire', 'Flood', 'Liability']
+COMMON = ['vehicle', 'damage', 'policy', 'repair', 'report', 'injury', 'window', 'roof', 'phone', 'receipt']
+
+
+def vocabulary(size=20000):
+    rng = random.Random(1)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(size)]
+
+
+def seed(user, rows, batch_size=10000):
+    from accounts.models import Claim
+
+    existing = Claim.objects.count()
+    words = vocabulary()
+    rng = random.Random(existing)
+    for start in range(existing, rows, batch_size):
+        count = min(batch_size, rows - start)
+        Claim.objects.bulk_create([
+            Claim(
+                user=user,
+                claim_type=rng.choice(CLAIM_TYPES),
+                description=' '.join(rng.choices(COMMON, k=2) + rng.choices(words, k=12)),
+            )
+            for _ in range(count)
+        ])
+    print(f'seeded {rows:,} claims')
+    return words
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django(DATABASE)
+    from django.db import connection
+    from django.db.models import Q
+
+    from accounts import search
+    from accounts.models import Claim
+
+    words = seed(get_bench_user(), args.rows)
+
+    def like_search(term):
+        condition = (
+            Q(user__email__icontains=term) | Q(claim_type__icontains=term)
+            | Q(status__icontains=term) | Q(description__icontains=term)
+        )
+        return list(Claim.objects.filter(condition).order_by('-created_at').values_list('pk', flat=True)[:args.limit])
+
+    queries = [
+        ('rare word', words[123]),
+        ('two rare', f'{words[456]} {words[789]}'),
+        ('common word', 'vehicle'),
+        ('two words', f'theft {COMMON[3]}'),
+    ]
+    print(f'{"query":<14} {"matches":>9} {"LIKE ms":>10} {"FTS ms":>10}')
+    for label, term in queries:
+        with connection.cursor() as cursor:
+            expression = ' '.join(f'"{word}"' for word in search.terms(term))
+            cursor.execute(f'SELECT count(*) FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} MATCH %s', [expression])
+            matches = cursor.fetchone()[0]
+        like = timed(lambda: like_search(term.split()[0]), repeat=3)
+        fts = timed(lambda: search.ranked_ids(term, args.limit))
+        print(f'{label:<14} {matches:>9,} {like:>10.1f} {fts:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Disk usage and save throughput of claim documents: plain FileSystemStorage vs
+the content-addressed ContentAddressedStorage.
+
+    python benchmarks/document_storage.py --uploads 2000 --unique 200
+
+``--uploads`` documents are saved, drawn from ``--unique`` distinct payloads of
+``--size`` bytes each (users re-uploading the same policy scan, receipts sent
+twice, ...). Both backends write into their own scratch directory.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import setup_django  # noqa: E402
+
+
+def disk_usage(root):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(root) for name in names
+    )
+
+
+def run(storage, payloads, uploads, size):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    start = time.perf_counter()
+    for i in range(uploads):
+        storage.save('claims/document.pdf', SimpleUploadedFile('document.pdf', payloads[i % len(payloads)]))
+    elapsed = time.perf_counter() - start
+    return elapsed, uploads * size / elapsed / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=2000)
+    parser.add_argument('--unique', type=int, default=200)
+    parser.add_argument('--size', type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.files.storage import FileSystemStorage
+
+    from accounts.models import DocumentBlob
+    from accounts.storage import ContentAddressedStorage
+
+    payloads = [os.urandom(args.size) for _ in range(args.unique)]
+    scratch = tempfile.mkdtemp(prefix='jelani-bench-docs-')
+    try:
+        DocumentBlob.objects.all().delete()
+        results = {}
+        for label, storage in (
+            ('FileSystemStorage', FileSystemStorage(location=os.path.join(scratch, 'plain'))),
+            ('ContentAddressedStorage', ContentAddressedStorage(location=os.path.join(scratch, 'cas'))),
+        ):
+            elapsed, throughput = run(storage, payloads, args.uploads, args.size)
+            results[label] = disk_usage(storage.location)
+            print(f'{label:<24} {elapsed:7.2f}s  {throughput:8.1f} MiB/s  {results[label] / 1024 / 1024:9.1f} MiB on disk')
+
+        plain, cas = results['FileSystemStorage'], results['ContentAddressedStorage']
+        print(f'disk saved: {(plain - cas) / 1024 / 1024:.1f} MiB ({100 * (plain - cas) / plain:.1f}%)')
+    finally:
+        DocumentBlob.objects.all().delete()
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
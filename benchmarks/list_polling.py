@@ -0,0 +1,77 @@
+"""
+Polling throughput of GET /api/claims/ and /api/payments/: full responses
+(what every poll cost before ETags) vs conditional polls answered with 304.
+
+    python benchmarks/list_polling.py --seconds 5
+
+The bench user owns --rows claims and payments. Requests authenticate with a
+real JWT access token, so the numbers include the authentication a frontend
+poll pays for.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django  # noqa: E402
+
+
+def seed(user, rows):
+    from accounts.models import Claim, Payment
+
+    missing = rows - Claim.objects.filter(user=user).count()
+    if missing > 0:
+        Claim.objects.bulk_create(
+            [Claim(user=user, claim_type='Accident', description=f'Claim {i}') for i in range(missing)]
+        )
+    missing = rows - Payment.objects.filter(user=user).count()
+    if missing > 0:
+        start = Payment.objects.count()
+        Payment.objects.bulk_create(
+            [Payment(user=user, amount='10.00', reference=f'PAY-POLL-{start + i}') for i in range(missing)]
+        )
+
+
+def polls_per_second(func, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        func()
+        count += 1
+    return count / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    user = get_bench_user()
+    seed(user, args.rows)
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    print(f'{"endpoint":<16} {"full polls/s":>13} {"304 polls/s":>12}')
+    for url in ('/api/claims/', '/api/payments/'):
+        first = client.get(url)
+        assert first.status_code == 200, first.content
+        etag = first['ETag']
+
+        def full():
+            assert client.get(url).status_code == 200
+
+        def conditional():
+            assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        print(f'{url:<16} {polls_per_second(full, args.seconds):>13,.0f} '
+              f'{polls_per_second(conditional, args.seconds):>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Rows serialized per second: ClaimSerializer / PaymentSerializer (many=True)
+over model instances vs the precompiled RowEncoder over ``.values()`` rows.
+
+    python benchmarks/list_serialization.py --rows 10000
+
+"serialize only" starts from rows already fetched (instances for the
+serializer, dicts for the encoder). The second pair of columns includes the
+query and rendering to JSON, i.e. what a list response costs apart from the
+HTTP layer.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django, timed  # noqa: E402
+
+
+def seed(user, rows):
+    from accounts.models import Claim, Payment
+
+    missing = rows - Claim.objects.filter(user=user).count()
+    if missing > 0:
+        Claim.objects.bulk_create(
+            [Claim(user=user, claim_type='Accident', description=f'Claim {i} ' * 5) for i in range(missing)]
+        )
+    missing = rows - Payment.objects.filter(user=user).count()
+    if missing > 0:
+        start = Payment.objects.count()
+        Payment.objects.bulk_create(
+            [Payment(user=user, amount='1234.50', reference=f'PAY-SER-{start + i}') for i in range(missing)]
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+
+    from accounts.encoders import get_encoder
+    from accounts.models import Claim, Payment
+    from accounts.serializers import ClaimSerializer, PaymentSerializer
+
+    user = get_bench_user()
+    seed(user, args.rows)
+    request = Request(RequestFactory().get('/api/claims/'))
+    renderer = JSONRenderer()
+
+    print(f'{"":<18} {"serialize only (rows/s)":>34}   {"query + serialize + render (rows/s)":>36}')
+    print(f'{"serializer":<18} {"ModelSerializer":>16} {"RowEncoder":>11} {"x":>5}   '
+          f'{"ModelSerializer":>16} {"RowEncoder":>11} {"x":>6}')
+    for model, serializer_class in ((Claim, ClaimSerializer), (Payment, PaymentSerializer)):
+        queryset = model.objects.filter(user=user).order_by('-created_at', '-id')[:args.rows]
+        encoder = get_encoder(serializer_class)
+        instances = list(queryset.all())
+        rows = list(queryset.values(*encoder.columns))
+        context = {'request': request}
+
+        def model_serializer():
+            return renderer.render(serializer_class(queryset.all(), many=True, context=context).data)
+
+        def row_encoder():
+            return renderer.render(encoder.encode(queryset.values(*encoder.columns), request))
+
+        assert model_serializer() == row_encoder()
+        rate = lambda func: args.rows / timed(func, repeat=7) * 1000  # noqa: E731
+        slow = rate(lambda: serializer_class(instances, many=True, context=context).data)
+        fast = rate(lambda: encoder.encode(rows, request))
+        slow_total = rate(model_serializer)
+        fast_total = rate(row_encoder)
+        print(f'{serializer_class.__name__:<18} {slow:>16,.0f} {fast:>11,.0f} {fast / slow:>4.1f}x   '
+              f'{slow_total:>16,.0f} {fast_total:>11,.0f} {fast_total / slow_total:>5.1f}x')
+
+if __name__ == '__main__':
+    main()
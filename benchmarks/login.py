@@ -0,0 +1,71 @@
+"""
+Logins per second through the old two-step lookup and the single-pass backend.
+
+    python benchmarks/login.py --attempts 20
+
+The "old" column reproduces what the login serializers used to do: authenticate
+by username, then on failure look the user up by email and authenticate again.
+Both columns use the project's real password hasher.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django  # noqa: E402
+
+
+def old_login(login, password):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.backends import ModelBackend
+
+    User = get_user_model()
+    backend = ModelBackend()
+    user = backend.authenticate(None, username=login, password=password)
+    if not user:
+        try:
+            user_obj = User.objects.get(email=login)
+            user = backend.authenticate(None, username=user_obj.username, password=password)
+        except User.DoesNotExist:
+            user = None
+    return user
+
+
+def new_login(login, password):
+    from accounts.backends import UsernameOrEmailBackend
+
+    return UsernameOrEmailBackend().authenticate(None, username=login, password=password)
+
+
+def rate(func, login, password, attempts):
+    start = time.perf_counter()
+    for _ in range(attempts):
+        func(login, password)
+    return attempts / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    user = get_bench_user()
+    cases = [
+        ('username, right password', user.username, 'bench-password'),
+        ('email, right password', user.email, 'bench-password'),
+        ('email, wrong password', user.email, 'wrong-password'),
+        ('unknown login', 'nobody@example.com', 'wrong-password'),
+    ]
+
+    print(f'{"case":<28} {"old/s":>8} {"new/s":>8}')
+    for label, login, password in cases:
+        old = rate(old_login, login, password, args.attempts)
+        new = rate(new_login, login, password, args.attempts)
+        print(f'{label:<28} {old:>8.2f} {new:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Claims-list latency while login traffic saturates the server.
+
+    python benchmarks/login_load.py --threads 4 --login-clients 16 --duration 20
+
+Runs gunicorn (gthread worker) against the benchmark database three times:
+idle, under a login flood with hashing inline, and under the same flood with
+PASSWORD_HASHING_POOL enabled. In each run one client polls GET /api/claims/
+and the script reports its latency percentiles, along with how the login
+requests were answered (200 / 401 / 503).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import DEFAULT_DATABASE, PROJECT_ROOT, get_bench_user, setup_django  # noqa: E402
+
+PORT = 8765
+BASE_URL = f'http://127.0.0.1:{PORT}'
+
+
+def request(path, payload=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(BASE_URL + path, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.read()
+
+
+def start_server(threads, pool, pool_workers, pool_pending):
+    env = {
+        **os.environ,
+        'DATABASE_URL': f'sqlite:///{DEFAULT_DATABASE}',
+        'DEBUG': 'False',
+        'PASSWORD_HASHING_POOL': 'True' if pool else 'False',
+        'PASSWORD_HASHING_WORKERS': str(pool_workers),
+        'PASSWORD_HASHING_MAX_PENDING': str(pool_pending),
+    }
+    server = subprocess.Popen(
+        ['gunicorn', 'jelani_backend.wsgi', '-k', 'gthread', '-w', '1', '--threads', str(threads),
+         '-b', f'127.0.0.1:{PORT}', '--log-level', 'warning'],
+        cwd=PROJECT_ROOT, env=env,
+    )
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(BASE_URL + '/', timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def run(label, args, flood, pool=False):
+    server = start_server(args.threads, pool, args.pool_workers, args.pool_pending)
+    try:
+        _, body = request('/api/login/', {'login': 'bench', 'password': 'bench-password'})
+        token = json.loads(body)['access']
+        stop = threading.Event()
+        outcomes = Counter()
+
+        def login_client():
+            while not stop.is_set():
+                status, _ = request('/api/login/', {'login': 'bench', 'password': 'wrong-password'})
+                outcomes[status] += 1
+
+        clients = [threading.Thread(target=login_client) for _ in range(args.login_clients if flood else 0)]
+        for client in clients:
+            client.start()
+
+        latencies = []
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            request('/api/claims/', token=token)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        stop.set()
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    logins = ' '.join(f'{code}:{count}' for code, count in sorted(outcomes.items())) or '-'
+    print(f'{label:<22} {len(latencies):>7} {statistics.median(latencies):>9.1f} {p99:>9.1f}   {logins}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads')
+    parser.add_argument('--login-clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--pool-workers', type=int, default=2)
+    parser.add_argument('--pool-pending', type=int, default=2)
+    args = parser.parse_args()
+
+    setup_django()
+    from accounts.models import Claim
+
+    user = get_bench_user()
+    if not Claim.objects.filter(user=user).exists():
+        Claim.objects.bulk_create([Claim(user=user, claim_type='Accident', description='x') for _ in range(50)])
+
+    print(f'{"run":<22} {"polls":>7} {"p50 ms":>9} {"p99 ms":>9}   logins by status')
+    run('idle', args, flood=False)
+    run('login flood, inline', args, flood=True)
+    run('login flood, pool', args, flood=True, pool=True)
+
+
+if __name__ == '__main__':
+    main()
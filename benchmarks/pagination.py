@@ -0,0 +1,71 @@
+"""
+Latency of GET /api/claims/ at increasing depths: keyset cursor vs OFFSET.
+
+    python benchmarks/pagination.py --rows 1000000
+
+With keyset pagination the cost of a page does not depend on how far into the
+list it is; the OFFSET column shows what the same page would cost if it were
+addressed by position instead.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django, timed  # noqa: E402
+
+
+def seed(user, rows, batch_size=10000):
+    from accounts.models import Claim
+
+    existing = Claim.objects.filter(user=user).count()
+    for start in range(existing, rows, batch_size):
+        count = min(batch_size, rows - start)
+        Claim.objects.bulk_create(
+            [Claim(user=user, claim_type='Accident', description=f'Claim {start + i}') for i in range(count)]
+        )
+    print(f'seeded {rows:,} claims')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.test import APIClient
+
+    from accounts.models import Claim
+    from accounts.pagination import KeysetPagination
+
+    user = get_bench_user()
+    seed(user, args.rows)
+
+    client = APIClient()
+    client.force_authenticate(user)
+    queryset = Claim.objects.filter(user=user).order_by('-created_at', '-id')
+    url = '/api/claims/'
+
+    paginator = KeysetPagination()
+    paginator.fields = ['-created_at', '-id']
+
+    print(f'{"depth":>12} {"GET ms":>10} {"keyset sql":>10} {"offset sql":>10}')
+    depths = [depth for depth in (0, 1_000, 10_000, 100_000) if depth < args.rows]
+    for depth in depths + [args.rows - args.page_size]:
+        params = {'page_size': args.page_size}
+        page = queryset
+        if depth:
+            # The position a client holds after reading `depth` rows.
+            position = queryset.values_list('created_at', 'id')[depth - 1]
+            params['cursor'] = paginator.encode_cursor(position)
+            page = queryset.filter(paginator.build_seek_filter(position))
+        request = timed(lambda: client.get(url, params))
+        keyset = timed(lambda: list(page[:args.page_size]))
+        offset = timed(lambda: list(queryset[depth:depth + args.page_size]))
+        print(f'{depth:>12,} {request:>10.2f} {keyset:>10.2f} {offset:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Payment webhook acknowledgement latency and inbox processing throughput.
+
+    python benchmarks/payment_webhook.py --payments 20000
+
+Deliveries are posted through the Django test client, so the latency
+covers the whole request: signature check, parsing, the inbox INSERT and
+the response. The worker is then timed while it settles every payment,
+and compared with the obvious per-event ``get()`` / ``save()`` loop.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django  # noqa: E402
+
+
+def seed(user, count):
+    from accounts.models import Payment, PaymentEvent
+
+    PaymentEvent.objects.all().delete()
+    Payment.objects.filter(user=user).delete()
+    Payment.objects.bulk_create(
+        [Payment(user=user, amount='10.00', reference=f'PAY-BENCH-{i}') for i in range(count)], batch_size=5000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--payments', type=int, default=20000)
+    parser.add_argument('--per-delivery', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault('PAYMENT_WEBHOOK_SECRET', 'bench-secret')
+    setup_django()
+    from django.test import Client
+
+    from accounts import payments
+    from accounts.models import Payment
+
+    user = get_bench_user()
+    seed(user, args.payments)
+    client = Client()
+    run_id = uuid.uuid4().hex[:8]
+
+    latencies = []
+    for start in range(0, args.payments, args.per_delivery):
+        events = [
+            {'id': f'evt-{run_id}-{i}', 'reference': f'PAY-BENCH-{i}', 'status': 'completed'}
+            for i in range(start, min(start + args.per_delivery, args.payments))
+        ]
+        body = json.dumps({'events': events}).encode()
+        began = time.perf_counter()
+        response = client.post('/api/webhooks/payments/', body, content_type='application/json',
+                                HTTP_X_WEBHOOK_SIGNATURE=payments.sign(body))
+        latencies.append((time.perf_counter() - began) * 1000)
+        assert response.status_code == 202, response.content
+    latencies.sort()
+    print(f'{len(latencies)} deliveries of {args.per_delivery} events: '
+          f'p50 {statistics.median(latencies):.2f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms')
+
+    began = time.perf_counter()
+    while payments.process_pending(args.batch_size):
+        pass
+    elapsed = time.perf_counter() - began
+    settled = Payment.objects.filter(user=user, status='completed').count()
+    print(f'worker: {settled:,} payments settled in {elapsed:.2f} s ({settled / elapsed:,.0f} events/s)')
+
+    # Baseline: one lookup and one save() per event.
+    seed(user, args.payments)
+    sample = min(args.payments, 2000)
+    began = time.perf_counter()
+    for i in range(sample):
+        payment = Payment.objects.get(reference=f'PAY-BENCH-{i}')
+        payment.status = 'completed'
+        payment.save()
+    elapsed = time.perf_counter() - began
+    print(f'per-event save(): {sample:,} payments in {elapsed:.2f} s ({sample / elapsed:,.0f} events/s)')
+
+
+if __name__ == '__main__':
+    main()
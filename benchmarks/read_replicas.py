@@ -0,0 +1,103 @@
+"""
+Where the queries of a read-mostly workload go, with and without a read
+replica, and what the router costs per request.
+
+    python benchmarks/read_replicas.py --users 50 --requests 2000 --write-ratio 0.05
+
+The replica is a copy of the benchmark database (DATABASE_URL_REPLICA_BENCH).
+Random users list their claims and payments and open their dashboard; a
+--write-ratio share of the requests file a claim instead, which pins that
+user to the primary for PIN_SECONDS. Reported per run: queries on each
+alias and the mean time per request.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import DEFAULT_DATABASE, get_bench_user, setup_django  # noqa: E402
+
+REPLICA_DATABASE = DEFAULT_DATABASE.with_name(DEFAULT_DATABASE.stem + '-replica.sqlite3')
+READS = ('/api/claims/', '/api/payments/', '/api/dashboard/')
+
+
+def seed(users, claims_per_user):
+    from accounts.models import Claim
+    from dashboard import rollups
+
+    missing = []
+    for user in users:
+        count = Claim.objects.filter(user=user).count()
+        missing += [Claim(user=user, claim_type='Accident', description='x') for _ in range(claims_per_user - count)]
+    Claim.objects.bulk_create(missing)
+    rollups.rebuild([user.pk for user in users])
+
+
+def run(clients, requests, write_ratio):
+    from django.db import connections
+
+    queries = Counter()
+
+    def counter(alias):
+        def count(execute, sql, params, many, context):
+            queries[alias] += 1
+            return execute(sql, params, many, context)
+        return count
+
+    wrappers = [connections[alias].execute_wrapper(counter(alias)) for alias in connections]
+    for wrapper in wrappers:
+        wrapper.__enter__()
+    try:
+        start = time.perf_counter()
+        for _ in range(requests):
+            client = random.choice(clients)
+            if random.random() < write_ratio:
+                response = client.post('/api/claims/', {'claim_type': 'Theft', 'description': 'bench'})
+            else:
+                response = client.get(random.choice(READS))
+            assert response.status_code < 300, response.content
+        elapsed = time.perf_counter() - start
+    finally:
+        for wrapper in wrappers:
+            wrapper.__exit__(None, None, None)
+    return queries, elapsed / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--claims-per-user', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--write-ratio', type=float, default=0.05)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL_REPLICA_BENCH'] = f'sqlite:///{REPLICA_DATABASE}'
+    setup_django()
+    from django.core.cache import cache
+    from django.db import connections
+    from django.test import Client, override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    users = [get_bench_user(f'bench-replica-{index}') for index in range(args.users)]
+    seed(users, args.claims_per_user)
+    connections.close_all()
+    shutil.copyfile(DEFAULT_DATABASE, REPLICA_DATABASE)
+    clients = [Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}') for user in users]
+
+    print(f'{"replicas":<9} {"primary queries":>16} {"replica queries":>16} {"ms/request":>11}')
+    for aliases in ([], ['replica_bench']):
+        cache.clear()
+        random.seed(0)
+        with override_settings(READ_REPLICAS={'ALIASES': aliases, 'PIN_SECONDS': 10, 'HEALTH_CHECK_INTERVAL': 5,
+                                              'CACHE': 'default'}):
+            queries, per_request = run(clients, args.requests, args.write_ratio)
+        print(f'{len(aliases):<9} {queries["default"]:>16,} {queries["replica_bench"]:>16,} {per_request:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
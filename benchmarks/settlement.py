@@ -0,0 +1,82 @@
+"""
+Settlement-file reconciliation throughput (``manage.py reconcile_settlement``).
+
+    python benchmarks/settlement.py --lines 1000000
+
+Seeds ``--lines`` pending payments (once; the database is reused), writes a
+synthetic settlement CSV with one line per payment, ~1% unknown references
+and ~1% wrong amounts, and reconciles it. Every run resets the payments to
+pending first.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django  # noqa: E402
+
+DATABASE = os.environ.get('BENCH_SETTLEMENT_DATABASE', '/tmp/jelani-bench-settlement.sqlite3')
+
+
+def seed(user, count, batch_size=20000):
+    from accounts.models import Payment
+
+    existing = Payment.objects.filter(user=user).count()
+    for start in range(existing, count, batch_size):
+        Payment.objects.bulk_create([
+            Payment(user=user, amount='25.00', reference=f'PAY-S{i:09d}')
+            for i in range(start, min(start + batch_size, count))
+        ])
+    Payment.objects.filter(user=user).exclude(status='pending').update(status='pending')
+
+
+def write_file(path, count):
+    rng = random.Random(7)
+    with open(path, 'w') as handle:
+        handle.write('reference,amount,status,settled_at\n')
+        for i in range(count):
+            roll = rng.random()
+            reference = f'PAY-X{i:09d}' if roll < 0.01 else f'PAY-S{i:09d}'
+            amount = '24.00' if 0.01 <= roll < 0.02 else '25.00'
+            status = 'failed' if roll > 0.97 else 'completed'
+            handle.write(f'{reference},{amount},{status},2026-01-01T00:00:00Z\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django(DATABASE)
+    from io import StringIO
+
+    from django.core.management import call_command
+
+    from dashboard.rollups import rebuild
+
+    user = get_bench_user()
+    began = time.perf_counter()
+    seed(user, args.lines)
+    rebuild([user.pk])
+    print(f'{args.lines:,} pending payments ready in {time.perf_counter() - began:.1f} s')
+
+    directory = tempfile.mkdtemp(prefix='jelani-bench-settlement-')
+    path = os.path.join(directory, 'settlement.csv')
+    write_file(path, args.lines)
+    print(f'settlement file: {os.path.getsize(path) / 1024 / 1024:.0f} MiB')
+
+    out = StringIO()
+    began = time.perf_counter()
+    call_command('reconcile_settlement', path, '--chunk-size', str(args.chunk_size), stdout=out)
+    elapsed = time.perf_counter() - began
+    print(out.getvalue().strip().splitlines()[-1])
+    print(f'{args.lines:,} lines in {elapsed:.1f} s: {args.lines / elapsed:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
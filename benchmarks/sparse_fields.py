@@ -0,0 +1,65 @@
+"""
+Payload size and latency of GET /api/claims/ with and without a sparse
+fieldset, over claims with long descriptions.
+
+    python benchmarks/sparse_fields.py --description-bytes 4096
+
+A full page carries every description. A ``?fields=id,status,claim_type,created_at``
+page leaves the column out of the SQL, and so out of the payload. Both
+serialization paths are measured (``API_FAST_LIST_SERIALIZATION`` on and off).
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django, timed  # noqa: E402
+
+SPARSE = 'id,status,claim_type,created_at'
+
+
+def seed(user, rows, description_bytes):
+    from accounts.models import Claim
+
+    description = ('x' * 63 + '\n') * (description_bytes // 64)
+    Claim.objects.filter(user=user).exclude(description=description).delete()
+    missing = rows - Claim.objects.filter(user=user).count()
+    if missing > 0:
+        Claim.objects.bulk_create(
+            [Claim(user=user, claim_type='Accident', description=description) for _ in range(missing)]
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--page-size', type=int, default=200)
+    parser.add_argument('--description-bytes', type=int, default=4096)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client, override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    user = get_bench_user('bench-sparse')
+    seed(user, args.rows, args.description_bytes)
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    print(f'{"serialization":<14} {"fields":<34} {"bytes/page":>11} {"ms/page":>8}')
+    for fast in (False, True):
+        with override_settings(API_FAST_LIST_SERIALIZATION=fast):
+            for fields in (None, SPARSE):
+                params = {'page_size': args.page_size}
+                if fields:
+                    params['fields'] = fields
+                response = client.get('/api/claims/', params)
+                assert response.status_code == 200, response.content
+                size = len(response.content)
+                elapsed = timed(lambda: client.get('/api/claims/', params), repeat=7)
+                label = 'RowEncoder' if fast else 'serializer'
+                print(f'{label:<14} {fields or "(all)":<34} {size:>11,} {elapsed:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
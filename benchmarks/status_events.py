@@ -0,0 +1,166 @@
+"""
+Polling vs the server-sent event stream for noticing status changes.
+
+    python benchmarks/status_events.py --clients 200 --duration 30
+
+--clients users each own one claim. A writer in this process flips random
+claims' statuses (--changes per second) while the clients, talking to the
+ASGI server of benchmarks/asgi_load.py in another process, watch for them:
+
+* poll: GET /api/async/claims/ every --poll-interval seconds with
+  If-None-Match (the ETags of accounts.versions), as the frontend does today;
+* sse: one GET /api/events/ per client, held open. The server's
+  DatabaseBackend picks up the writer's events from the table.
+
+Reported over the whole run: requests the server answered, CPU seconds the
+server process used, and the delay from a status change to its owner
+noticing it. Polls also wait out the collection version cache (TTL).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django  # noqa: E402
+from benchmarks.asgi_load import PORT, start_server  # noqa: E402
+
+
+def seed(clients):
+    from accounts.models import Claim
+
+    users = [get_bench_user(f'bench-sse-{index}') for index in range(clients)]
+    claims = {claim.user_id: claim for claim in Claim.objects.filter(user__in=users)}
+    missing = [Claim(user=user, claim_type='Accident', description='x') for user in users if user.pk not in claims]
+    Claim.objects.bulk_create(missing)
+    claims.update({claim.user_id: claim for claim in missing})
+    return users, [claims[user.pk] for user in users]
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as handle:
+        fields = handle.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def open_request(path, headers):
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    lines = [f'GET {path} HTTP/1.1', 'Host: 127.0.0.1', 'Connection: close']
+    lines += [f'{name}: {value}' for name, value in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+    await writer.drain()
+    return reader, writer
+
+
+async def get(path, headers):
+    reader, writer = await open_request(path, headers)
+    try:
+        response = await reader.read()
+    finally:
+        writer.close()
+    head = response.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+    status = int(head[0].split(' ', 2)[1])
+    return status, {name.lower(): value.strip() for name, _, value in (line.partition(':') for line in head[1:])}
+
+
+async def poll_client(index, token, interval, changes, seen, counters):
+    etag = None
+    await asyncio.sleep(random.uniform(0, interval))
+    while True:
+        headers = {'Authorization': f'Bearer {token}'}
+        if etag:
+            headers['If-None-Match'] = etag
+        status, response_headers = await get('/api/async/claims/', headers)
+        counters['requests'] += 1
+        if status == 200:
+            if etag is not None and index in changes:
+                seen.append(time.perf_counter() - changes.pop(index))
+            etag = response_headers.get('etag')
+        await asyncio.sleep(interval)
+
+
+async def sse_client(index, token, changes, seen, counters):
+    reader, writer = await open_request('/api/events/', {'Authorization': f'Bearer {token}',
+                                                         'Accept': 'text/event-stream'})
+    counters['requests'] += 1
+    try:
+        while line := await reader.readline():
+            if line.startswith(b'data:') and index in changes:
+                seen.append(time.perf_counter() - changes.pop(index))
+    finally:
+        writer.close()
+
+
+def write_changes(claims, rate, changes, stop):
+    from django.db import close_old_connections
+
+    while not stop.wait(1 / rate):
+        index = random.randrange(len(claims))
+        claim = claims[index]
+        claim.status = 'approved' if claim.status == 'pending' else 'pending'
+        changes.setdefault(index, time.perf_counter())
+        claim.save(update_fields=['status'])
+    close_old_connections()
+
+
+async def run_mode(mode, args, tokens, claims):
+    changes, seen, counters = {}, [], {'requests': 0}
+    if mode == 'poll':
+        clients = [poll_client(i, token, args.poll_interval, changes, seen, counters) for i, token in enumerate(tokens)]
+    else:
+        clients = [sse_client(i, token, changes, seen, counters) for i, token in enumerate(tokens)]
+    tasks = [asyncio.create_task(client) for client in clients]
+    await asyncio.sleep(2)  # Connections and first polls settle.
+
+    stop = threading.Event()
+    writer = threading.Thread(target=write_changes, args=(claims, args.changes, changes, stop))
+    writer.start()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    writer.join()
+    # Give the last changes one more poll interval to be noticed.
+    await asyncio.sleep(args.poll_interval if mode == 'poll' else 2)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return counters['requests'], seen, len(changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--changes', type=float, default=5.0, help='status changes per second')
+    parser.add_argument('--poll-interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    users, claims = seed(args.clients)
+    tokens = [str(AccessToken.for_user(user)) for user in users]
+
+    print(f'{"mode":<5} {"requests":>9} {"server CPU s":>13} {"noticed":>8} {"missed":>7} '
+          f'{"p50 s":>7} {"p99 s":>7}')
+    for mode in ('poll', 'sse'):
+        server = start_server('asgi', 0)
+        try:
+            cpu = cpu_seconds(server.pid)
+            requests, seen, missed = asyncio.run(run_mode(mode, args, tokens, claims))
+            cpu = cpu_seconds(server.pid) - cpu
+        finally:
+            server.terminate()
+            server.wait()
+        seen.sort()
+        p50 = statistics.median(seen) if seen else float('nan')
+        p99 = seen[min(len(seen) - 1, int(len(seen) * 0.99))] if seen else float('nan')
+        print(f'{mode:<5} {requests:>9,} {cpu:>13.1f} {len(seen):>8} {missed:>7} {p50:>7.2f} {p99:>7.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Refresh-token blacklist checks and expired-token purges over a large
+outstanding token table.
+
+    python benchmarks/token_blacklist.py --tokens 10000000
+    python benchmarks/token_blacklist.py --tokens 1000000 --stock-flush
+
+Seeds --tokens outstanding tokens issued evenly over the last 14 days with
+simplejwt's 7-day refresh lifetime, so about half have expired. Every
+--blacklist-every'th token is blacklisted. The table is built once per
+size in its own SQLite file.
+
+* check: microseconds per ``check_blacklist()`` of simplejwt's RefreshToken
+  (one indexed join per refresh) and of accounts.tokens.RefreshToken (Bloom
+  filter first), for valid and for blacklisted tokens. Also the filter's
+  build time and size.
+* purge: ``purge_expired_tokens`` and, with --stock-flush, simplejwt's
+  ``flushexpiredtokens``, each on a fresh copy of the table in a separate
+  process. Reports the wall time, the longest write transaction (how long
+  other writers wait on the lock) and the process's peak RSS. The stock
+  command loads every expired row into memory, so keep --tokens small with
+  --stock-flush.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._setup import get_bench_user, setup_django  # noqa: E402
+
+LIFETIME = timedelta(days=7)
+ISSUED_OVER = timedelta(days=14)
+CHUNK = 100_000
+
+
+def template_path(tokens):
+    return Path(os.environ.get('BENCH_TOKEN_DATABASE', f'/tmp/jelani-bench-tokens-{tokens}.sqlite3'))
+
+
+def seed(tokens, blacklist_every):
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    if OutstandingToken.objects.count() >= tokens:
+        return
+    user = get_bench_user('bench-tokens')
+    start = timezone.now() - ISSUED_OVER
+    step = ISSUED_OVER / tokens
+    adapt = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous = OFF')
+        cursor.execute('DELETE FROM token_blacklist_blacklistedtoken')
+        cursor.execute('DELETE FROM token_blacklist_outstandingtoken')
+        for offset in range(0, tokens, CHUNK):
+            with transaction.atomic():
+                rows = []
+                for index in range(offset, min(offset + CHUNK, tokens)):
+                    created = start + step * index
+                    rows.append((index + 1, '-', adapt(created), adapt(created + LIFETIME), user.pk, uuid.uuid4().hex))
+                cursor.executemany(
+                    'INSERT INTO token_blacklist_outstandingtoken (id, token, created_at, expires_at, user_id, jti) '
+                    'VALUES (%s, %s, %s, %s, %s, %s)', rows,
+                )
+                cursor.executemany(
+                    'INSERT INTO token_blacklist_blacklistedtoken (token_id, blacklisted_at) VALUES (%s, %s)',
+                    [(row[0], row[2]) for row in rows if row[0] % blacklist_every == 0],
+                )
+            print(f'  seeded {min(offset + CHUNK, tokens):,} tokens', file=sys.stderr)
+
+
+def sample_jtis(tokens, count, blacklist_every, blacklisted):
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    ids = set()
+    while len(ids) < count:
+        pk = random.randint(1, tokens)
+        if (pk % blacklist_every == 0) == blacklisted:
+            ids.add(pk)
+    return list(OutstandingToken.objects.filter(pk__in=ids).values_list('jti', flat=True))
+
+
+def check_micros(token_class, jtis):
+    from rest_framework_simplejwt.exceptions import TokenError
+
+    token = token_class()
+    start = time.perf_counter()
+    for jti in jtis:
+        token.payload['jti'] = jti
+        try:
+            token.check_blacklist()
+        except TokenError:
+            pass
+    return (time.perf_counter() - start) / len(jtis) * 1e6
+
+
+def run_checks(args):
+    from rest_framework_simplejwt import tokens as stock
+
+    from accounts import tokens
+
+    valid = sample_jtis(args.tokens, args.checks, args.blacklist_every, blacklisted=False)
+    revoked = sample_jtis(args.tokens, args.checks // 10, args.blacklist_every, blacklisted=True)
+
+    start = time.perf_counter()
+    tokens.blacklist_filter.might_contain('warm-up')
+    built = time.perf_counter() - start
+    bloom = tokens.blacklist_filter._bloom
+    print(f'filter: {bloom.count:,} JTIs, {len(bloom.bits) / 2**20:.1f} MiB, {bloom.hashes} hashes, '
+          f'built in {built:.2f} s')
+    false_positives = sum(jti in bloom for jti in valid)
+    print(f'false positives on valid tokens: {false_positives}/{len(valid)}')
+
+    print(f'{"check_blacklist":<28} {"valid µs":>9} {"blacklisted µs":>15}')
+    for label, token_class in (('simplejwt RefreshToken', stock.RefreshToken),
+                               ('accounts.tokens.RefreshToken', tokens.RefreshToken)):
+        print(f'{label:<28} {check_micros(token_class, valid):>9.1f} {check_micros(token_class, revoked):>15.1f}')
+
+
+def run_purges(args, template):
+    from django.db import connections
+
+    connections.close_all()
+    work = template.with_name(template.stem + '-work.sqlite3')
+    kinds = ['chunked'] + (['stock'] if args.stock_flush else [])
+    print(f'{"purge":<22} {"removed":>10} {"seconds":>8} {"longest txn s":>15} {"peak RSS MiB":>13}')
+    for kind in kinds:
+        shutil.copyfile(template, work)
+        output = subprocess.run(
+            [sys.executable, __file__, '--purge-worker', kind, '--database', str(work),
+             '--batch-size', str(args.batch_size)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        label = 'purge_expired_tokens' if kind == 'chunked' else 'flushexpiredtokens'
+        print(f'{label:<22} {result["removed"]:>10,} {result["seconds"]:>8.1f} {result["longest"]:>15.3f} '
+              f'{result["rss"]:>13.0f}')
+    work.unlink()
+
+
+def purge_worker(kind, database, batch_size):
+    setup_django(database)
+    from django.core.management import call_command
+    from django.db import connection
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    # From a transaction's first DELETE to its COMMIT: how long it holds the write lock.
+    longest, began = 0.0, None
+    commit = connection.commit
+
+    def time_deletes(execute, sql, params, many, context):
+        nonlocal began
+        if sql.startswith('DELETE') and began is None:
+            began = time.perf_counter()
+        return execute(sql, params, many, context)
+
+    def timed_commit():
+        nonlocal longest, began
+        commit()
+        if began is not None:
+            longest, began = max(longest, time.perf_counter() - began), None
+
+    connection.commit = timed_commit
+    before = OutstandingToken.objects.count()
+    with connection.execute_wrapper(time_deletes):
+        start = time.perf_counter()
+        if kind == 'chunked':
+            call_command('purge_expired_tokens', batch_size=batch_size, stdout=open(os.devnull, 'w'))
+        else:
+            call_command('flushexpiredtokens')
+        seconds = time.perf_counter() - start
+    print(json.dumps({
+        'removed': before - OutstandingToken.objects.count(),
+        'seconds': seconds,
+        'longest': longest,
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=10_000_000)
+    parser.add_argument('--blacklist-every', type=int, default=100)
+    parser.add_argument('--checks', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--stock-flush', action='store_true', help="also time simplejwt's flushexpiredtokens")
+    parser.add_argument('--purge-worker', choices=['chunked', 'stock'], help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.purge_worker:
+        purge_worker(args.purge_worker, args.database, args.batch_size)
+        return
+
+    template = template_path(args.tokens)
+    setup_django(template)
+    seed(args.tokens, args.blacklist_every)
+    random.seed(0)
+    run_checks(args)
+    run_purges(args, template)
+
+
+if __name__ == '__main__':
+    main()
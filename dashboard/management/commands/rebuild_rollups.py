@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from dashboard import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute dashboard rollups from live claim and payment aggregates (backfill / repair)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Only this user id (repeatable).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = options['user'] or get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), options['batch_size']):
+            rollups.rebuild(user_ids[start:start + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(user_ids)} rollup(s)."))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRollup',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('claims_pending', models.IntegerField(default=0)),
+                ('claims_approved', models.IntegerField(default=0)),
+                ('claims_rejected', models.IntegerField(default=0)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pending_payment_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('latest_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
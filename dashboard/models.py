@@ -1,3 +1,23 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class UserRollup(models.Model):
+    """
+    Per-user dashboard totals, kept current by the Claim/Payment signal
+    handlers in dashboard.signals so the dashboard is a single-row read.
+
+    Backfill or repair with ``manage.py rebuild_rollups``; compare against
+    live aggregates with ``manage.py check_rollups``.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    claims_pending = models.IntegerField(default=0)
+    claims_approved = models.IntegerField(default=0)
+    claims_rejected = models.IntegerField(default=0)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pending_payment_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    latest_activity_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Rollup for {self.user_id}"
@@ -0,0 +1,126 @@
+"""
+Incremental maintenance of ``UserRollup``.
+
+Every claim or payment write turns into a per-user delta, e.g. a claim moving
+from pending to approved is ``{claims_pending: -1, claims_approved: +1}``.
+The delta is applied as a single ``UPDATE ... SET col = col + n`` in the
+same transaction as the write: ``save()`` of a claim or payment wraps the row
+and its post_save handlers in one (accounts.models.LoadedValuesMixin),
+deletes and the bulk status paths run theirs inside their own. Writes that
+bypass the signals, such as a raw ``QuerySet.update()``, still drift;
+``check_rollups`` finds that and ``rebuild_rollups`` repairs it.
+``compute()`` derives the same numbers from live aggregates for backfills
+(``rebuild()``) and for the consistency checker.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from accounts.models import Claim, Payment
+
+from .models import UserRollup
+
+CLAIM_STATUS_FIELDS = {
+    'pending': 'claims_pending',
+    'approved': 'claims_approved',
+    'rejected': 'claims_rejected',
+}
+PAYMENT_STATUS_FIELDS = {
+    'completed': 'total_paid',
+    'pending': 'pending_payment_amount',
+}
+TOTAL_FIELDS = (*CLAIM_STATUS_FIELDS.values(), *PAYMENT_STATUS_FIELDS.values())
+
+
+def claim_contribution(user_id, status):
+    """What one claim adds to its owner's rollup (an owner entry even if nothing)."""
+    if not user_id:
+        return {}
+    field = CLAIM_STATUS_FIELDS.get(status)
+    return {user_id: {field: 1} if field else {}}
+
+
+def payment_contribution(user_id, status, amount):
+    if not user_id:
+        return {}
+    field = PAYMENT_STATUS_FIELDS.get(status)
+    return {user_id: {field: Decimal(amount)} if field and amount is not None else {}}
+
+
+def diff(old, new):
+    """Per-user, per-field change from contribution ``old`` to ``new``."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for sign, contribution in ((-1, old), (1, new)):
+        for user_id, fields in contribution.items():
+            for field, value in fields.items():
+                deltas[user_id][field] += sign * value
+    return {user_id: {f: v for f, v in fields.items() if v} for user_id, fields in deltas.items()}
+
+
+def apply(deltas):
+    """
+    Add ``deltas`` ({user_id: {field: n}}) to the users' rollups and mark
+    them active now. A user without a rollup yet gets one built from live
+    aggregates, which already include the write being applied.
+    """
+    now = timezone.now()
+    missing = []
+    for user_id in sorted(deltas):
+        changes = {field: F(field) + value for field, value in deltas[user_id].items()}
+        if not UserRollup.objects.filter(user_id=user_id).update(**changes, latest_activity_at=now, updated_at=now):
+            missing.append(user_id)
+    if missing:
+        rebuild(missing, latest_activity_at=now)
+
+
+def compute(user_ids):
+    """Rollup values from live aggregates, ``{user_id: {field: value}}``."""
+    rows = {
+        user_id: {**{field: 0 for field in TOTAL_FIELDS}, 'latest_activity_at': None}
+        for user_id in user_ids
+    }
+    aggregates = (
+        (Claim, CLAIM_STATUS_FIELDS, Count('id')),
+        (Payment, PAYMENT_STATUS_FIELDS, Sum('amount')),
+    )
+    for model, status_fields, total in aggregates:
+        grouped = (
+            model.objects.filter(user_id__in=user_ids)
+            .values('user_id', 'status')
+            .annotate(total=total, latest=Max('created_at'))
+            .order_by()
+        )
+        for group in grouped:
+            row = rows[group['user_id']]
+            field = status_fields.get(group['status'])
+            if field:
+                row[field] = group['total']
+            if row['latest_activity_at'] is None or group['latest'] > row['latest_activity_at']:
+                row['latest_activity_at'] = group['latest']
+    return rows
+
+
+def rebuild(user_ids, latest_activity_at=None):
+    """Recompute and upsert the rollups of ``user_ids``; return them."""
+    user_ids = list(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    rollups = []
+    for user_id, values in compute(user_ids).items():
+        if latest_activity_at is not None:
+            values['latest_activity_at'] = latest_activity_at
+        rollups.append(UserRollup(user_id=user_id, **values))
+    try:
+        with transaction.atomic():
+            UserRollup.objects.bulk_create(
+                rollups,
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=[*TOTAL_FIELDS, 'latest_activity_at', 'updated_at'],
+            )
+    except IntegrityError:
+        # A user was deleted between the lookup and the insert.
+        pass
+    return rollups
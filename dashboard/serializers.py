@@ -0,0 +1,19 @@
+from rest_framework import serializers
+
+from .models import UserRollup
+
+
+class DashboardSerializer(serializers.ModelSerializer):
+    claims = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserRollup
+        fields = ('claims', 'total_paid', 'pending_payment_amount', 'latest_activity_at')
+
+    def get_claims(self, rollup):
+        counts = {
+            'pending': rollup.claims_pending,
+            'approved': rollup.claims_approved,
+            'rejected': rollup.claims_rejected,
+        }
+        return {**counts, 'total': sum(counts.values())}
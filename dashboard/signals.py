@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Claim, Payment
+from accounts.signals import claim_statuses_changed, payment_statuses_changed
+
+from . import rollups
+
+User = get_user_model()
+
+
+def _contributions(instance, values):
+    if isinstance(instance, Claim):
+        return rollups.claim_contribution(values.get('user_id'), values.get('status'))
+    return rollups.payment_contribution(values.get('user_id'), values.get('status'), values.get('amount'))
+
+
+def _current_values(instance):
+    return {'user_id': instance.user_id, 'status': instance.status, 'amount': getattr(instance, 'amount', None)}
+
+
+@receiver(post_save, sender=Claim)
+@receiver(post_save, sender=Payment)
+def update_rollup_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = _contributions(instance, _current_values(instance))
+    if created:
+        old = {}
+    else:
+        loaded = getattr(instance, '_loaded_values', {})
+        if not {'user_id', 'status'} <= loaded.keys():
+            # Saved without having been loaded (or with those fields
+            # deferred): the previous state is unknown, so recount.
+            rollups.rebuild({instance.user_id} - {None})
+            return
+        old = _contributions(instance, loaded)
+    # Users whose totals do not move still get a delta entry: any write
+    # counts as activity.
+    rollups.apply(rollups.diff(old, new))
+
+
+@receiver(post_delete, sender=Claim)
+@receiver(post_delete, sender=Payment)
+def update_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is User:
+        # Cascade from deleting the user: the rollup goes with it.
+        return
+    values = {**_current_values(instance), **getattr(instance, '_loaded_values', {})}
+    rollups.apply(rollups.diff(_contributions(instance, values), {}))
+
+
+@receiver(claim_statuses_changed)
+def update_rollups_on_claim_bulk_change(sender, changes, **kwargs):
+    old, new = {}, {}
+    for _, user_id, old_status, new_status in changes:
+        _accumulate(old, rollups.claim_contribution(user_id, old_status))
+        _accumulate(new, rollups.claim_contribution(user_id, new_status))
+    rollups.apply(rollups.diff(old, new))
+
+
+@receiver(payment_statuses_changed)
+def update_rollups_on_payment_bulk_change(sender, changes, **kwargs):
+    old, new = {}, {}
+    for _, user_id, amount, old_status, new_status in changes:
+        _accumulate(old, rollups.payment_contribution(user_id, old_status, amount))
+        _accumulate(new, rollups.payment_contribution(user_id, new_status, amount))
+    rollups.apply(rollups.diff(old, new))
+
+
+def _accumulate(total, contribution):
+    for user_id, fields in contribution.items():
+        user_total = total.setdefault(user_id, {})
+        for field, value in fields.items():
+            user_total[field] = user_total.get(field, 0) + value
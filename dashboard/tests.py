@@ -1,3 +1,84 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import Claim, Payment
+
+from .models import UserRollup
+
+User = get_user_model()
+
+
+class DashboardRollupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dash', email='dash@example.com', password='testpass')
+        self.client.force_authenticate(self.user)
+
+    def rollup(self):
+        return UserRollup.objects.get(user=self.user)
+
+    def test_rollup_follows_creates_transitions_and_deletes(self):
+        claim = Claim.objects.create(user=self.user, claim_type='Accident', description='A')
+        Claim.objects.create(user=self.user, claim_type='Theft', description='B')
+        payment = Payment.objects.create(user=self.user, amount=Decimal('100.00'), reference='PAY-1')
+        Payment.objects.create(user=self.user, amount=Decimal('20.50'), reference='PAY-2', status='completed')
+
+        rollup = self.rollup()
+        self.assertEqual((rollup.claims_pending, rollup.claims_approved), (2, 0))
+        self.assertEqual((rollup.total_paid, rollup.pending_payment_amount), (Decimal('20.50'), Decimal('100.00')))
+
+        claim = Claim.objects.get(pk=claim.pk)
+        claim.status = 'approved'
+        claim.save()
+        payment.status = 'completed'
+        payment.save()
+        Claim.objects.filter(claim_type='Theft').delete()
+
+        rollup = self.rollup()
+        self.assertEqual((rollup.claims_pending, rollup.claims_approved), (0, 1))
+        self.assertEqual((rollup.total_paid, rollup.pending_payment_amount), (Decimal('120.50'), Decimal('0.00')))
+        call_command('check_rollups', stdout=StringIO())
+
+    def test_failed_rollup_update_rolls_back_the_write(self):
+        claim = Claim.objects.create(user=self.user, claim_type='Accident', description='A')
+        claim.status = 'approved'
+        with mock.patch('dashboard.rollups.apply', side_effect=DatabaseError('lock timeout')):
+            with self.assertRaises(DatabaseError):
+                claim.save()
+        self.assertEqual(Claim.objects.get(pk=claim.pk).status, 'pending')
+        self.assertEqual((self.rollup().claims_pending, self.rollup().claims_approved), (1, 0))
+
+    def test_dashboard_is_a_single_query(self):
+        Claim.objects.create(user=self.user, claim_type='Accident', description='A', status='rejected')
+        Payment.objects.create(user=self.user, amount=Decimal('5.00'), reference='PAY-3')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['claims'], {'pending': 0, 'approved': 0, 'rejected': 1, 'total': 1})
+        self.assertEqual(response.data['pending_payment_amount'], '5.00')
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_check_detects_drift_and_rebuild_repairs_it(self):
+        Claim.objects.create(user=self.user, claim_type='Accident', description='A')
+        UserRollup.objects.filter(user=self.user).update(claims_pending=7)
+
+        with self.assertRaises(CommandError):
+            call_command('check_rollups', stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.rollup().claims_pending, 1)
+        call_command('check_rollups', stdout=StringIO())
+
+    def test_deleting_user_removes_rollup(self):
+        Claim.objects.create(user=self.user, claim_type='Accident', description='A')
+        self.user.delete()
+        self.assertFalse(UserRollup.objects.exists())
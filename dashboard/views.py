@@ -1,4 +1,45 @@
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-def index(request):
-    return JsonResponse({"message": "Dashboard API is working"})
+from accounts import replicas
+from accounts.async_views import async_endpoint
+from accounts.replicas import ReplicaReadMixin
+
+from . import rollups
+from .models import UserRollup
+from .serializers import DashboardSerializer
+
+
+class DashboardView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """The caller's claim counts and payment totals, read from their rollup row."""
+        rollup = UserRollup.objects.filter(user_id=request.user.pk).first()
+        if rollup is None:
+            # First visit since rollups were introduced (no backfill yet).
+            # Counted on the primary, where the rollup is written.
+            with replicas.primary():
+                rollup, = rollups.rebuild([request.user.pk])
+        return Response(DashboardSerializer(rollup).data)
+
+
+index = DashboardView.as_view()
+
+
+async def _index(view, request):
+    rollup = await UserRollup.objects.filter(user_id=request.user.pk).afirst()
+    if rollup is None:
+        rollup, = await sync_to_async(_rebuild)(request.user.pk)
+    return Response(DashboardSerializer(rollup).data)
+
+
+def _rebuild(user_id):
+    with replicas.primary():
+        return rollups.rebuild([user_id])
+
+
+# GET /api/async/dashboard/ for ASGI deployments; see accounts.async_views.
+async_index = async_endpoint(DashboardView, _index)
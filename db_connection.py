@@ -1,20 +1,24 @@
 import os
 import sys
+import threading
+import time
+from contextlib import contextmanager
 
 try:
     import MySQLdb
+    import MySQLdb.cursors
     from MySQLdb import OperationalError
 except ImportError:
     print("❌ Error: The 'mysqlclient' library is not installed.")
     print("   Please ensure it's installed by running: pip install mysqlclient")
     sys.exit(1)
 
-def get_db_connection():
+def get_db_config():
     """
-    Establishes and returns a database connection using credentials from the .env file.
+    Reads the connection settings from the .env variables.
 
     Returns:
-        A MySQLdb connection object or None if the connection fails.
+        A dict of MySQLdb.connect arguments, or None if a variable is missing.
     """
     db_config = {
         'host': os.getenv('DB_HOST'),
@@ -33,19 +37,191 @@ def get_db_connection():
     if missing_vars:
         print(f"❌ Error: Missing required database environment variables in .env: {', '.join(missing_vars)}")
         return None
+    return db_config
+
+def report_connection_error(err, db_config):
+    """Prints a MySQLdb OperationalError raised while connecting, with a hint for the common causes."""
+    error_code, error_message = err.args
+    print(f"\n❌ FAILED: Could not connect to the database.")
+    print(f"   Error Code: {error_code}")
+    print(f"   Error Message: {error_message}")
+    if error_code == 1045:
+        print("   -> This is an 'Access Denied' error. Please check your DB_USER and DB_PASSWORD in the .env file.")
+    elif error_code == 1049:
+        print("   -> This is an 'Unknown Database' error. Please check your DB_NAME in the .env file.")
+    elif error_code == 2003:
+        print(f"   -> Can't connect to MySQL server on '{db_config['host']}'. Is the server running and the host/port correct?")
+
+def get_db_connection():
+    """
+    Establishes and returns a new database connection using credentials from the .env file.
+    Prefer get_pool() when making more than one connection.
+
+    Returns:
+        A MySQLdb connection object or None if the connection fails.
+    """
+    db_config = get_db_config()
+    if db_config is None:
+        return None
 
     try:
         conn = MySQLdb.connect(**db_config)
         return conn
     except OperationalError as err:
-        error_code, error_message = err.args
-        print(f"\n❌ FAILED: Could not connect to the database.")
-        print(f"   Error Code: {error_code}")
-        print(f"   Error Message: {error_message}")
-        if error_code == 1045:
-            print("   -> This is an 'Access Denied' error. Please check your DB_USER and DB_PASSWORD in the .env file.")
-        elif error_code == 1049:
-            print("   -> This is an 'Unknown Database' error. Please check your DB_NAME in the .env file.")
-        elif error_code == 2003:
-            print(f"   -> Can't connect to MySQL server on '{db_config['host']}'. Is the server running and the host/port correct?")
-        return None
\ No newline at end of file
+        report_connection_error(err, db_config)
+        return None
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within the pool's timeout."""
+
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of MySQLdb connections, opened on demand::
+
+        with pool.connection() as conn:
+            ...
+
+    A connection idle for more than ``health_check_interval`` seconds is
+    pinged before it is handed out, and one older than ``max_lifetime``
+    seconds is closed and replaced, so the server's ``wait_timeout`` never
+    hands us a dead connection. A connection whose block raised is closed
+    rather than returned: it may be mid-result or mid-transaction.
+    """
+
+    def __init__(self, db_config, max_size=5, max_lifetime=1800, health_check_interval=30, timeout=30):
+        self.db_config = db_config
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self._idle = []  # (connection, released_at), most recently used last
+        self._opened_at = {}
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"All {self.max_size} connections stayed busy for {self.timeout}s.")
+                    self._condition.wait(remaining)
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                else:
+                    conn, released_at = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = MySQLdb.connect(**self.db_config)
+                except BaseException:
+                    self._forget(None)
+                    raise
+                self._opened_at[conn] = time.monotonic()
+                return conn
+            if self._is_usable(conn, released_at):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                # End the read transaction, so the next user sees fresh data.
+                conn.rollback()
+            except MySQLdb.Error:
+                discard = True
+        if discard or self._is_expired(conn):
+            self._discard(conn)
+            return
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def close(self):
+        """Closes the idle connections; busy ones are closed when released."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def _is_expired(self, conn):
+        return time.monotonic() - self._opened_at.get(conn, 0) >= self.max_lifetime
+
+    def _is_usable(self, conn, released_at):
+        if self._is_expired(conn):
+            return False
+        if time.monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            conn.ping()
+            return True
+        except MySQLdb.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except MySQLdb.Error:
+            pass
+        self._forget(conn)
+
+    def _forget(self, conn):
+        self._opened_at.pop(conn, None)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+
+_pool = None
+
+def get_pool():
+    """
+    Returns the process-wide connection pool, sized by DB_POOL_SIZE,
+    DB_POOL_MAX_LIFETIME, DB_POOL_HEALTH_CHECK_INTERVAL and DB_POOL_TIMEOUT
+    (seconds), or None if the database variables are missing.
+    """
+    global _pool
+    if _pool is None:
+        db_config = get_db_config()
+        if db_config is None:
+            return None
+        _pool = ConnectionPool(
+            db_config,
+            max_size=int(os.getenv('DB_POOL_SIZE', 5)),
+            max_lifetime=int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            health_check_interval=int(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+            timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        )
+    return _pool
+
+def stream_rows(conn, query, params=None, batch_size=1000):
+    """
+    Runs ``query`` on a server-side cursor (SSCursor) and yields its rows in
+    lists of up to ``batch_size``: only one batch is in memory at a time.
+
+    The connection cannot run another query until every row has been read.
+    Closing the generator early reads and drops the rest of the result, so
+    bound the query (LIMIT) when you may stop early.
+    """
+    with conn.cursor(MySQLdb.cursors.SSCursor) as cursor:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
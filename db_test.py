@@ -1,8 +1,9 @@
 import sys
 import argparse
 import os
+import re
 import django
-from db_connection import get_db_connection
+from db_connection import get_pool, report_connection_error, stream_rows
 
 def setup_django():
     """
@@ -24,64 +25,77 @@ def setup_django():
         ) from exc
 
 
-def fetch_all_users():
+# Only what an operator needs to see: never the password hash.
+USER_COLUMNS = ('id', 'username', 'email', 'is_active', 'is_staff', 'date_joined', 'last_login')
+
+def fetch_users(table='auth_user', page_size=50, after_id=0, stream_all=False, batch_size=1000):
     """
-    Tests the database connection and queries the accounts_user table.
+    Tests the database connection and lists users of the given table, ordered by id.
+
+    Prints one page of ``page_size`` users with an id above ``after_id``, or
+    with ``stream_all`` every user from there on. Rows are read from a
+    server-side cursor in batches of ``batch_size``, so memory use stays flat
+    however large the table is.
     """
-    print("--- Fetching all users from the database ---")
-    conn = get_db_connection()
+    print("--- Fetching users from the database ---")
+    if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', table):
+        print(f"❌ Error: '{table}' is not a valid table name.")
+        sys.exit(1)
 
-    if not conn:
+    pool = get_pool()
+    if not pool:
         print("\n--- Test Failed: Could not establish database connection. ---")
         sys.exit(1)
 
-    print("\n✅ SUCCESS: Database connection established successfully!")
-
     # Import specific exceptions to handle them gracefully
     try:
-        from MySQLdb import ProgrammingError
+        from MySQLdb import OperationalError, ProgrammingError
     except ImportError:
         # This case is already handled in db_connection.py, but it's good practice for robustness
         print("❌ Error: The 'mysqlclient' library is not installed.")
         sys.exit(1)
 
+    query = f"SELECT {', '.join(USER_COLUMNS)} FROM {table} WHERE id > %s ORDER BY id"
+    params = [after_id]
+    if not stream_all:
+        query += " LIMIT %s"
+        params.append(page_size)
+
     try:
-        # Perform a query to fetch users from the 'accounts_user' table.
-        print("\n--- Attempting to fetch data from 'accounts_user' table ---")
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM accounts_user;")
-            rows = cursor.fetchall()
-
-            # Get column names to safely find and redact the password
-            column_names = [desc[0] for desc in cursor.description]
-            password_index = -1
-            if 'password' in column_names:
-                password_index = column_names.index('password')
-
-            if rows:
-                print(f"✅ SUCCESS: Found {len(rows)} user(s).")
-                print(f"Columns: {', '.join(column_names)}")
-                print("-------------------------------------------------")
+        with pool.connection() as conn:
+            print("\n✅ SUCCESS: Database connection established successfully!")
+            print(f"\n--- Attempting to fetch data from '{table}' table ---")
+            print(f"Columns: {', '.join(USER_COLUMNS)}")
+            print("-------------------------------------------------")
+            count, last_id = 0, after_id
+            for rows in stream_rows(conn, query, params, batch_size=batch_size):
                 for row in rows:
-                    row_list = list(row)
-                    if password_index != -1:
-                        row_list[password_index] = '[REDACTED]'
-                    print(tuple(row_list))
-            else:
-                print("✅ SUCCESS: Query executed, but the 'accounts_user' table is empty.")
-
+                    print(row)
+                count += len(rows)
+                last_id = rows[-1][0]
+                sys.stdout.flush()
+
+        if not count:
+            print(f"✅ SUCCESS: Query executed, but no users in '{table}' have an id above {after_id}.")
+        else:
+            print(f"✅ SUCCESS: Listed {count} user(s).")
+            if not stream_all and count == page_size:
+                print(f"   Next page: python db_test.py test --table {table} --page-size {page_size} --after-id {last_id}")
+
+    except OperationalError as err:
+        report_connection_error(err, pool.db_config)
+        sys.exit(1)
     except ProgrammingError as err:
         error_code, error_message = err.args
         print(f"\n❌ FAILED: Could not query the database.")
         print(f"   Error Code: {error_code}")
         print(f"   Error Message: {error_message}")
         if error_code == 1146:
-            print("   -> Table 'accounts_user' not found. Please run `python manage.py migrate` to create it.")
+            print(f"   -> Table '{table}' not found. Please run `python manage.py migrate` to create it.")
 
     finally:
-        if conn:
-            conn.close()
-            print("\nConnection closed.")
+        pool.close()
+        print("\nConnection closed.")
 
 def register_user(username, email, password):
     """
@@ -110,7 +124,12 @@ if __name__ == "__main__":
     subparsers = parser.add_subparsers(dest='command', required=True, help='Available commands')
 
     # 'test' command
-    test_parser = subparsers.add_parser('test', help='Run a connection test and query the user table.')
+    test_parser = subparsers.add_parser('test', help='Run a connection test and list a page of users.')
+    test_parser.add_argument('--table', type=str, default='auth_user', help='The user table (default: auth_user).')
+    test_parser.add_argument('--page-size', type=int, default=50, help='Users per page (default: 50).')
+    test_parser.add_argument('--after-id', type=int, default=0, help='List users with a larger id (the next page).')
+    test_parser.add_argument('--all', action='store_true', help='Stream every user instead of one page.')
+    test_parser.add_argument('--batch-size', type=int, default=1000, help='Rows fetched per round trip (default: 1000).')
 
     # 'register' command
     register_parser = subparsers.add_parser('register', help='Register a new user via the Django ORM.')
@@ -121,7 +140,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     if args.command == 'test':
-        fetch_all_users()
+        fetch_users(args.table, args.page_size, args.after_id, args.all, args.batch_size)
     elif args.command == 'register':
         setup_django()  # Initialize Django environment before using the ORM
         register_user(args.username, args.email, args.password)
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""
+ASGI config for jelani_backend project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with any ASGI server, e.g. ``uvicorn jelani_backend.asgi:application``
+or gunicorn with ``-k uvicorn.workers.UvicornWorker``. The read endpoints
+under /api/async/ (accounts.async_views) run on the event loop; every other
+view runs in Django's sync thread as it does under WSGI.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+from django.core.asgi import get_asgi_application
+
+load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jelani_backend.settings')
+
+application = get_asgi_application()
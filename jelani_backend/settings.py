@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -91,6 +92,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'jelani_backend.wsgi.application'
+ASGI_APPLICATION = 'jelani_backend.asgi.application'
 
 # Database configuration.
 # The default is set to SQLite for simple local development.
@@ -102,12 +104,41 @@ DATABASES = {
     )
 }
 
+# Read replicas: each DATABASE_URL_REPLICA_<NAME> adds a "replica_<name>" alias.
+# The claim, payment and dashboard GET endpoints read from a healthy replica
+# (accounts.replicas); a user who just wrote is pinned to the primary for
+# PIN_SECONDS. Tests read the replicas through the default database.
+READ_REPLICAS = {
+    'ALIASES': [],
+    'PIN_SECONDS': int(os.environ.get("READ_REPLICA_PIN_SECONDS", 10)),
+    'HEALTH_CHECK_INTERVAL': int(os.environ.get("READ_REPLICA_HEALTH_CHECK_INTERVAL", 5)),
+    'CACHE': 'default',
+}
+for _name, _url in sorted(os.environ.items()):
+    if _name.startswith('DATABASE_URL_REPLICA_') and _url:
+        _alias = 'replica_' + _name.removeprefix('DATABASE_URL_REPLICA_').lower()
+        DATABASES[_alias] = {**dj_database_url.parse(_url, conn_max_age=600), 'TEST': {'MIRROR': 'default'}}
+        READ_REPLICAS['ALIASES'].append(_alias)
+DATABASE_ROUTERS = ['accounts.replicas.ReplicaRouter']
+
 # Custom User Model
 # AUTH_USER_MODEL = 'accounts.User'
+# Accepts a username or an email address in the `username` slot, so the
+# login serializers make a single authenticate() call.
 AUTHENTICATION_BACKENDS = (
-    'django.contrib.auth.backends.ModelBackend',
+    'accounts.backends.UsernameOrEmailBackend',
 )
 
+# Optionally run password hashing (login, registration) in a bounded pool of
+# worker processes; when MAX_PENDING hashes are already queued or running,
+# further logins get an immediate 503 instead of tying up a request thread.
+PASSWORD_HASHING_POOL = {
+    'ENABLED': os.environ.get("PASSWORD_HASHING_POOL", "False") == "True",
+    'WORKERS': int(os.environ.get("PASSWORD_HASHING_WORKERS", 2)),
+    'MAX_PENDING': int(os.environ.get("PASSWORD_HASHING_MAX_PENDING", 8)),
+    'TIMEOUT': float(os.environ.get("PASSWORD_HASHING_TIMEOUT", 5)),
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -119,14 +150,42 @@ AUTH_PASSWORD_VALIDATORS = [
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication plus a process-local cache of the token's user
+        'accounts.authentication.CachedJWTAuthentication',
     ],
 }
 
+# Per-process cache used by CachedJWTAuthentication. Entries are evicted when
+# the user is saved or deleted; TTL (seconds) bounds staleness otherwise.
+AUTH_USER_CACHE = {
+    'MAX_SIZE': int(os.environ.get("AUTH_USER_CACHE_SIZE", 10000)),
+    'TTL': int(os.environ.get("AUTH_USER_CACHE_TTL", 60)),
+}
+
+# Keyset pagination for list endpoints (accounts.pagination.KeysetPagination).
+# Clients may ask for a different ?page_size= up to the maximum.
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 50))
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 200))
+# Build list pages from .values() rows with a precompiled encoder
+# (accounts.encoders) instead of ModelSerializer; the JSON is identical.
+API_FAST_LIST_SERIALIZATION = os.environ.get("API_FAST_LIST_SERIALIZATION", "True") == "True"
+
 # JWT Settings
 SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.TokenRefreshSerializer',
+}
+
+# Refreshes consult a per-process Bloom filter of blacklisted refresh tokens
+# before the database (accounts.tokens). It picks up tokens blacklisted by
+# other processes every REFRESH_INTERVAL seconds and is rebuilt every
+# REBUILD_INTERVAL. `python manage.py purge_expired_tokens` removes expired
+# tokens in batches.
+TOKEN_BLACKLIST = {
+    'REFRESH_INTERVAL': int(os.environ.get("TOKEN_BLACKLIST_REFRESH_INTERVAL", 5)),
+    'REBUILD_INTERVAL': int(os.environ.get("TOKEN_BLACKLIST_REBUILD_INTERVAL", 3600)),
+    'FALSE_POSITIVE_RATE': 0.01,
 }
 
 # Use a long-lived access token in development for easier testing
@@ -145,6 +204,18 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Outgoing mail is queued in the database (accounts.OutboundEmail) and sent by
+# `python manage.py send_queued_email --loop`. Failed sends are retried after
+# RETRY_BACKOFF * 2**(attempt - 1) seconds, capped at MAX_BACKOFF. A worker
+# that dies mid-batch releases its messages after LEASE seconds.
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", 50)),
+    'MAX_ATTEMPTS': int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", 5)),
+    'RETRY_BACKOFF': int(os.environ.get("EMAIL_OUTBOX_RETRY_BACKOFF", 30)),
+    'MAX_BACKOFF': 3600,
+    'LEASE': int(os.environ.get("EMAIL_OUTBOX_LEASE", 600)),
+}
+
 # CORS Settings
 # A list of origins that are authorized to make cross-site HTTP requests
 CORS_ALLOWED_ORIGINS = [
@@ -153,6 +224,10 @@ CORS_ALLOWED_ORIGINS = [
     ).split(",") if origin
 ]
 CORS_ALLOW_CREDENTIALS = True # Allow cookies to be sent with requests
+# Browser clients send Idempotency-Key on POSTs to /api/claims/ and /api/payments/,
+# and poll their lists with If-None-Match
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key", "if-none-match", "last-event-id")
+CORS_EXPOSE_HEADERS = ["Idempotent-Replayed", "ETag"]
 
 # Static files (CSS, JavaScript, Images) for Django Admin
 STATIC_URL = '/static/'
@@ -161,3 +236,76 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Media files (User-uploaded content like claim documents)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Resumable claim-document uploads (accounts.uploads). Part files live under
+# MEDIA_ROOT/uploads/partial/ until finalized; `manage.py cleanup_upload_sessions`
+# removes sessions idle for longer than the TTL.
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", 24))
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", 100 * 1024 * 1024))
+
+# Claim documents are stored content-addressed and deduplicated
+# (accounts.storage); `manage.py gc_document_blobs` removes files no claim
+# references any more.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    "claim_documents": {
+        "BACKEND": "accounts.storage.ContentAddressedStorage",
+    },
+}
+DOCUMENT_BLOB_GC_GRACE_HOURS = int(os.environ.get("DOCUMENT_BLOB_GC_GRACE_HOURS", 24))
+
+# GET /api/claims/<id>/document/ streams the file itself by default. Behind a
+# proxy that can read MEDIA_ROOT, set "nginx" (X-Accel-Redirect to an
+# `internal` location at DOCUMENT_SENDFILE_PREFIX) or "apache" (mod_xsendfile)
+# to let the proxy send it instead.
+DOCUMENT_SENDFILE_BACKEND = os.environ.get("DOCUMENT_SENDFILE_BACKEND", "")
+DOCUMENT_SENDFILE_PREFIX = os.environ.get("DOCUMENT_SENDFILE_PREFIX", "/protected-media/")
+
+# Idempotency-Key handling for claim and payment creation (accounts.idempotency).
+# Stored responses are replayed for TTL seconds (purge_idempotency_keys removes
+# them afterwards); a request still running after LOCK_TIMEOUT seconds is
+# presumed dead and its key may be taken over by a retry.
+IDEMPOTENCY_KEYS = {
+    'TTL': int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 3600)),
+    'LOCK_TIMEOUT': int(os.environ.get("IDEMPOTENCY_KEY_LOCK_TIMEOUT", 60)),
+}
+
+# Shared secret for POST /api/webhooks/payments/ (HMAC-SHA256 of the body, see
+# accounts.payments). Deliveries are rejected while it is unset.
+PAYMENT_WEBHOOK_SECRET = os.environ.get("PAYMENT_WEBHOOK_SECRET", "")
+
+# Per-user versions behind the ETags of GET /api/claims/ and /api/payments/
+# (accounts.versions). The cache sits in front of the CollectionVersion table;
+# with the default per-process local-memory cache, TTL (seconds) bounds how
+# long a write made by another process can go unnoticed by a poll.
+COLLECTION_VERSIONS = {
+    'BACKEND': os.environ.get("COLLECTION_VERSIONS_BACKEND", "accounts.versions.CachedVersionStore"),
+    'CACHE': 'default',
+    'TTL': int(os.environ.get("COLLECTION_VERSIONS_TTL", 5)),
+}
+
+# Claim and payment status changes streamed by GET /api/events/ (accounts.events).
+# The default database backend delivers events written by other processes
+# within POLL_INTERVAL seconds; "accounts.events.LocalBackend" only delivers
+# this process's own. Events stay resumable for RETENTION seconds
+# (purge_status_events removes them afterwards).
+STATUS_EVENTS = {
+    'BACKEND': os.environ.get("STATUS_EVENTS_BACKEND", "accounts.events.DatabaseBackend"),
+    'POLL_INTERVAL': float(os.environ.get("STATUS_EVENTS_POLL_INTERVAL", 1.0)),
+    'HEARTBEAT': float(os.environ.get("STATUS_EVENTS_HEARTBEAT", 15.0)),
+    'RETENTION': int(os.environ.get("STATUS_EVENTS_RETENTION", 7 * 24 * 3600)),
+}
+
+# Full-text claim search (accounts.search) ranks at most this many of the
+# newest matches, on every database, which keeps common-word searches in the
+# low milliseconds. Older matches are not returned; the search API reports
+# the cap as candidate_limit.
+CLAIM_SEARCH_CANDIDATES = int(os.environ.get("CLAIM_SEARCH_CANDIDATES", 500))
+
+# Upper bound on the ids accepted by POST /api/claims/transition/.
+CLAIM_TRANSITION_MAX_IDS = int(os.environ.get("CLAIM_TRANSITION_MAX_IDS", 10000))
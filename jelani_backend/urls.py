@@ -5,6 +5,9 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from accounts import async_views
+from dashboard.views import async_index
+
 # Simple homepage
 def home(request):
     return JsonResponse({"message": "Welcome to Jelani API 🚀"})
@@ -18,10 +21,20 @@ urlpatterns = [
 
     # Auth
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/password_reset/', include('django_rest_passwordreset.urls', namespace='password_reset')),
 
     # Dashboard
     path('api/dashboard/', include('dashboard.urls')),
 
+    # Async versions of the read endpoints, for ASGI deployments (jelani_backend/asgi.py)
+    path('api/async/', include([
+        path('claims/', async_views.claim_list, name='async-claim-list'),
+        path('claims/<pk>/', async_views.claim_detail, name='async-claim-detail'),
+        path('payments/', async_views.payment_list, name='async-payment-list'),
+        path('payments/<pk>/', async_views.payment_detail, name='async-payment-detail'),
+        path('dashboard/', async_index, name='async_dashboard'),
+    ])),
+
     # Main application endpoints (login, register, claims, payments)
     path('api/', include('accounts.urls')),
 ]
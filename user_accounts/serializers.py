@@ -5,7 +5,9 @@ from django.contrib.auth.password_validation import validate_password
 from django.db import transaction
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.validators import UniqueValidator
-from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts import hashing
+from accounts.tokens import RefreshToken
 
 class RegisterSerializer(serializers.ModelSerializer):
     full_name = serializers.CharField(write_only=True, required=True)
@@ -39,7 +41,6 @@ class RegisterSerializer(serializers.ModelSerializer):
 
         return attrs
 
-    @transaction.atomic
     def create(self, validated_data):
         full_name = validated_data['full_name']
         first_name, *last_name_parts = full_name.split(' ', 1)
@@ -48,13 +49,19 @@ class RegisterSerializer(serializers.ModelSerializer):
         # Create a username from the email prefix
         username = validated_data['email'].split('@')[0]
 
-        user = User.objects.create_user(
-            username=username,
-            email=validated_data['email'],
-            password=validated_data['password'],
-            first_name=first_name,
-            last_name=last_name
-        )
+        # Equivalent to User.objects.create_user(), but the password is hashed
+        # through accounts.hashing (which may use the worker pool) and before
+        # the transaction opens, so no locks are held across PBKDF2.
+        password = hashing.make_password(validated_data['password'])
+        with transaction.atomic():
+            user = User(
+                username=User.normalize_username(username),
+                email=User.objects.normalize_email(validated_data['email']),
+                password=password,
+                first_name=first_name,
+                last_name=last_name
+            )
+            user.save()
         return user
 
 class LoginSerializer(serializers.Serializer):
@@ -69,16 +76,9 @@ class LoginSerializer(serializers.Serializer):
         login = data.get("login")
         password = data.get("password")
 
-        # First, try authenticating with the login field as a username
-        user = authenticate(username=login, password=password)
-
-        # If that fails, try treating the login field as an email
-        if not user:
-            try:
-                user_obj = User.objects.get(email=login)
-                user = authenticate(username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                pass  # The final check below will handle the failure
+        # The login field may hold a username or an email address; the
+        # UsernameOrEmailBackend resolves either in a single lookup.
+        user = authenticate(self.context.get("request"), username=login, password=password)
 
         if not user:
             raise AuthenticationFailed("Invalid login credentials.")
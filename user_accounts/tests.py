@@ -1,8 +1,13 @@
+import time
+
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
 
+from accounts import hashing
+
 User = get_user_model()
 
 class CustomAuthTests(APITestCase):
@@ -98,3 +103,57 @@ class CustomAuthTests(APITestCase):
         self.assertIn('access', response.data)
         self.assertIn('refresh', response.data)
         self.assertEqual(response.data['user']['username'], self.expected_username)
+
+
+class HashingPoolTests(APITestCase):
+    """
+    Login and registration with password hashing offloaded to the worker pool.
+    """
+
+    def setUp(self):
+        self.register_url = reverse('custom_register')
+        self.login_url = reverse('custom_login')
+        self.user_data = {
+            "full_name": "Pool User",
+            "email": "pooluser@example.com",
+            "password": "StrongPassword123!",
+            "password2": "StrongPassword123!"
+        }
+
+    @override_settings(PASSWORD_HASHING_POOL={'ENABLED': True, 'WORKERS': 1, 'MAX_PENDING': 2})
+    def test_register_and_login_through_pool(self):
+        response = self.client.post(self.register_url, self.user_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(username='pooluser').check_password(self.user_data['password']))
+
+        response = self.client.post(
+            self.login_url, {"login": "pooluser", "password": self.user_data['password']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(self.login_url, {"login": "pooluser", "password": "wrong"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(PASSWORD_HASHING_POOL={'ENABLED': True, 'WORKERS': 1, 'MAX_PENDING': 0})
+    def test_saturated_pool_rejects_fast_with_503(self):
+        response = self.client.post(self.login_url, {"login": "anyone", "password": "whatever"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+        response = self.client.post(self.register_url, self.user_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(User.objects.filter(email=self.user_data['email']).exists())
+
+    @override_settings(PASSWORD_HASHING_POOL={'ENABLED': True, 'WORKERS': 1, 'MAX_PENDING': 1, 'TIMEOUT': 0.2})
+    def test_timed_out_hash_holds_its_slot_until_it_finishes(self):
+        with self.assertRaises(hashing.HashingPoolSaturated):
+            hashing._run(time.sleep, 0.5)
+        # Still running in the pool: no room for another hash yet.
+        _, slots = hashing._get_pool(hashing.get_config())
+        self.assertFalse(slots.acquire(blocking=False))
+
+        deadline = time.monotonic() + 30
+        while not slots.acquire(blocking=False):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        slots.release()